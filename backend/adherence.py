@@ -0,0 +1,117 @@
+"""Adherence analytics over the AdherenceDaily rollups.
+
+The rollups hold per user/medicine/day counters and are updated in the
+same transaction as the Confirmation change they count: by
+reminders.create_confirmations (new doses), reminders.claim_due_snoozes
+(snooze fired) and /confirm (via `confirmation_changed`). A report over a
+date range sums at most one row per user, medicine and day, never
+individual doses.
+"""
+import os
+from datetime import datetime, timedelta
+
+from sqlalchemy import func, select
+
+from models import db, AdherenceDaily
+from reminders import IST_OFFSET
+
+# A dose taken within this long of its scheduled time (either side) counts as on time
+ON_TIME_WINDOW = timedelta(minutes=int(os.getenv("ADHERENCE_ON_TIME_MINUTES", 30)))
+
+STATUSES = ("sent", "taken", "snoozed")
+
+GROUPS = {
+    "user": (AdherenceDaily.user_id,),
+    "medicine": (AdherenceDaily.medicine_name,),
+    "day": (AdherenceDaily.date_str,),
+    "user_medicine": (AdherenceDaily.user_id, AdherenceDaily.medicine_name),
+}
+
+
+def is_on_time(conf):
+    if conf.taken_at is None:
+        return False
+    scheduled = datetime.strptime(f"{conf.date_str} {conf.scheduled_time}", "%Y-%m-%d %H:%M") - IST_OFFSET
+    return abs(conf.taken_at - scheduled) <= ON_TIME_WINDOW
+
+
+def confirmation_changed(conf, old_status, was_snoozed, was_on_time):
+    """Apply a Confirmation status change to the rollups, before the caller commits.
+
+    `was_snoozed` / `was_on_time` describe the row before the change.
+    """
+    delta = {}
+    if old_status != conf.status:
+        for status, step in ((old_status, -1), (conf.status, 1)):
+            if status in STATUSES:
+                delta[status] = delta.get(status, 0) + step
+    if conf.status == "snoozed" and not was_snoozed:
+        delta["snoozed_ever"] = 1
+    on_time = conf.status == "taken" and is_on_time(conf)
+    if on_time != was_on_time:
+        delta["taken_on_time"] = 1 if on_time else -1
+    AdherenceDaily.add({(conf.user_id, conf.medicine_name, conf.date_str): delta})
+
+
+def _rates(row):
+    scheduled = row["scheduled"]
+
+    def rate(count):
+        return round(count / scheduled, 4) if scheduled else None
+
+    return dict(
+        row,
+        ignored=row["sent"],
+        taken_rate=rate(row["taken"]),
+        snoozed_rate=rate(row["snoozed_ever"]),
+        ignored_rate=rate(row["sent"]),
+        on_time_rate=rate(row["taken_on_time"]),
+    )
+
+
+def report(date_from, date_to, group=None, user_id=None, medicine_name=None):
+    """Summed counters and rates for [date_from, date_to] (YYYY-MM-DD, inclusive).
+
+    `group` is None for one overall total, or a key of GROUPS for one entry
+    per group. "ignored" counts doses still unconfirmed (status "sent").
+    """
+    keys = GROUPS[group] if group else ()
+    sums = [func.coalesce(func.sum(getattr(AdherenceDaily, c)), 0).label(c) for c in AdherenceDaily.COUNTERS]
+    query = select(*keys, *sums).where(
+        AdherenceDaily.date_str >= date_from, AdherenceDaily.date_str <= date_to
+    )
+    if user_id is not None:
+        query = query.where(AdherenceDaily.user_id == user_id)
+    if medicine_name is not None:
+        query = query.where(AdherenceDaily.medicine_name == medicine_name)
+    if keys:
+        query = query.group_by(*keys).order_by(*keys)
+
+    rows = [_rates(dict(row._mapping)) for row in db.session.execute(query)]
+    return rows if keys else rows[0]
+
+
+def date_range(args, default_days=30):
+    """Read ?from=&to= (YYYY-MM-DD); defaults to the last `default_days` days in IST.
+
+    Raises ValueError for malformed dates.
+    """
+    today = (datetime.utcnow() + IST_OFFSET).date()
+    date_to = args.get("to") or today.isoformat()
+    date_from = args.get("from") or (today - timedelta(days=default_days - 1)).isoformat()
+    for value in (date_from, date_to):
+        datetime.strptime(value, "%Y-%m-%d")
+    return date_from, date_to
+
+
+def summary(args, groups, **filters):
+    """Response body for the adherence endpoints; raises ValueError on bad input."""
+    date_from, date_to = date_range(args)
+    group = args.get("group")
+    if group and group not in groups:
+        raise ValueError(f"group must be one of: {', '.join(groups)}")
+    body = {"from": date_from, "to": date_to, "total": report(date_from, date_to, **filters)}
+    if group:
+        body["group"] = group
+        body["groups"] = report(date_from, date_to, group=group, **filters)
+    return body
@@ -1,17 +1,30 @@
-from flask import Blueprint, request, jsonify
-from flask_jwt_extended import create_access_token, jwt_required
-import pandas as pd
-import os
+from functools import wraps
+from flask import Blueprint, Response, request, jsonify, send_file, stream_with_context
+from flask_jwt_extended import create_access_token, get_jwt_identity, jwt_required
+from sqlalchemy.exc import IntegrityError
+import catalog
+import onboarding
+from adherence import GROUPS as ADHERENCE_GROUPS, summary as adherence_summary
+from listing import BadListRequest, list_etag, not_modified, paginate, respond, sort_order, wants_page
+from models import db, CatalogVersion, Medicine
+from rag.rag_engine import knowledge_base
 
 admin_bp = Blueprint('admin', __name__)
 
-BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-EXCEL_PATH = os.path.join(BASE_DIR, "drug_database", "medicine_database.xlsx")
-
 # Admin credentials (simple for now as requested)
 ADMIN_USERNAME = "admin"
 ADMIN_PASSWORD = "admin123"
 
+def admin_required(fn):
+    # Patient tokens pass jwt_required too; only the token from /admin/login may
+    @wraps(fn)
+    @jwt_required()
+    def wrapper(*args, **kwargs):
+        if get_jwt_identity() != "admin":
+            return jsonify({"message": "Admin access required"}), 403
+        return fn(*args, **kwargs)
+    return wrapper
+
 @admin_bp.route("/login", methods=["POST"])
 def admin_login():
     data = request.json
@@ -25,39 +38,137 @@ def admin_login():
     return jsonify({"message": "Invalid admin credentials"}), 401
 
 @admin_bp.route("/medicines", methods=["GET"])
-@jwt_required()
+@admin_required
 def get_medicines():
-    if not os.path.exists(EXCEL_PATH):
-        return jsonify([])
-    
+    # Unchanged catalog: one primary-key lookup and a 304
+    version = db.session.query(CatalogVersion.version).filter_by(id=1).scalar()
+    etag = list_etag("catalog", version)
+    unchanged = not_modified(etag)
+    if unchanged:
+        return unchanged
+
+    query = Medicine.query
     try:
-        df = pd.read_excel(EXCEL_PATH)
-        # Convert to list of dicts, handle NaN values
-        medicines = df.fillna("").to_dict(orient="records")
-        return jsonify(medicines)
-    except Exception as e:
-        return jsonify({"error": str(e)}), 500
+        if request.args.get("q"):
+            # Name prefix, served by the unique name_key index
+            prefix = catalog.name_key(request.args["q"])
+            query = query.filter(Medicine.name_key.startswith(prefix, autoescape=True))
+        column, descending = sort_order({"id": Medicine.id, "name": Medicine.name_key}, "id")
+        if not wants_page():
+            medicines = query.order_by(column.desc() if descending else column, Medicine.id).all()
+            return respond([m.to_dict() for m in medicines], etag)
+        medicines, next_cursor = paginate(
+            query, column, Medicine.id, descending, lambda m: getattr(m, column.key)
+        )
+    except BadListRequest as e:
+        return jsonify({"error": str(e)}), 400
+    return respond({"items": [m.to_dict() for m in medicines], "next_cursor": next_cursor}, etag)
 
 @admin_bp.route("/add-medicine", methods=["POST"])
-@jwt_required()
+@admin_required
 def add_medicine():
     data = request.json
+    name = (data.get("name") or "").strip()
+    if not name:
+        return jsonify({"error": "Name is required"}), 400
+
+    medicine = Medicine(
+        name=name,
+        name_key=catalog.name_key(name),
+        used_for=data.get("used_for") or "",
+        how_it_works=data.get("how_it_works") or "",
+        side_effects=data.get("side_effects") or "",
+        notes=data.get("notes") or ""
+    )
+    try:
+        db.session.add(medicine)
+        db.session.flush()
+        version = catalog.bump_version(db.session)
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+        return jsonify({"error": f"{name} is already in the catalog"}), 409
+
+    # Index just the new row in this worker; others pick up the version bump
+    knowledge_base.add_record(
+        [medicine.name, medicine.used_for, medicine.how_it_works, medicine.side_effects, medicine.notes],
+        version,
+    )
+    return jsonify({"message": "Medicine added successfully", "id": medicine.id}), 201
+
+@admin_bp.route("/medicines/import", methods=["POST"])
+@admin_required
+def import_medicines():
+    # Excel or CSV; rows are upserted by name in chunks, all in one transaction
+    if "file" not in request.files:
+        return jsonify({"error": "No file"}), 400
+    file = request.files["file"]
+    try:
+        report = catalog.import_rows(db.session, catalog.iter_rows(file.stream, file.filename or ""))
+        db.session.commit()
+    except ValueError as e:
+        db.session.rollback()
+        return jsonify({"error": str(e)}), 400
+    except IntegrityError:
+        # Another import added the same name concurrently; nothing was applied
+        db.session.rollback()
+        return jsonify({"error": "Catalog changed during import, try again"}), 409
+
+    if "version" in report:
+        knowledge_base.reload()
+    return jsonify(report)
+
+@admin_bp.route("/medicines/export", methods=["GET"])
+@admin_required
+def export_medicines():
+    # Built from the table on demand; ?format=csv streams instead
+    if request.args.get("format") == "csv":
+        return Response(
+            stream_with_context(catalog.export_csv(db.session)),
+            mimetype="text/csv",
+            headers={"Content-Disposition": "attachment; filename=medicines.csv"}
+        )
+    return send_file(
+        catalog.export_workbook(db.session),
+        mimetype="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+        as_attachment=True,
+        download_name="medicines.xlsx"
+    )
+
+@admin_bp.route("/patients/import", methods=["POST"])
+@admin_required
+def import_patients():
+    # CSV or JSONL of patients and regimens, applied in one transaction;
+    # ?existing=append adds schedules to usernames that already exist
+    if "file" not in request.files:
+        return jsonify({"error": "No file"}), 400
+    file = request.files["file"]
+    try:
+        report = onboarding.import_patients(
+            db.session,
+            onboarding.iter_records(file.stream, file.filename or ""),
+            append_existing=request.args.get("existing") == "append",
+        )
+        db.session.commit()
+    except ValueError as e:
+        db.session.rollback()
+        return jsonify({"error": str(e)}), 400
+    except IntegrityError:
+        # A username was registered concurrently; nothing was applied
+        db.session.rollback()
+        return jsonify({"error": "Users changed during import, try again"}), 409
+    return jsonify(report)
+
+@admin_bp.route("/adherence", methods=["GET"])
+@admin_required
+def adherence():
+    # ?from=&to=, ?group=user|medicine|day|user_medicine, optional ?user_id= and ?medicine=
+    filters = {}
     try:
-        if not os.path.exists(EXCEL_PATH):
-            df = pd.DataFrame(columns=["Name", "Used for", "How it works", "Common side effects", "Notes"])
-        else:
-            df = pd.read_excel(EXCEL_PATH)
-        
-        new_row = {
-            "Name": data.get("name"),
-            "Used for": data.get("used_for"),
-            "How it works": data.get("how_it_works"),
-            "Common side effects": data.get("side_effects"),
-            "Notes": data.get("notes")
-        }
-        
-        df = pd.concat([df, pd.DataFrame([new_row])], ignore_index=True)
-        df.to_excel(EXCEL_PATH, index=False)
-        return jsonify({"message": "Medicine added successfully"}), 201
-    except Exception as e:
-        return jsonify({"error": str(e)}), 500
+        if request.args.get("user_id"):
+            filters["user_id"] = int(request.args["user_id"])
+        if request.args.get("medicine"):
+            filters["medicine_name"] = request.args["medicine"]
+        return jsonify(adherence_summary(request.args, tuple(ADHERENCE_GROUPS), **filters))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
@@ -0,0 +1,431 @@
+"""Benchmarks for the backend hot paths, run against a synthetic SQLite database.
+
+    python bench.py                                  # every benchmark, default sizes
+    python bench.py reminder --users 10000 --history-days 30
+    python bench.py ask add --drugs 100 10000 100000 --json results.json
+    python bench.py --json new.json --compare baseline.json   # exit 1 on regressions
+
+Benchmarks:
+  reminder  one reminder worker tick: --users users with --schedules
+            schedules each, all due in the same minute, on top of
+            --history-days days of confirmations and adherence rollups
+  ask       /ask throughput with the catalog grown to each --drugs size
+  add       /admin/add-medicine latency at each --drugs size
+  upload    /upload latency (accept and until the OCR job is done) on --images
+
+Everything runs in this process through Flask's test client against a fresh
+database in a temporary directory, so the numbers leave out the network and
+gunicorn. Push delivery happens on the push pool and is not part of a tick;
+exercise it with push_standin.py. Data is generated from --seed, so two runs
+with the same arguments work on the same rows.
+"""
+import argparse
+import io
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+BENCHMARKS = ("reminder", "ask", "add", "upload")
+
+SYLLABLES = ["ba", "cor", "da", "fen", "gli", "hy", "lo", "mex", "nor", "pra",
+             "quin", "ri", "sal", "tor", "u", "val", "xo", "zep", "mi", "ke"]
+SUFFIXES = ["pril", "statin", "mab", "olol", "azole", "cillin", "dipine", "sartan", "tide", "vir"]
+CONDITIONS = ["hypertension", "type 2 diabetes", "bacterial infections", "acid reflux", "asthma",
+              "migraine", "high cholesterol", "anxiety", "allergies", "joint pain", "insomnia"]
+EFFECTS = ["nausea", "dizziness", "headache", "dry mouth", "fatigue", "rash", "diarrhoea"]
+QUESTIONS = ["What is {} used for?", "How does {} work?", "What are the side effects of {}?",
+             "Can I take {} with food?"]
+
+# Local time every synthetic schedule is due at
+DUE_TIME = "08:00"
+
+
+def drug_name(i):
+    """Unique, deterministic medicine name for index `i`."""
+    parts = []
+    for _ in range(3):
+        i, digit = divmod(i, len(SYLLABLES))
+        parts.append(SYLLABLES[digit])
+    i, digit = divmod(i, len(SUFFIXES))
+    name = "".join(parts) + SUFFIXES[digit]
+    return name.capitalize() + (f" {i}" if i else "")
+
+
+def drug_row(i, rng):
+    return {
+        "name": drug_name(i),
+        "used_for": f"Treats {rng.choice(CONDITIONS)}",
+        "how_it_works": f"Acts on {rng.choice(CONDITIONS)} pathways",
+        "side_effects": ", ".join(rng.sample(EFFECTS, 2)),
+        "notes": "",
+    }
+
+
+def percentiles(samples_ms):
+    ordered = sorted(samples_ms)
+
+    def pick(q):
+        return round(ordered[min(len(ordered) - 1, int(q * len(ordered)))], 3)
+
+    return {
+        "n": len(ordered),
+        "mean_ms": round(statistics.fmean(ordered), 3),
+        "p50_ms": pick(0.50),
+        "p95_ms": pick(0.95),
+        "p99_ms": pick(0.99),
+        "max_ms": round(ordered[-1], 3),
+    }
+
+
+def _ms(started):
+    return (time.perf_counter() - started) * 1000
+
+
+class Bench:
+    """Holds the app under test; `main` is imported only once the environment points at `workdir`."""
+
+    def __init__(self, workdir, seed):
+        self.workdir = workdir
+        self.rng = random.Random(seed)
+        os.environ.update(
+            DATABASE_URL=f"sqlite:///{os.path.join(workdir, 'bench.db')}",
+            UPLOAD_DIR=os.path.join(workdir, "uploads"),
+            REMINDER_WORKER="0",
+        )
+        sys.path.insert(0, BACKEND_DIR)
+        # Keep the compiled catalog away from the real cache file
+        from rag.rag_engine import knowledge_base
+        knowledge_base.cache_path = os.path.join(workdir, "catalog.compiled")
+
+        import main
+        self.main = main
+        self.app = main.app
+        self.client = main.app.test_client()
+        self.next_drug = 0
+        with self.app.app_context():
+            from flask_jwt_extended import create_access_token
+            self.client.post("/register", json={"username": "bench", "password": "bench"})
+            login = self.client.post("/login", json={"username": "bench", "password": "bench"}).get_json()
+            self.user_headers = {"Authorization": f"Bearer {login['access_token']}"}
+            self.admin_headers = {"Authorization": f"Bearer {create_access_token(identity='admin')}"}
+
+    # --- Synthetic data ---
+
+    def seed_users(self, users, schedules, history_days):
+        from sqlalchemy import insert
+        from werkzeug.security import generate_password_hash
+        from models import db, AdherenceDaily, Confirmation, Schedule, User, DAY_BITS
+        from reminders import IST_OFFSET
+
+        started = time.perf_counter()
+        # One hash for everyone; hashing is not what is being measured
+        password_hash = generate_password_hash("bench")
+        today = (datetime.utcnow() + IST_OFFSET).date()
+        days = json.dumps(list(DAY_BITS))
+        with self.app.app_context():
+            first_id = (db.session.query(db.func.max(User.id)).scalar() or 0) + 1
+            user_ids = range(first_id, first_id + users)
+            db.session.execute(insert(User), [
+                {"id": uid, "username": f"bench-{uid}", "password_hash": password_hash} for uid in user_ids
+            ])
+            schedule_rows = []
+            for uid in user_ids:
+                for n in range(schedules):
+                    schedule_rows.append({
+                        "user_id": uid, "medicine_name": drug_name(n), "time": DUE_TIME,
+                        "period": "Morning", "days": days, "days_mask": sum(DAY_BITS.values()),
+                        "is_active": True,
+                    })
+            db.session.execute(insert(Schedule), schedule_rows)
+            rows = db.session.query(Schedule.id, Schedule.user_id, Schedule.medicine_name).filter(
+                Schedule.user_id >= first_id).all()
+
+            confirmations, rollups = [], []
+            for offset in range(1, history_days + 1):
+                date_str = (today - timedelta(days=offset)).isoformat()
+                scheduled_at = datetime.strptime(f"{date_str} {DUE_TIME}", "%Y-%m-%d %H:%M") - IST_OFFSET
+                for schedule_id, uid, name in rows:
+                    status = self.rng.choices(("taken", "snoozed", "sent"), (8, 1, 1))[0]
+                    taken_at = scheduled_at + timedelta(minutes=self.rng.randint(0, 90)) if status == "taken" else None
+                    confirmations.append({
+                        "user_id": uid, "schedule_id": schedule_id, "medicine_name": name,
+                        "scheduled_time": DUE_TIME, "date_str": date_str, "status": status,
+                        "sent_at": scheduled_at, "taken_at": taken_at,
+                    })
+                    on_time = taken_at is not None and taken_at - scheduled_at <= timedelta(minutes=30)
+                    rollups.append({
+                        "user_id": uid, "medicine_name": name, "date_str": date_str, "scheduled": 1,
+                        "sent": int(status == "sent"), "taken": int(status == "taken"),
+                        "snoozed": int(status == "snoozed"), "snoozed_ever": int(status == "snoozed"),
+                        "taken_on_time": int(on_time),
+                    })
+                if len(confirmations) >= 50000:
+                    db.session.execute(insert(Confirmation), confirmations)
+                    confirmations = []
+            if confirmations:
+                db.session.execute(insert(Confirmation), confirmations)
+            # Distinct (user, medicine, day) keys because every schedule is a different medicine
+            if rollups:
+                db.session.execute(insert(AdherenceDaily), rollups)
+            db.session.commit()
+        return {"users": users, "schedules": len(rows), "confirmations": len(rollups),
+                "seed_ms": round(_ms(started), 1)}
+
+    def grow_catalog(self, size):
+        """Bulk-import synthetic drugs until the catalog holds `size`; returns the KB reload time."""
+        import catalog
+        from models import db, Medicine
+        with self.app.app_context():
+            current = db.session.query(db.func.count(Medicine.id)).scalar()
+            if current < size:
+                rows = []
+                for number in range(size - current):
+                    rows.append((number, drug_row(self.next_drug, self.rng)))
+                    self.next_drug += 1
+                with db.engine.begin() as conn:
+                    catalog.import_rows(conn, rows)
+            started = time.perf_counter()
+            self.main.knowledge_base.refresh()
+            return {"drugs": db.session.query(db.func.count(Medicine.id)).scalar(),
+                    "kb_reload_ms": round(_ms(started), 1)}
+
+    # --- Benchmarks ---
+
+    def bench_reminder(self, args):
+        from models import db, Schedule
+        from reminders import IST_OFFSET
+
+        result = self.seed_users(args.users, args.schedules, args.history_days)
+        main = self.main
+        today = (datetime.utcnow() + IST_OFFSET).date()
+        load_ms, tick_ms, idle_ms, batch = [], [], [], []
+        with self.app.app_context():
+            main.reminder_lease.heartbeat()
+            # One tick per simulated day, so every run fires a fresh batch
+            for run in range(args.runs):
+                day = today + timedelta(days=run)
+                fire_at = datetime.strptime(f"{day} {DUE_TIME}", "%Y-%m-%d %H:%M") - IST_OFFSET
+
+                started = time.perf_counter()
+                schedules = Schedule.query.filter(
+                    Schedule.is_active == True,
+                    Schedule.days_mask != 0,
+                    main.reminder_lease.shard_filter(Schedule.user_id)
+                ).all()
+                main.reminder_scheduler.load(schedules, now=fire_at - timedelta(minutes=1))
+                load_ms.append(_ms(started))
+
+                started = time.perf_counter()
+                due = main.reminder_scheduler.pop_due(fire_at)
+                main.send_due_reminders(due, fire_at)
+                main.send_snoozed_reminders(fire_at)
+                tick_ms.append(_ms(started))
+                batch.append(len(due))
+
+                # Nothing due a second later: the steady-state cost of waking up
+                started = time.perf_counter()
+                main.send_due_reminders(main.reminder_scheduler.pop_due(fire_at + timedelta(seconds=1)), fire_at)
+                main.send_snoozed_reminders(fire_at + timedelta(seconds=1))
+                idle_ms.append(_ms(started))
+                db.session.remove()
+            main.reminder_lease.release()
+
+        result.update(
+            due_batch=max(batch),
+            resync=percentiles(load_ms),
+            tick=percentiles(tick_ms),
+            idle_tick=percentiles(idle_ms),
+        )
+        return result
+
+    def _ask(self, size, requests):
+        from models import Medicine
+        with self.app.app_context():
+            names = [name for (name,) in Medicine.query.with_entities(Medicine.name)
+                     .order_by(Medicine.id).limit(size).all()]
+        questions = [self.rng.choice(QUESTIONS).format(self.rng.choice(names)) for _ in range(requests)]
+
+        started = time.perf_counter()
+        self.client.post("/ask", json={"question": questions[0]}, headers=self.user_headers)
+        first_ms = _ms(started)
+
+        samples = []
+        wall = time.perf_counter()
+        for question in questions:
+            started = time.perf_counter()
+            response = self.client.post("/ask", json={"question": question}, headers=self.user_headers)
+            samples.append(_ms(started))
+            if response.status_code != 200:
+                raise RuntimeError(f"/ask returned {response.status_code}")
+        elapsed = time.perf_counter() - wall
+        return dict(percentiles(samples), first_ms=round(first_ms, 3), rps=round(len(samples) / elapsed, 1))
+
+    def _add(self, adds):
+        samples = []
+        for _ in range(adds):
+            row = drug_row(self.next_drug, self.rng)
+            self.next_drug += 1
+            started = time.perf_counter()
+            response = self.client.post("/admin/add-medicine", json=row, headers=self.admin_headers)
+            samples.append(_ms(started))
+            if response.status_code != 201:
+                raise RuntimeError(f"/admin/add-medicine returned {response.status_code}")
+        return percentiles(samples)
+
+    def bench_catalog(self, args, which):
+        results = {}
+        for size in sorted(args.drugs):
+            entry = results[str(size)] = self.grow_catalog(size)
+            if "ask" in which:
+                entry["ask"] = self._ask(size, args.requests)
+            if "add" in which:
+                entry["add"] = self._add(args.adds)
+        return results
+
+    def bench_upload(self, args):
+        if not shutil.which("tesseract"):
+            return {"skipped": "tesseract is not installed"}
+        results = {}
+        for path in args.images:
+            with open(path, "rb") as f:
+                data = f.read()
+            samples = {}
+            for attempt in ("cold", "cached"):
+                started = time.perf_counter()
+                response = self.client.post("/upload", headers=self.user_headers, data={
+                    "file": (io.BytesIO(data), os.path.basename(path))
+                }, content_type="multipart/form-data")
+                accept_ms = _ms(started)
+                body = response.get_json(silent=True) or {"status": f"http {response.status_code}"}
+                status_url = body.get("status_url")
+                while body.get("status") in ("queued", "running") and _ms(started) < args.upload_timeout * 1000:
+                    time.sleep(0.02)
+                    body = self.client.get(status_url, headers=self.user_headers).get_json()
+                samples[attempt] = {
+                    "status": body.get("status"),
+                    "accept_ms": round(accept_ms, 3),
+                    "done_ms": round(_ms(started), 3),
+                    "medicines": len(body.get("medicines") or []),
+                }
+                if body.get("status") == "failed":
+                    samples[attempt]["error"] = body.get("error")
+            results[os.path.basename(path)] = samples
+        return results
+
+
+def compare(current, baseline, tolerance, path=""):
+    """Yield (path, baseline, current) for every metric worse than baseline by more than `tolerance`."""
+    if isinstance(current, dict) and isinstance(baseline, dict):
+        for key, value in current.items():
+            if key in baseline:
+                yield from compare(value, baseline[key], tolerance, f"{path}.{key}" if path else key)
+        return
+    if not isinstance(current, (int, float)) or not isinstance(baseline, (int, float)) or not baseline:
+        return
+    name = path.rsplit(".", 1)[-1]
+    if name.endswith("_ms") and name != "seed_ms" and current > baseline * (1 + tolerance):
+        yield path, baseline, current
+    elif name == "rps" and current < baseline * (1 - tolerance):
+        yield path, baseline, current
+
+
+def _git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR,
+                              capture_output=True, text=True, timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("benchmarks", nargs="*", metavar="benchmark",
+                        help=f"any of {', '.join(BENCHMARKS)} (default: all)")
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--schedules", type=int, default=3, help="schedules per user")
+    parser.add_argument("--history-days", type=int, default=14)
+    parser.add_argument("--runs", type=int, default=3, help="reminder ticks to time")
+    parser.add_argument("--drugs", type=int, nargs="+", default=[100, 10000, 100000])
+    parser.add_argument("--requests", type=int, default=200, help="/ask requests per catalog size")
+    parser.add_argument("--adds", type=int, default=20, help="/admin/add-medicine calls per catalog size")
+    parser.add_argument("--images", nargs="+", default=[os.path.join(BACKEND_DIR, "ocr", "data", "input_image.jpg")])
+    parser.add_argument("--upload-timeout", type=float, default=120)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--workdir", help="keep the database and uploads here instead of a temp directory")
+    parser.add_argument("--json", help="write the results to this file")
+    parser.add_argument("--compare", help="baseline JSON from an earlier run")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed slowdown vs --compare (0.2 = 20%%)")
+    args = parser.parse_args()
+    unknown = set(args.benchmarks) - set(BENCHMARKS)
+    if unknown:
+        parser.error(f"unknown benchmark: {', '.join(sorted(unknown))}")
+    which = [name for name in BENCHMARKS if name in (args.benchmarks or BENCHMARKS)]
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix="medassist-bench-")
+    os.makedirs(workdir, exist_ok=True)
+    try:
+        bench = Bench(workdir, args.seed)
+        results = {}
+        if "reminder" in which:
+            results["reminder"] = bench.bench_reminder(args)
+            r = results["reminder"]
+            print(f"reminder  {r['users']} users, batch {r['due_batch']}: tick p50 {r['tick']['p50_ms']} ms, "
+                  f"resync p50 {r['resync']['p50_ms']} ms, idle p50 {r['idle_tick']['p50_ms']} ms")
+        if "ask" in which or "add" in which:
+            results["catalog"] = bench.bench_catalog(args, which)
+            for size, r in results["catalog"].items():
+                line = f"catalog   {r['drugs']:>7} drugs: reload {r['kb_reload_ms']} ms"
+                if "ask" in r:
+                    line += f", /ask {r['ask']['rps']} req/s p95 {r['ask']['p95_ms']} ms"
+                if "add" in r:
+                    line += f", add-medicine p50 {r['add']['p50_ms']} ms"
+                print(line)
+        if "upload" in which:
+            results["upload"] = bench.bench_upload(args)
+            for image, r in results["upload"].items():
+                if image == "skipped":
+                    print(f"upload    skipped: {r}")
+                    continue
+                print(f"upload    {image}: cold {r['cold']['status']} accept {r['cold']['accept_ms']} ms, "
+                      f"done {r['cold']['done_ms']} ms; cached {r['cached']['done_ms']} ms")
+    finally:
+        if not args.workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {
+        "meta": {
+            "timestamp": datetime.utcnow().isoformat() + "Z",
+            "revision": _git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "args": {k: v for k, v in vars(args).items() if k not in ("json", "compare", "workdir")},
+        },
+        "results": results,
+    }
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = list(compare(results, baseline.get("results", {}), args.tolerance))
+        for path, before, after in regressions:
+            print(f"REGRESSION {path}: {before} -> {after}")
+        if regressions:
+            sys.exit(1)
+        print(f"No regressions beyond {args.tolerance:.0%} against {args.compare}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,167 @@
+"""Medicine catalog stored in the `medicine` table.
+
+Every write bumps the single `catalog_version` row in the same transaction.
+KnowledgeBase polls that row to notice changes made by any worker.
+Functions taking `conn` accept either a Connection (migrations) or
+db.session (request handlers).
+"""
+import csv
+import io
+import os
+from datetime import datetime
+
+from sqlalchemy import bindparam, insert, select, update
+
+from models import CatalogVersion, Medicine
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+# Bundled workbook the table is seeded from on first start (migration 3)
+SEED_WORKBOOK = os.path.join(BASE_DIR, "drug_database", "medicine_database.xlsx")
+
+# Workbook / CSV header -> Medicine column
+COLUMNS = {
+    "Name": "name",
+    "Used for": "used_for",
+    "How it works": "how_it_works",
+    "Common side effects": "side_effects",
+    "Notes": "notes",
+}
+
+IMPORT_CHUNK = 500
+
+_table = Medicine.__table__
+_version_table = CatalogVersion.__table__
+
+
+def name_key(name):
+    return " ".join(name.lower().split())
+
+
+def _clean(value):
+    if value is None or (isinstance(value, float) and value != value):
+        return ""
+    return str(value).strip()
+
+
+def bump_version(conn):
+    """Increment the catalog version inside the caller's transaction; returns the new version."""
+    conn.execute(
+        update(_version_table)
+        .where(_version_table.c.id == 1)
+        .values(version=_version_table.c.version + 1, updated_at=datetime.utcnow())
+    )
+    return conn.execute(select(_version_table.c.version).where(_version_table.c.id == 1)).scalar_one()
+
+
+def iter_rows(stream, filename):
+    """Yield (row_number, {column: value}) from an .xlsx or .csv upload without loading it whole.
+
+    Raises ValueError for unsupported files or a header without a Name column.
+    """
+    ext = os.path.splitext(filename)[1].lower()
+    if ext == ".csv":
+        reader = csv.reader(io.TextIOWrapper(stream, encoding="utf-8-sig", newline=""))
+    elif ext in (".xlsx", ".xlsm"):
+        import openpyxl
+        workbook = openpyxl.load_workbook(stream, read_only=True, data_only=True)
+        reader = workbook.active.iter_rows(values_only=True)
+    else:
+        raise ValueError("Upload an .xlsx or .csv file")
+
+    header = [_clean(cell).lower() for cell in next(reader, None) or []]
+    positions = {
+        column: header.index(title.lower()) for title, column in COLUMNS.items() if title.lower() in header
+    }
+    if "name" not in positions:
+        raise ValueError("The first row must have a 'Name' column")
+
+    for number, row in enumerate(reader, start=2):
+        yield number, {
+            column: _clean(row[index]) if index < len(row) else "" for column, index in positions.items()
+        }
+
+
+def import_rows(conn, rows, chunk_size=IMPORT_CHUNK):
+    """Upsert (row_number, values) pairs by name in chunks; returns a report.
+
+    The caller owns the transaction, so an import is applied whole or not at
+    all. Each chunk costs one indexed lookup of the names it contains plus
+    one bulk insert and one bulk update.
+    """
+    report = {"inserted": 0, "updated": 0, "errors": []}
+
+    def flush(chunk):
+        existing = dict(conn.execute(
+            select(_table.c.name_key, _table.c.id).where(_table.c.name_key.in_(list(chunk)))
+        ).all())
+        new_rows = [values for key, values in chunk.items() if key not in existing]
+        changed = [dict(values, b_id=existing[key]) for key, values in chunk.items() if key in existing]
+        if new_rows:
+            conn.execute(insert(_table), new_rows)
+        if changed:
+            # Only the columns present in the file are overwritten
+            for columns in {tuple(sorted(values)) for values in changed}:
+                batch = [values for values in changed if tuple(sorted(values)) == columns]
+                conn.execute(update(_table).where(_table.c.id == bindparam("b_id")), batch)
+        report["inserted"] += len(new_rows)
+        report["updated"] += len(changed)
+
+    now = datetime.utcnow()
+    chunk = {}
+    for number, values in rows:
+        if not values.get("name"):
+            report["errors"].append({"row": number, "error": "Missing name"})
+            continue
+        key = name_key(values["name"])
+        if key in chunk:
+            # Later rows for the same medicine win
+            chunk[key].update(values)
+            continue
+        chunk[key] = dict(values, name_key=key, updated_at=now)
+        if len(chunk) >= chunk_size:
+            flush(chunk)
+            chunk = {}
+    if chunk:
+        flush(chunk)
+
+    if report["inserted"] or report["updated"]:
+        report["version"] = bump_version(conn)
+    return report
+
+
+def export_rows(conn, batch_size=1000):
+    """Yield catalog rows in workbook column order, streamed from the database."""
+    columns = [_table.c[column] for column in COLUMNS.values()]
+    result = conn.execute(
+        select(*columns).order_by(_table.c.id).execution_options(yield_per=batch_size)
+    )
+    for row in result:
+        yield tuple(row)
+
+
+def export_workbook(conn):
+    """Build an .xlsx of the whole catalog; returns a BytesIO."""
+    import openpyxl
+    workbook = openpyxl.Workbook(write_only=True)
+    sheet = workbook.create_sheet("Medicines")
+    sheet.append(list(COLUMNS))
+    for row in export_rows(conn):
+        sheet.append(list(row))
+    output = io.BytesIO()
+    workbook.save(output)
+    output.seek(0)
+    return output
+
+
+def export_csv(conn):
+    """Yield the catalog as CSV text, a chunk of rows at a time."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(list(COLUMNS))
+    for number, row in enumerate(export_rows(conn), start=1):
+        writer.writerow(row)
+        if number % IMPORT_CHUNK == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
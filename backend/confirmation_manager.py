@@ -1,79 +1,236 @@
+"""Dose confirmations kept as an append-only journal, one segment per date.
+
+Every change is one JSON line appended to confirmations/<date>.jsonl, so a
+mutation costs a single small write however long the history is. Each
+segment is replayed into an in-memory index the first time it is touched;
+later reads only replay bytes other processes appended since (tracked by
+offset and inode). A torn last line from a crash is ignored on replay.
+
+Segments for past dates are compacted (one "state" line per dose,
+written to a temp file and renamed) the first time a new day is seen, or
+on demand with `python confirmation_manager.py compact`.
+"""
 import json
 import os
+import sys
+import threading
+from collections import OrderedDict
 from datetime import datetime, timedelta
 
-CONFIRM_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "confirmations.json")
+try:
+    import fcntl
+except ImportError:  # Windows: appends are still atomic, compaction is not locked
+    fcntl = None
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+CONFIRM_DIR = os.path.join(BASE_DIR, "confirmations")
+# Pre-journal store, imported once when the journal directory is first created
+LEGACY_FILE = os.path.join(BASE_DIR, "confirmations.json")
+
+# fsync every append so an acknowledged change survives a crash
+FSYNC = os.getenv("CONFIRM_FSYNC", "1") != "0"
+# Past-date segments kept in memory besides today's
+MAX_CACHED_DAYS = 7
+
+
+class Segment:
+    __slots__ = ("entries", "offset", "inode", "lines")
+
+    def __init__(self):
+        self.entries = {}
+        self.offset = 0
+        self.inode = None
+        self.lines = 0
+
+
+_lock = threading.RLock()
+_segments = OrderedDict()
+_today = None
+_dirty = set()
 
-def load_confirmations():
-    if os.path.exists(CONFIRM_FILE):
+
+def _path(date_str):
+    return os.path.join(CONFIRM_DIR, f"{date_str}.jsonl")
+
+
+def _apply(entries, event):
+    key = event.pop("k")
+    op = event.pop("op")
+    if op == "state":
+        entries[key] = event
+    elif op == "sent":
+        entries.setdefault(key, dict(event, status="sent"))
+    else:
+        entries.setdefault(key, {}).update(event, status=op)
+
+
+def _ensure_dir():
+    if os.path.isdir(CONFIRM_DIR):
+        return
+    os.makedirs(CONFIRM_DIR, exist_ok=True)
+    if os.path.exists(LEGACY_FILE):
         try:
-            with open(CONFIRM_FILE, "r") as f:
-                return json.load(f)
-        except:
-            return {}
-    return {}
+            with open(LEGACY_FILE, "r") as f:
+                legacy = json.load(f)
+        except (OSError, ValueError):
+            legacy = {}
+        for date_str, day in legacy.items():
+            _write_segment(date_str, day)
+
+
+def _segment(date_str):
+    """Index for `date_str`, caught up with anything appended since last time."""
+    seg = _segments.get(date_str)
+    if seg is None:
+        seg = _segments[date_str] = Segment()
+    _segments.move_to_end(date_str)
+    while len(_segments) > MAX_CACHED_DAYS + 1:
+        oldest = next(d for d in _segments if d not in (_today, date_str))
+        del _segments[oldest]
+
+    try:
+        st = os.stat(_path(date_str))
+    except FileNotFoundError:
+        return seg
+    if st.st_ino != seg.inode:
+        # First read, or the segment was compacted underneath us
+        seg.entries, seg.offset, seg.inode, seg.lines = {}, 0, st.st_ino, 0
+    if st.st_size > seg.offset:
+        with open(_path(date_str), "rb") as f:
+            f.seek(seg.offset)
+            data = f.read(st.st_size - seg.offset)
+        # Only complete lines; a torn tail is picked up once it is finished
+        end = data.rfind(b"\n") + 1
+        for line in data[:end].splitlines():
+            try:
+                _apply(seg.entries, json.loads(line))
+                seg.lines += 1
+            except (ValueError, KeyError):
+                continue
+        seg.offset += end
+    return seg
+
+
+def _append(date_str, event):
+    line = (json.dumps(event, separators=(",", ":")) + "\n").encode("utf-8")
+    path = _path(date_str)
+    while True:
+        fd = os.open(path, os.O_RDWR | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            if fcntl:
+                fcntl.flock(fd, fcntl.LOCK_SH)
+                # Compacted meanwhile: this inode is no longer the segment
+                if os.fstat(fd).st_ino != os.stat(path).st_ino:
+                    continue
+            if os.fstat(fd).st_size:
+                # Terminate a line torn by a crash so ours stays parseable
+                os.lseek(fd, -1, os.SEEK_END)
+                if os.read(fd, 1) != b"\n":
+                    line = b"\n" + line
+            os.write(fd, line)
+            if FSYNC:
+                os.fsync(fd)
+            return
+        finally:
+            os.close(fd)
+
+
+def _write_segment(date_str, entries):
+    tmp_path = f"{_path(date_str)}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        for key, entry in entries.items():
+            f.write(json.dumps(dict(entry, k=key, op="state"), separators=(",", ":")) + "\n")
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, _path(date_str))
+
+
+def _compact_segment(date_str):
+    path = _path(date_str)
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except FileNotFoundError:
+        return False
+    try:
+        if fcntl:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+        seg = _segment(date_str)
+        if seg.lines <= len(seg.entries):
+            return False
+        _write_segment(date_str, seg.entries)
+        # Our index already reflects the compacted file
+        st = os.stat(path)
+        seg.offset, seg.inode, seg.lines = st.st_size, st.st_ino, len(seg.entries)
+        return True
+    finally:
+        os.close(fd)
+
+
+def compact(before=None):
+    """Compact every segment dated before `before` (default: today); returns how many changed."""
+    before = before or datetime.now().strftime("%Y-%m-%d")
+    with _lock:
+        _ensure_dir()
+        dates = sorted(name[:-len(".jsonl")] for name in os.listdir(CONFIRM_DIR) if name.endswith(".jsonl"))
+        return sum(1 for date_str in dates if date_str < before and _compact_segment(date_str))
+
+
+def _touch(date_str):
+    # Day rollover: compact the days this process wrote to, now that they are done
+    global _today
+    _ensure_dir()
+    today = datetime.now().strftime("%Y-%m-%d")
+    if today != _today:
+        _today = today
+        for old in sorted(d for d in _dirty if d < today):
+            _compact_segment(old)
+            _dirty.discard(old)
+    if date_str != today:
+        _dirty.add(date_str)
+    return _segment(date_str)
+
+
+def _record(date_str, key, op, **fields):
+    _touch(date_str)
+    _append(date_str, dict(fields, k=key, op=op))
+    # Replays just our line (plus anything other processes appended meanwhile)
+    _segment(date_str)
 
-def save_confirmations(data):
-    with open(CONFIRM_FILE, "w") as f:
-        json.dump(data, f, indent=4)
 
 def record_sent(medicine_id, medicine_name, scheduled_time, date_str):
-    data = load_confirmations()
-    if date_str not in data:
-        data[date_str] = {}
-    
     key = f"{medicine_id}_{scheduled_time}"
-    if key not in data[date_str]:
-        data[date_str][key] = {
-            "name": medicine_name,
-            "status": "sent",
-            "sent_at": datetime.now().isoformat()
-        }
-        save_confirmations(data)
+    with _lock:
+        if key not in _touch(date_str).entries:
+            _record(date_str, key, "sent", name=medicine_name, sent_at=datetime.now().isoformat())
 
 def mark_taken(medicine_id, scheduled_time, date_str):
-    data = load_confirmations()
-    if date_str not in data:
-        data[date_str] = {}
-    
-    key = f"{medicine_id}_{scheduled_time}"
-    if key not in data[date_str]:
-        data[date_str][key] = {}
-        
-    data[date_str][key].update({
-        "status": "taken",
-        "taken_at": datetime.now().isoformat()
-    })
-    save_confirmations(data)
+    with _lock:
+        _record(date_str, f"{medicine_id}_{scheduled_time}", "taken", taken_at=datetime.now().isoformat())
 
 def mark_snoozed(medicine_id, scheduled_time, date_str, snooze_minutes=30):
-    data = load_confirmations()
-    if date_str not in data:
-        data[date_str] = {}
-    
-    key = f"{medicine_id}_{scheduled_time}"
-    if key not in data[date_str]:
-        data[date_str][key] = {}
-        
     snooze_until = (datetime.now() + timedelta(minutes=snooze_minutes)).strftime("%H:%M")
-    data[date_str][key].update({
-        "status": "snoozed",
-        "snooze_until": snooze_until,
-        "snoozed_at": datetime.now().isoformat()
-    })
-    save_confirmations(data)
+    with _lock:
+        _record(date_str, f"{medicine_id}_{scheduled_time}", "snoozed",
+                snooze_until=snooze_until, snoozed_at=datetime.now().isoformat())
 
 def get_status(medicine_id, scheduled_time, date_str):
-    data = load_confirmations()
-    key = f"{medicine_id}_{scheduled_time}"
-    return data.get(date_str, {}).get(key)
+    with _lock:
+        entry = _touch(date_str).entries.get(f"{medicine_id}_{scheduled_time}")
+        return dict(entry) if entry is not None else None
 
 def get_pending_confirmations(date_str):
-    data = load_confirmations()
-    day_data = data.get(date_str, {})
-    return {k: v for k, v in day_data.items() if v.get("status") == "sent"}
+    with _lock:
+        entries = _touch(date_str).entries
+        return {k: dict(v) for k, v in entries.items() if v.get("status") == "sent"}
 
 def get_snoozed_confirmations(date_str):
-    data = load_confirmations()
-    day_data = data.get(date_str, {})
-    return {k: v for k, v in day_data.items() if v.get("status") == "snoozed"}
+    with _lock:
+        entries = _touch(date_str).entries
+        return {k: dict(v) for k, v in entries.items() if v.get("status") == "snoozed"}
+
+
+if __name__ == "__main__":
+    if sys.argv[1:] == ["compact"]:
+        print(f"Compacted {compact()} segments")
+    else:
+        print("usage: python confirmation_manager.py compact")
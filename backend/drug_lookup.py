@@ -1,32 +1,38 @@
 import os
 
-DETECTED_FILE = "backend/ocr/data/detected_medicines.txt"
-DRUGS_FOLDER = "backend/drug_database/drugs"
-OUTPUT_FILE = "backend/output/final_result.txt"
-
-# Read detected medicines
-if not os.path.exists(DETECTED_FILE):
-    print("❌ detected_medicines.txt not found")
-    exit()
-
-with open(DETECTED_FILE, "r", encoding="utf-8") as f:
-    medicines = [line.strip() for line in f if line.strip()]
-
-results = []
-
-for med in medicines:
-    drug_file = os.path.join(DRUGS_FOLDER, f"{med}.txt")
-    if os.path.exists(drug_file):
-        with open(drug_file, "r", encoding="utf-8") as df:
-            info = df.read()
-        results.append(f"--- {med.upper()} ---\n{info}\n")
-    else:
-        results.append(f"--- {med.upper()} ---\nNo information found.\n")
-
-# Save final result
-os.makedirs("backend/output", exist_ok=True)
-with open(OUTPUT_FILE, "w", encoding="utf-8") as out:
-    out.write("\n".join(results))
-
-print("✅ Drug lookup completed")
-print(f"✅ Final result saved to {OUTPUT_FILE}")
\ No newline at end of file
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+DETECTED_FILE = os.path.join(BASE_DIR, "ocr", "data", "detected_medicines.txt")
+DRUGS_FOLDER = os.path.join(BASE_DIR, "drug_database", "drugs")
+OUTPUT_DIR = os.path.join(BASE_DIR, "output")
+OUTPUT_FILE = os.path.join(OUTPUT_DIR, "final_result.txt")
+
+def lookup_drug(med, drugs_folder=DRUGS_FOLDER):
+    # Contents of drugs/<med>.txt, or None if there is no file for it
+    drug_file = os.path.join(drugs_folder, f"{med}.txt")
+    if not os.path.exists(drug_file):
+        return None
+    with open(drug_file, "r", encoding="utf-8") as df:
+        return df.read()
+
+def format_result(med, info):
+    return f"--- {med.upper()} ---\n{info if info is not None else 'No information found.'}\n"
+
+if __name__ == "__main__":
+    # Read detected medicines
+    if not os.path.exists(DETECTED_FILE):
+        print("❌ detected_medicines.txt not found")
+        exit()
+
+    with open(DETECTED_FILE, "r", encoding="utf-8") as f:
+        medicines = [line.strip() for line in f if line.strip()]
+
+    results = [format_result(med, lookup_drug(med)) for med in medicines]
+
+    # Save final result
+    os.makedirs(OUTPUT_DIR, exist_ok=True)
+    with open(OUTPUT_FILE, "w", encoding="utf-8") as out:
+        out.write("\n".join(results))
+
+    print("✅ Drug lookup completed")
+    print(f"✅ Final result saved to {OUTPUT_FILE}")
\ No newline at end of file
@@ -0,0 +1,113 @@
+"""Conditional, cursor-paginated list responses.
+
+A list's ETag is derived from a version counter that every write to the
+list bumps (User.schedule_version, CatalogVersion.version), plus the query
+parameters. So an unchanged list is answered with one indexed lookup and
+a 304, without loading or serializing any rows.
+
+Pagination is keyset-based: the cursor encodes the (sort value, id) of the
+last row returned, and the next page starts strictly after it. Pages stay
+cheap however deep the client goes, and rows added meanwhile are not
+skipped or repeated.
+"""
+import base64
+import hashlib
+import json
+
+from flask import jsonify, make_response, request
+from sqlalchemy import and_, or_
+
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 200
+
+
+class BadListRequest(ValueError):
+    pass
+
+
+def list_etag(scope, version):
+    # Query parameters shape the body, so they are part of the tag
+    params = json.dumps(sorted(request.args.items(multi=True)))
+    digest = hashlib.sha256(params.encode("utf-8")).hexdigest()[:16]
+    return f"{scope}-{version}-{digest}"
+
+
+def not_modified(etag):
+    """A 304 response if the client already has `etag`, else None."""
+    if request.if_none_match.contains(etag):
+        return _tag(make_response("", 304), etag)
+    return None
+
+
+def respond(body, etag):
+    return _tag(jsonify(body), etag)
+
+
+def _tag(response, etag):
+    response.set_etag(etag)
+    # Let browsers keep the list but revalidate it on every request
+    response.headers["Cache-Control"] = "private, no-cache"
+    return response
+
+
+def wants_page():
+    # Plain GETs keep returning the whole list as a JSON array
+    return "limit" in request.args or "cursor" in request.args
+
+
+def sort_order(allowed, default):
+    """Read ?sort=<key> or ?sort=-<key>; returns (column, descending)."""
+    sort = request.args.get("sort", default)
+    descending = sort.startswith("-")
+    column = allowed.get(sort.lstrip("-"))
+    if column is None:
+        raise BadListRequest(f"sort must be one of: {', '.join(sorted(allowed))}")
+    return column, descending
+
+
+def encode_cursor(sort_value, row_id):
+    raw = json.dumps([sort_value, row_id]).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor):
+    try:
+        sort_value, row_id = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        return sort_value, int(row_id)
+    except (ValueError, TypeError):
+        raise BadListRequest("Invalid cursor")
+
+
+def paginate(query, sort_column, id_column, descending, sort_key):
+    """Apply ?cursor= and ?limit= to `query`; returns (rows, next_cursor).
+
+    `sort_key(row)` gives the row's value for `sort_column`, the same value
+    the cursor carries.
+    """
+    try:
+        limit = min(max(int(request.args.get("limit", DEFAULT_LIMIT)), 1), MAX_LIMIT)
+    except ValueError:
+        raise BadListRequest("limit must be a number")
+
+    cursor = request.args.get("cursor")
+    if cursor:
+        after_value, after_id = decode_cursor(cursor)
+        if descending:
+            query = query.filter(or_(sort_column < after_value,
+                                     and_(sort_column == after_value, id_column < after_id)))
+        else:
+            query = query.filter(or_(sort_column > after_value,
+                                     and_(sort_column == after_value, id_column > after_id)))
+
+    if descending:
+        query = query.order_by(sort_column.desc(), id_column.desc())
+    else:
+        query = query.order_by(sort_column.asc(), id_column.asc())
+
+    # One extra row tells us whether there is a next page
+    rows = query.limit(limit + 1).all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(sort_key(rows[-1]), rows[-1].id)
+    return rows, next_cursor
@@ -3,16 +3,29 @@ from flask_cors import CORS
 from flask_sqlalchemy import SQLAlchemy
 from flask_jwt_extended import JWTManager, create_access_token, jwt_required, get_jwt_identity
 from werkzeug.security import generate_password_hash, check_password_hash
+from werkzeug.utils import secure_filename
+import atexit
+import multiprocessing
 import os
+import time
 import json
 import threading
-import time
 from datetime import datetime, timedelta
-from pywebpush import webpush, WebPushException
-from models import db, User, Schedule, Confirmation
-from ocr.ocr_engine import extract_text
-from rag.rag_engine import answer_question
+from models import db, User, Schedule, Confirmation, DAY_BITS, chunked
+from listing import BadListRequest, list_etag, not_modified, paginate, respond, sort_order, wants_page
+from push import PushDispatcher
+from reminders import (
+    MISSED_GRACE, ReminderScheduler, ScheduleChanges, ShardLease, claim_due_snoozes, create_confirmations,
+    load_subscribed_users, next_snooze_due, to_local
+)
+from migrations import run_migrations
+from adherence import confirmation_changed, is_on_time, summary as adherence_summary
+from ocr.jobs import OcrJobQueue, QueueFull
+from ocr.ocr_engine import page_count
+from ocr.store import UploadStore
+from rag.rag_engine import answer_question, extract_medicines, knowledge_base
 from admin import admin_bp
+import metrics
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -33,109 +46,210 @@ jwt = JWTManager(app)
 app.register_blueprint(admin_bp, url_prefix='/admin')
 
 # Ensure upload directory exists
-UPLOAD_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "uploads")
+UPLOAD_FOLDER = os.getenv("UPLOAD_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "uploads"))
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 
-with app.app_context():
-    db.create_all()
+# Under `python main.py`, spawned pool workers (OCR, password hashing) re-run
+# this file as __mp_main__; they only need the functions they are sent, so
+# schema setup and the reminder worker are left to the parent process
+POOL_WORKER = multiprocessing.parent_process() is not None
+
+if not POOL_WORKER:
+    with app.app_context():
+        db.create_all()
+        run_migrations()
+knowledge_base.init_app(app)
+metrics.init_app(app)
 
 # --- Push Notification Helper ---
-def send_web_push(subscription_info, message_body):
-    try:
-        webpush(
-            subscription_info=subscription_info,
-            data=message_body,
-            vapid_private_key=app.config['VAPID_PRIVATE_KEY'],
-            vapid_claims=app.config['VAPID_CLAIMS']
-        )
-        return True
-    except WebPushException as ex:
-        print(f"Web Push Error: {ex}")
-        return False
+def prune_subscription(user_id, endpoint):
+    # Called from a push thread when the push service says the subscription is gone
+    if user_id is None:
+        return
+    with app.app_context():
+        user = User.query.get(user_id)
+        # Leave it alone if the user has re-subscribed in the meantime
+        if user and user.push_subscription and json.loads(user.push_subscription).get("endpoint") == endpoint:
+            user.push_subscription = None
+            db.session.commit()
+            print(f"Removed expired push subscription for {user.username}")
+        db.session.remove()
+
+push_dispatcher = PushDispatcher(
+    app.config['VAPID_PRIVATE_KEY'],
+    app.config['VAPID_CLAIMS'],
+    max_workers=int(os.getenv("PUSH_WORKERS", 8)),
+    on_gone=prune_subscription
+)
+
+def send_web_push(subscription_info, message_body, user_id=None):
+    # Delivery happens on the push pool so one slow push service can't hold up the rest
+    return push_dispatcher.submit(subscription_info, message_body, user_id=user_id)
 
 # --- Reminder Thread ---
+# Each worker process holds a lease and only handles its share of users
+reminder_lease = ShardLease(ttl=int(os.getenv("REMINDER_LEASE_TTL", 30)))
+reminder_scheduler = ReminderScheduler(owns=reminder_lease.owns)
+# Schedules written by other processes reach the owner's queue on its next tick
+schedule_changes = ScheduleChanges()
+
+# Full reload of active schedules, a backstop that also drops deleted ones
+REMINDER_RESYNC_SECONDS = int(os.getenv("REMINDER_RESYNC_SECONDS", 300))
+# Upper bound on how long the worker sleeps, so snoozes recorded by other processes are picked up
+SNOOZE_POLL_SECONDS = 30
+
+def send_due_reminders(due, now):
+    # Group by fire instant; normally the whole batch shares one
+    batches = {}
+    for schedule_id, fire_at in due:
+        batches.setdefault(fire_at, []).append(schedule_id)
+
+    pending = []
+    requeued = set()
+    for fire_at, schedule_ids in batches.items():
+        if fire_at is None:
+            continue
+        local = to_local(fire_at)
+        current_time = local.strftime("%H:%M")
+        # Re-check in SQL: the row may have been edited by another process since it was queued
+        schedules = [sch for chunk in chunked(schedule_ids) for sch in Schedule.query.filter(
+            Schedule.id.in_(chunk), *Schedule.due_filter(current_time, local.strftime("%a"))
+        )]
+        for sch in schedules:
+            reminder_scheduler.upsert(sch, now=now)
+            requeued.add(sch.id)
+            pending.append({
+                "user_id": sch.user_id,
+                "schedule_id": sch.id,
+                "medicine_name": sch.medicine_name,
+                "scheduled_time": current_time,
+                "date_str": local.strftime("%Y-%m-%d"),
+            })
+
+    # Edited, deleted or missed entries still need their next occurrence queued
+    leftovers = [schedule_id for schedule_id, _ in due if schedule_id not in requeued]
+    for chunk in chunked(leftovers):
+        for sch in Schedule.query.filter(Schedule.id.in_(chunk)):
+            reminder_scheduler.upsert(sch, now=now)
+
+    # Rows that already existed (another worker sent them) are skipped by the insert
+    created = create_confirmations(pending)
+    users = load_subscribed_users([user_id for _, user_id, _, _ in created])
+
+    for (user_id, scheduled_time), doses in coalesce_doses(created).items():
+        user = users.get(user_id)
+        if user:
+            sub = json.loads(user.push_subscription)
+            names = [name for _, name in doses]
+            if len(doses) == 1:
+                title, body = f"💊 Time for {names[0]}", f"It's {scheduled_time}. Please take your medicine."
+            else:
+                title, body = f"💊 Time for {len(doses)} medicines", f"It's {scheduled_time}. Please take {', '.join(names)}."
+            send_web_push(sub, reminder_payload(title, body, doses, scheduled_time), user_id=user_id)
+            print(f"Queued notification to {user.username} for {', '.join(names)}")
+
+def send_snoozed_reminders(now):
+    # Claiming flips the rows back to "sent", so each snooze fires exactly once
+    claimed = claim_due_snoozes(now, reminder_lease.shard_filter(Confirmation.user_id))
+    users = load_subscribed_users([user_id for _, user_id, _, _ in claimed])
+
+    for (user_id, scheduled_time), doses in coalesce_doses(claimed).items():
+        user = users.get(user_id)
+        if user:
+            sub = json.loads(user.push_subscription)
+            label = doses[0][1] if len(doses) == 1 else f"{len(doses)} medicines"
+            payload = reminder_payload(f"⏳ Snooze Ended: {label}", "Time to take your medication now!",
+                                       doses, scheduled_time)
+            send_web_push(sub, payload, user_id=user_id)
+
+def coalesce_doses(rows):
+    # One notification per user and scheduled minute, however many doses fall in it
+    groups = {}
+    for conf_id, user_id, medicine_name, scheduled_time in rows:
+        groups.setdefault((user_id, scheduled_time), []).append((conf_id, medicine_name))
+    return groups
+
+def reminder_payload(title, body, doses, scheduled_time):
+    # `id` / `name` describe the first dose for clients that only handle one;
+    # `ids` / `doses` list every dose, for POST /confirm with confirmation_ids
+    return json.dumps({
+        "title": title,
+        "body": body,
+        "id": doses[0][0],
+        "ids": [conf_id for conf_id, _ in doses],
+        "name": ", ".join(name for _, name in doses),
+        "doses": [{"id": conf_id, "name": name} for conf_id, name in doses],
+        "time": scheduled_time
+    })
+
 def reminder_worker():
+    # Sleeps until the next schedule is due instead of scanning the table on a
+    # fixed interval; /schedule writes update the queue in place.
     with app.app_context():
+        last_sync = None
+        last_tick = None
+        last_heartbeat = None
         while True:
+            next_snooze = None
+            tick_started = time.perf_counter()
             try:
-                # Render servers use UTC. Adjusting to IST (+5:30) for the user.
-                now = datetime.utcnow() + timedelta(hours=5, minutes=30)
-                current_time = now.strftime("%H:%M")
-                current_day = now.strftime("%a")
-                date_str = now.strftime("%Y-%m-%d")
-                
-                # Find all schedules matching current time and day
-                schedules = Schedule.query.filter_by(time=current_time, is_active=True).all()
+                now = datetime.utcnow()
+                resync = last_sync is None or (now - last_sync).total_seconds() >= REMINDER_RESYNC_SECONDS
+                if last_heartbeat is None or (now - last_heartbeat).total_seconds() >= reminder_lease.heartbeat_interval:
+                    if reminder_lease.heartbeat(now):
+                        print(f"Reminder shard {reminder_lease.index + 1}/{reminder_lease.count} ({reminder_lease.instance_id})")
+                        # Take over reminders a departed instance may have missed
+                        last_tick = min(last_tick or now, now - MISSED_GRACE)
+                        resync = True
+                    last_heartbeat = now
+
+                if resync:
+                    # Load relative to the previous tick so nothing due in between is skipped
+                    schedule_changes.reset()
+                    schedules = Schedule.query.filter(
+                        Schedule.is_active == True,
+                        Schedule.days_mask != 0,
+                        reminder_lease.shard_filter(Schedule.user_id)
+                    ).all()
+                    reminder_scheduler.load(schedules, now=last_tick or now)
+                    last_sync = now
+                else:
+                    # Likewise for rows written since: a dose due before we saw the write still fires
+                    for sch in schedule_changes.poll(reminder_lease.shard_filter(Schedule.user_id)):
+                        reminder_scheduler.upsert(sch, now=last_tick or now)
                 
-                for sch in schedules:
-                    days = json.loads(sch.days) if sch.days else []
-                    if current_day in days:
-                        # Check if already notified for this user, schedule, time, date
-                        exists = Confirmation.query.filter_by(
-                            schedule_id=sch.id, 
-                            scheduled_time=current_time, 
-                            date_str=date_str
-                        ).first()
-                        
-                        if not exists:
-                            try:
-                                # Create confirmation record
-                                conf = Confirmation(
-                                    user_id=sch.user_id,
-                                    schedule_id=sch.id,
-                                    medicine_name=sch.medicine_name,
-                                    scheduled_time=current_time,
-                                    date_str=date_str,
-                                    status="sent"
-                                )
-                                db.session.add(conf)
-                                db.session.commit()
-                                
-                                # Send Push Notification
-                                user = User.query.get(sch.user_id)
-                                if user and user.push_subscription:
-                                    sub = json.loads(user.push_subscription)
-                                    payload = json.dumps({
-                                        "title": f"💊 Time for {sch.medicine_name}",
-                                        "body": f"It's {sch.time}. Please take your medicine.",
-                                        "id": conf.id,
-                                        "name": sch.medicine_name,
-                                        "time": sch.time
-                                    })
-                                    send_web_push(sub, payload)
-                                    print(f"Sent notification to {user.username} for {sch.medicine_name}")
-                            except Exception as inner_e:
-                                db.session.rollback()
-                                # IntegrityError means someone else already sent it
-                                if "UniqueConstraint" in str(inner_e) or "UNIQUE constraint failed" in str(inner_e):
-                                    continue
-                                print(f"Error creating confirmation: {inner_e}")
+                due = reminder_scheduler.pop_due(now)
+                metrics.REMINDER_BATCH_SIZE.observe(len(due))
+                if due:
+                    send_due_reminders(due, now)
+                last_tick = now
                 
                 # Handle Snoozed Reminders
-                snoozed = Confirmation.query.filter_by(status="snoozed", date_str=date_str).all()
-                for conf in snoozed:
-                    if conf.snooze_until == current_time:
-                        conf.status = "sent" # Reset to sent for new notification
-                        db.session.commit()
-                        
-                        user = User.query.get(conf.user_id)
-                        if user.push_subscription:
-                            sub = json.loads(user.push_subscription)
-                            payload = json.dumps({
-                                "title": f"⏳ Snooze Ended: {conf.medicine_name}",
-                                "body": f"Time to take your medication now!",
-                                "id": conf.id,
-                                "name": conf.medicine_name,
-                                "time": conf.scheduled_time
-                            })
-                            send_web_push(sub, payload)
+                send_snoozed_reminders(now)
+                next_snooze = next_snooze_due(reminder_lease.shard_filter(Confirmation.user_id))
                             
             except Exception as e:
+                db.session.rollback()
+                metrics.REMINDER_ERRORS.inc()
                 print(f"Reminder Worker Error: {e}")
+            finally:
+                db.session.remove()
+                metrics.REMINDER_TICK_SECONDS.observe(time.perf_counter() - tick_started)
             
-            time.sleep(40)
+            reminder_scheduler.wait(min(SNOOZE_POLL_SECONDS, reminder_lease.heartbeat_interval), wake_at=next_snooze)
+
+def release_reminder_lease():
+    # Hand our shard over immediately instead of waiting for the lease to expire
+    try:
+        with app.app_context():
+            reminder_lease.release()
+    except Exception as e:
+        print(f"Could not release reminder lease: {e}")
 
-threading.Thread(target=reminder_worker, daemon=True).start()
+# Set REMINDER_WORKER=0 on processes that should only serve the API
+if os.getenv("REMINDER_WORKER", "1") != "0" and not POOL_WORKER:
+    threading.Thread(target=reminder_worker, name="reminder-worker", daemon=True).start()
+    atexit.register(release_reminder_lease)
 
 # --- Auth Routes ---
 @app.route("/register", methods=["POST"])
@@ -188,15 +302,49 @@ def manage_schedule():
             user_id=user_id,
             medicine_name=data.get("name"),
             time=data.get("time"),
-            period=data.get("period"),
-            days=json.dumps(data.get("days", []))
+            period=data.get("period")
         )
+        new_sch.set_days(data.get("days", []))
         db.session.add(new_sch)
+        User.bump_schedule_version(user_id)
         db.session.commit()
+        reminder_scheduler.upsert(new_sch)
         return jsonify({"message": "Scheduled successfully", "id": new_sch.id})
     
-    schedules = Schedule.query.filter_by(user_id=user_id, is_active=True).all()
-    return jsonify([s.to_dict() for s in schedules])
+    # Unchanged since the client's copy: one primary-key lookup and a 304
+    version = db.session.query(User.schedule_version).filter_by(id=user_id).scalar()
+    etag = list_etag(f"schedule-{user_id}", version)
+    unchanged = not_modified(etag)
+    if unchanged:
+        return unchanged
+
+    query = Schedule.query.filter_by(user_id=user_id, is_active=True)
+    args = request.args
+    try:
+        if args.get("name"):
+            query = query.filter(db.func.lower(Schedule.medicine_name).contains(args["name"].lower(), autoescape=True))
+        if args.get("period"):
+            query = query.filter(Schedule.period == args["period"])
+        if args.get("day"):
+            if args["day"] not in DAY_BITS:
+                raise BadListRequest(f"day must be one of: {', '.join(DAY_BITS)}")
+            query = query.filter(Schedule.days_mask.op('&')(DAY_BITS[args["day"]]) != 0)
+        if args.get("time_from"):
+            query = query.filter(Schedule.time >= args["time_from"])
+        if args.get("time_to"):
+            query = query.filter(Schedule.time <= args["time_to"])
+        column, descending = sort_order(
+            {"id": Schedule.id, "time": Schedule.time, "name": Schedule.medicine_name}, "id"
+        )
+        if not wants_page():
+            schedules = query.order_by(column.desc() if descending else column, Schedule.id).all()
+            return respond([s.to_dict() for s in schedules], etag)
+        schedules, next_cursor = paginate(
+            query, column, Schedule.id, descending, lambda s: getattr(s, column.key)
+        )
+    except BadListRequest as e:
+        return jsonify({"error": str(e)}), 400
+    return respond({"items": [s.to_dict() for s in schedules], "next_cursor": next_cursor}, etag)
 
 @app.route("/schedule/<int:sch_id>", methods=["PUT", "DELETE"])
 @jwt_required()
@@ -209,35 +357,91 @@ def update_delete_schedule(sch_id):
     
     if request.method == "DELETE":
         db.session.delete(sch)
+        User.bump_schedule_version(user_id)
         db.session.commit()
+        reminder_scheduler.remove(sch_id)
         return jsonify({"message": "Deleted successfully"})
     
     data = request.json
     sch.medicine_name = data.get("name", sch.medicine_name)
     sch.time = data.get("time", sch.time)
-    sch.days = json.dumps(data.get("days", json.loads(sch.days)))
+    sch.set_days(data.get("days", json.loads(sch.days)))
+    User.bump_schedule_version(user_id)
     db.session.commit()
+    reminder_scheduler.upsert(sch)
     return jsonify({"message": "Updated successfully"})
 
+# Most confirmation ids accepted by one POST /confirm
+MAX_CONFIRM_BATCH = 50
+# Longest snooze, in minutes
+MAX_SNOOZE_MINUTES = 24 * 60
+
+def apply_confirmation(conf, status, minutes, now):
+    old_status = conf.status
+    was_snoozed = conf.snooze_until is not None
+    was_on_time = old_status == "taken" and is_on_time(conf)
+    conf.status = status
+    if status == "snoozed":
+        conf.due_at = now + timedelta(minutes=minutes)
+        conf.snooze_until = to_local(conf.due_at).strftime("%H:%M")
+    else:
+        conf.due_at = None
+        if old_status != "taken":
+            conf.taken_at = now
+    confirmation_changed(conf, old_status, was_snoozed, was_on_time)
+
 @app.route("/confirm", methods=["POST"])
 @jwt_required()
 def confirm_medicine():
+    # One dose ({"confirmation_id": 1}) or every dose of a coalesced
+    # reminder ({"confirmation_ids": [1, 2, 3]}), in one transaction
     data = request.json
-    conf_id = data.get("confirmation_id")
     status = data.get("status") # taken, snoozed
-    
-    conf = Confirmation.query.get(conf_id)
-    if not conf:
+    if status not in ("taken", "snoozed"):
+        return jsonify({"message": "status must be 'taken' or 'snoozed'"}), 400
+    batch = "confirmation_ids" in data
+    conf_ids = data.get("confirmation_ids") if batch else [data.get("confirmation_id")]
+    try:
+        if not isinstance(conf_ids, list) or not 0 < len(conf_ids) <= MAX_CONFIRM_BATCH:
+            raise ValueError
+        conf_ids = [int(conf_id) for conf_id in conf_ids]
+    except (TypeError, ValueError):
+        return jsonify({"message": f"confirmation_ids must be a list of 1 to {MAX_CONFIRM_BATCH} ids"}), 400
+    minutes = data.get("minutes", 30)
+    if status == "snoozed" and (isinstance(minutes, bool) or not isinstance(minutes, int)
+                                or not 1 <= minutes <= MAX_SNOOZE_MINUTES):
+        return jsonify({"message": f"minutes must be a whole number from 1 to {MAX_SNOOZE_MINUTES}"}), 400
+
+    user_id = int(get_jwt_identity())
+    confs = Confirmation.query.filter(
+        Confirmation.id.in_(conf_ids), Confirmation.user_id == user_id
+    ).order_by(Confirmation.id).all()
+    if not confs:
         return jsonify({"message": "Confirmation record not found"}), 404
-        
-    conf.status = status
-    if status == "snoozed":
-        minutes = data.get("minutes", 30)
-        snooze_time = (datetime.now() + timedelta(minutes=minutes)).strftime("%H:%M")
-        conf.snooze_until = snooze_time
-        
+
+    now = datetime.utcnow()
+    for conf in confs:
+        apply_confirmation(conf, status, minutes, now)
     db.session.commit()
-    return jsonify({"message": f"Medicine marked as {status}"})
+    if status == "snoozed":
+        reminder_scheduler.notify()
+    if not batch:
+        return jsonify({"message": f"Medicine marked as {status}"})
+    found = {conf.id for conf in confs}
+    return jsonify({
+        "message": f"{len(confs)} medicines marked as {status}",
+        "updated": sorted(found),
+        "not_found": [conf_id for conf_id in conf_ids if conf_id not in found]
+    })
+
+@app.route("/adherence", methods=["GET"])
+@jwt_required()
+def my_adherence():
+    # ?from=&to= (YYYY-MM-DD, default last 30 days), ?group=medicine|day
+    try:
+        return jsonify(adherence_summary(request.args, ("medicine", "day"), user_id=int(get_jwt_identity())))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
 
 @app.route("/ask", methods=["POST"])
 @jwt_required()
@@ -247,57 +451,199 @@ def ask():
     answer = answer_question(question)
     return jsonify({"answer": answer})
 
+def medicines_result(text):
+    discovered_medicines = []
+    medicine_matches = []
+    try:
+        medicine_matches = extract_medicines(text)
+        discovered_medicines = [m["name"] for m in medicine_matches]
+    except Exception as e:
+        print(f"Extraction error: {e}")
+    return {
+        "medicines": discovered_medicines,
+        "medicine_matches": medicine_matches,
+        "kb_version": knowledge_base.snapshot().version
+    }
+
+def finish_ocr_job(job):
+    # Result fields added to a finished OCR job; also cached under the image hash
+    result = medicines_result(job["extracted_text"])
+    try:
+        upload_store.put_result(job["sha256"], dict(result, extracted_text=job["extracted_text"]),
+                                page=job.get("page"))
+    except OSError as e:
+        print(f"Could not cache OCR result: {e}")
+    return result
+
+def cached_result(sha, page=None):
+    # Earlier OCR of the same image (or PDF/TIFF page), without tesseract
+    cached = upload_store.get_result(sha, page)
+    if not cached:
+        return None
+    if cached.get("kb_version") != knowledge_base.snapshot().version:
+        # The catalog changed since; re-match the cached text
+        cached.update(medicines_result(cached["extracted_text"]))
+        upload_store.put_result(sha, cached, page=page)
+    cached.pop("kb_version", None)
+    return cached
+
+def batch_result(batch):
+    # Per-page results of a batch upload, merged into one response
+    pages = []
+    for entry in batch["pages"]:
+        item = {"file": entry["file"], "page": entry["page"], "sha256": entry["sha256"]}
+        if "result" in entry:
+            item.update(entry["result"], status="done", cached=True)
+        else:
+            job = ocr_jobs.get(entry["job_id"]) or {"status": "failed", "error": "Job record expired"}
+            item["job_id"] = entry["job_id"]
+            for key in ("status", "error", "extracted_text", "medicines", "medicine_matches", "timings", "finished_at"):
+                if key in job:
+                    item[key] = job[key]
+        pages.append(item)
+
+    # Same medicine on several pages: listed once, with its best confidence
+    merged = {}
+    for index, item in enumerate(pages):
+        for match in item.get("medicine_matches", []):
+            entry = merged.setdefault(match["name"].lower(), {"name": match["name"], "confidence": 0, "pages": []})
+            entry["confidence"] = max(entry["confidence"], match["confidence"])
+            entry["pages"].append(index)
+
+    statuses = {item["status"] for item in pages}
+    if "queued" in statuses:
+        status = "queued"
+    else:
+        status = "failed" if statuses == {"failed"} else "done"
+    result = {
+        "batch_id": batch["id"],
+        "status": status,
+        "status_url": f"/upload/batches/{batch['id']}",
+        "pages": pages,
+        "medicines": [m["name"] for m in merged.values()],
+        "medicine_matches": list(merged.values()),
+        "extracted_text": "\n\n".join(item.get("extracted_text", "") for item in pages if item["status"] == "done"),
+    }
+    if status != "queued":
+        finished = [item.pop("finished_at") for item in pages if "finished_at" in item]
+        result["timings"] = {
+            "ocr_ms": round(sum(item.get("timings", {}).get("ocr_ms", 0) for item in pages), 1),
+            "total_ms": round((max(finished) - batch["created_at"]) * 1000, 1) if finished else 0,
+        }
+    return result
+
+upload_store = UploadStore(
+    os.path.join(UPLOAD_FOLDER, "store"),
+    max_bytes=int(os.getenv("UPLOAD_STORE_MAX_MB", 500)) * 1024 * 1024
+)
+
+ocr_jobs = OcrJobQueue(
+    os.path.join(UPLOAD_FOLDER, "jobs"),
+    max_workers=int(os.getenv("OCR_WORKERS", 0)) or None,
+    max_pending=int(os.getenv("OCR_MAX_PENDING", 0)) or None,
+    job_timeout=int(os.getenv("OCR_JOB_TIMEOUT", 120)),
+    on_done=finish_ocr_job
+)
+metrics.Gauge("ocr_queue_depth", "OCR jobs queued or running in this process",
+              lambda: ocr_jobs.stats()["queue_depth"])
+
 @app.route("/upload", methods=["POST"])
 @jwt_required()
 def upload():
+    # Queues OCR and returns straight away; poll status_url for the result,
+    # which has the same extracted_text / medicines fields as before
     if "file" not in request.files:
         return jsonify({"error": "No file"}), 400
     file = request.files["file"]
-    filepath = os.path.join(UPLOAD_FOLDER, file.filename)
-    file.save(filepath)
-    text = extract_text(filepath)
-    
-    # Simple extraction logic: Match OCR lines against the drug database names
-    # or just return lines that look like medicine names.
-    # For now, let's load the DB and find matches in the text.
-    discovered_medicines = []
-    try:
-        from rag.rag_engine import load_drug_documents
-        docs = load_drug_documents()
-        lines = text.split('\n')
-        
-        # 1. First try matching against our RAG database (most accurate)
-        db_names_lower = {name.lower(): name for name in docs.keys()}
-        for line in lines:
-            line_lower = line.lower()
-            for db_name_lower, original_name in db_names_lower.items():
-                if db_name_lower in line_lower:
-                    if original_name.capitalize() not in discovered_medicines:
-                        discovered_medicines.append(original_name.capitalize())
-        
-        # 2. Heuristic: If we still have few results, look for words that look like medicine names
-        # (Usually 4+ letters, Title Case, not extremely common English words)
-        common_words = {"prescription", "patient", "doctor", "medicine", "tablets", "capsules", "morning", "evening", "night", "daily", "every", "take"}
-        if len(discovered_medicines) < 3:
-            for line in lines:
-                words = line.strip().split()
-                for word in words:
-                    # Clean the word
-                    clean_word = "".join(filter(str.isalpha, word))
-                    if len(clean_word) >= 4 and clean_word[0].isupper() and clean_word.lower() not in common_words:
-                        cap_word = clean_word.capitalize()
-                        if cap_word not in discovered_medicines:
-                            discovered_medicines.append(cap_word)
-    except Exception as e:
-        print(f"Extraction error: {e}")
+    user_id = int(get_jwt_identity())
+    ext = os.path.splitext(secure_filename(file.filename or ""))[1]
+    sha, filepath = upload_store.save(file.stream, ext)
 
-    print(f"DEBUG: Extracted text length: {len(text)}")
-    print(f"DEBUG: Discovered medicines: {discovered_medicines}")
+    # Same photo seen before: answer from the cache without running tesseract
+    cached = cached_result(sha)
+    if cached:
+        return jsonify(dict(cached, status="done", sha256=sha, cached=True))
+
+    try:
+        job = ocr_jobs.submit(filepath, dedup_key=(sha, user_id), user_id=user_id, sha256=sha)
+    except QueueFull as e:
+        return jsonify({"error": str(e)}), 503, {"Retry-After": "5"}
 
     return jsonify({
-        "extracted_text": text,
-        "medicines": discovered_medicines
-    })
+        "job_id": job["id"],
+        "status": job["status"],
+        "status_url": f"/upload/jobs/{job['id']}"
+    }), 202
+
+MAX_BATCH_PAGES = int(os.getenv("UPLOAD_BATCH_MAX_PAGES", 20))
+
+@app.route("/upload/batch", methods=["POST"])
+@jwt_required()
+def upload_batch():
+    # Several images and/or multi-page TIFF/PDF files in one request. Every
+    # page becomes its own OCR job, so pages run in parallel on the pool;
+    # poll status_url for the merged result.
+    files = request.files.getlist("files") or request.files.getlist("file")
+    if not files:
+        return jsonify({"error": "No file"}), 400
+    user_id = int(get_jwt_identity())
+
+    pages, items = [], []
+    for file in files:
+        filename = secure_filename(file.filename or "")
+        sha, filepath = upload_store.save(file.stream, os.path.splitext(filename)[1])
+        try:
+            count = page_count(filepath)
+        except Exception as e:
+            return jsonify({"error": f"Could not read {filename or 'file'}: {e}"}), 400
+        if len(pages) + count > MAX_BATCH_PAGES:
+            return jsonify({"error": f"At most {MAX_BATCH_PAGES} pages per batch"}), 413
+        for page in range(count):
+            # Single-page files share cache entries and jobs with /upload
+            page_key = page if count > 1 else None
+            entry = {"file": filename, "page": page, "sha256": sha}
+            cached = cached_result(sha, page_key)
+            if cached:
+                entry["result"] = cached
+            else:
+                dedup_key = (sha, user_id) if page_key is None else (sha, page_key, user_id)
+                entry["job"] = len(items)
+                items.append((filepath, page_key, dedup_key, {"user_id": user_id, "sha256": sha}))
+            pages.append(entry)
+
+    try:
+        jobs = ocr_jobs.submit_many(items)
+    except QueueFull as e:
+        return jsonify({"error": str(e)}), 503, {"Retry-After": "5"}
+    for entry in pages:
+        if "job" in entry:
+            entry["job_id"] = jobs[entry.pop("job")]["id"]
+
+    batch = ocr_jobs.create_batch(pages, user_id=user_id)
+    result = batch_result(batch)
+    return jsonify(result), 202 if result["status"] == "queued" else 200
+
+@app.route("/upload/batches/<batch_id>", methods=["GET"])
+@jwt_required()
+def upload_batch_status(batch_id):
+    batch = ocr_jobs.get(batch_id)
+    if not batch or batch.get("kind") != "batch" or batch.get("user_id") != int(get_jwt_identity()):
+        return jsonify({"message": "Batch not found"}), 404
+    return jsonify(batch_result(batch))
+
+@app.route("/upload/jobs/<job_id>", methods=["GET"])
+@jwt_required()
+def upload_job(job_id):
+    job = ocr_jobs.get(job_id)
+    if not job or job.get("kind") == "batch" or job.get("user_id") != int(get_jwt_identity()):
+        return jsonify({"message": "Job not found"}), 404
+    return jsonify(job)
+
+@app.route("/upload/stats", methods=["GET"])
+@jwt_required()
+def upload_stats():
+    # Per-process view: each gunicorn worker has its own pool
+    return jsonify(ocr_jobs.stats())
 
 @app.route("/vapid-public-key", methods=["GET"])
 def get_vapid_public_key():
@@ -0,0 +1,273 @@
+"""In-process metrics exposed as Prometheus text on GET /metrics.
+
+Counters and histograms live in this process; with several gunicorn
+workers each one reports its own (scrape them with a per-process target
+or aggregate on `instance`), the same as /upload/stats.
+
+Set PROFILE_SLOW_MS to switch on the sampling profiler: a background
+thread samples the stacks of in-flight requests every PROFILE_INTERVAL_MS
+and, when a request takes longer than PROFILE_SLOW_MS, its samples are
+written to PROFILE_DIR in collapsed-stack form (one "frame;frame;... count"
+line per stack, ready for flamegraph.pl or speedscope). When it is off
+the request hooks only read a clock.
+"""
+import math
+import os
+import sys
+import threading
+import time
+from collections import Counter as _Tally
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+SIZE_BUCKETS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+def _number(value):
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    kind = None
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def _key(self, labels):
+        return tuple(str(labels.get(name, "")) for name in self.label_names)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self._samples())
+        return lines
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def __init__(self, name, help, labels=()):
+        super().__init__(name, help, labels)
+        self._values = {}
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def _samples(self):
+        with self._lock:
+            values = sorted(self._values.items())
+        return [f"{self.name}{_labels(self.label_names, key)} {_number(v)}" for key, v in values]
+
+
+class Gauge(Metric):
+    """Value read from `fn()` at scrape time; fn returns {label tuple: value} or a number."""
+    kind = "gauge"
+
+    def __init__(self, name, help, fn, labels=()):
+        super().__init__(name, help, labels)
+        self.fn = fn
+
+    def _samples(self):
+        try:
+            values = self.fn()
+        except Exception:
+            return []
+        if not isinstance(values, dict):
+            values = {(): values}
+        return [f"{self.name}{_labels(self.label_names, key)} {_number(v)}"
+                for key, v in sorted(values.items()) if v is not None]
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(buckets) + (math.inf,)
+        # key -> [bucket counts..., sum, count]
+        self._values = {}
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            series = self._values.get(key)
+            if series is None:
+                series = self._values[key] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+                    break
+            series[-2] += value
+            series[-1] += 1
+
+    def time(self, **labels):
+        return _Timer(self, labels)
+
+    def _samples(self):
+        with self._lock:
+            values = sorted((key, list(series)) for key, series in self._values.items())
+        lines = []
+        for key, series in values:
+            cumulative = 0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                le = _labels(self.label_names, key, [("le", _number(bound))])
+                lines.append(f"{self.name}_bucket{le} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.label_names, key)} {_number(series[-2])}")
+            lines.append(f"{self.name}_count{_labels(self.label_names, key)} {series[-1]}")
+        return lines
+
+
+class _Timer:
+    __slots__ = ("histogram", "labels", "started")
+
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.started, **self.labels)
+
+
+REGISTRY = []
+
+
+def render():
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+HTTP_REQUEST_SECONDS = Histogram(
+    "http_request_duration_seconds", "Request latency by route", ("route", "method", "status"))
+REMINDER_TICK_SECONDS = Histogram(
+    "reminder_tick_duration_seconds", "Duration of one reminder worker iteration")
+REMINDER_BATCH_SIZE = Histogram(
+    "reminder_due_batch_size", "Schedules due in one reminder tick", buckets=SIZE_BUCKETS)
+REMINDER_ERRORS = Counter("reminder_tick_errors_total", "Reminder worker iterations that raised")
+PUSH_DELIVERIES = Counter("push_deliveries_total", "Web-push deliveries by final outcome", ("outcome",))
+PUSH_SECONDS = Histogram(
+    "push_delivery_duration_seconds", "Web-push delivery time including retries", ("outcome",))
+VAPID_HEADERS = Counter("vapid_header_cache_total", "VAPID header lookups by cache result", ("result",))
+OCR_SECONDS = Histogram(
+    "ocr_duration_seconds", "OCR job time by stage (wait, ocr, total, and per preprocessing stage)",
+    ("stage",), buckets=DEFAULT_BUCKETS + (60.0, 120.0))
+OCR_JOBS = Counter("ocr_jobs_total", "Finished OCR jobs by status", ("status",))
+KB_RELOAD_SECONDS = Histogram("kb_reload_duration_seconds", "Knowledge base (re)load time")
+
+
+class SamplingProfiler:
+    """Samples the stacks of registered threads on a background thread."""
+
+    def __init__(self, interval, slow_seconds, out_dir):
+        self.interval = interval
+        self.slow_seconds = slow_seconds
+        self.out_dir = out_dir
+        self._active = {}
+        self._lock = threading.Lock()
+        os.makedirs(out_dir, exist_ok=True)
+        threading.Thread(target=self._run, name="profiler", daemon=True).start()
+
+    def start(self, thread_id):
+        with self._lock:
+            self._active[thread_id] = _Tally()
+
+    def stop(self, thread_id):
+        with self._lock:
+            return self._active.pop(thread_id, None)
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            frames = sys._current_frames()
+            with self._lock:
+                for thread_id, tally in self._active.items():
+                    frame = frames.get(thread_id)
+                    stack = []
+                    while frame is not None:
+                        code = frame.f_code
+                        stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                        frame = frame.f_back
+                    if stack:
+                        tally[";".join(reversed(stack))] += 1
+
+    def dump(self, tally, label, seconds):
+        name = f"{time.strftime('%Y%m%d-%H%M%S')}-{int(seconds * 1000)}ms-{label}.txt"
+        path = os.path.join(self.out_dir, "".join(c if c.isalnum() or c in ".-_" else "_" for c in name))
+        with open(path, "w", encoding="utf-8") as f:
+            for stack, count in tally.most_common():
+                f.write(f"{stack} {count}\n")
+        return path
+
+
+def _profiler_from_env():
+    slow_ms = os.getenv("PROFILE_SLOW_MS")
+    if not slow_ms:
+        return None
+    return SamplingProfiler(
+        interval=float(os.getenv("PROFILE_INTERVAL_MS", 5)) / 1000,
+        slow_seconds=float(slow_ms) / 1000,
+        out_dir=os.getenv("PROFILE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "profiles")),
+    )
+
+
+def init_app(app):
+    """Time every request and serve GET /metrics (Bearer METRICS_TOKEN if set)."""
+    from flask import Response, abort, g, request
+
+    profiler = _profiler_from_env()
+    token = os.getenv("METRICS_TOKEN")
+
+    @app.before_request
+    def _start_timer():
+        g.metrics_started = time.perf_counter()
+        if profiler:
+            profiler.start(threading.get_ident())
+
+    @app.after_request
+    def _record(response):
+        started = g.pop("metrics_started", None)
+        if started is None:
+            return response
+        seconds = time.perf_counter() - started
+        route = request.url_rule.rule if request.url_rule else "unmatched"
+        HTTP_REQUEST_SECONDS.observe(seconds, route=route, method=request.method, status=response.status_code)
+        if profiler:
+            tally = profiler.stop(threading.get_ident())
+            if tally and seconds >= profiler.slow_seconds:
+                path = profiler.dump(tally, f"{request.method}-{route}", seconds)
+                print(f"Slow request {request.method} {request.path} took {seconds * 1000:.0f} ms, profile: {path}")
+        return response
+
+    if profiler:
+        @app.teardown_request
+        def _stop_profiling(exc):
+            profiler.stop(threading.get_ident())
+
+    @app.route("/metrics", methods=["GET"])
+    def metrics_endpoint():
+        if token and request.headers.get("Authorization") != f"Bearer {token}":
+            abort(401)
+        return Response(render(), mimetype="text/plain; version=0.0.4")
@@ -0,0 +1,194 @@
+"""Versioned schema migrations.
+
+`db.create_all()` only creates missing tables, so columns and indexes added to
+existing tables go through here. Each migration is idempotent: on a fresh
+database create_all has already built the current schema and the steps
+become no-ops, and they are recorded in `schema_version` either way.
+"""
+import json
+import os
+from datetime import datetime
+
+from sqlalchemy import bindparam, insert, inspect, select, text
+
+import catalog
+from adherence import ON_TIME_WINDOW
+from models import db, CatalogVersion, Medicine, SchemaVersion, days_to_mask
+from reminders import IST_OFFSET, INSERT_CHUNK
+
+MIGRATIONS = []
+
+# Arbitrary key for the Postgres advisory lock held while migrating
+ADVISORY_LOCK_ID = 7_301_264
+
+
+def migration(version, description):
+    def register(fn):
+        MIGRATIONS.append((version, description, fn))
+        return fn
+    return register
+
+
+def _has_column(conn, table, column):
+    return column in {c["name"] for c in inspect(conn).get_columns(table)}
+
+
+def _add_column(conn, table, column, type_, extra=""):
+    if not _has_column(conn, table, column):
+        ddl_type = type_.compile(dialect=conn.dialect)
+        conn.execute(text(f'ALTER TABLE "{table}" ADD COLUMN {column} {ddl_type} {extra}'.strip()))
+
+
+def _has_unique(conn, table, columns):
+    inspector = inspect(conn)
+    unique = [c["column_names"] for c in inspector.get_unique_constraints(table)]
+    unique += [i["column_names"] for i in inspector.get_indexes(table) if i.get("unique")]
+    return any(set(cols) == set(columns) for cols in unique)
+
+
+def _create_index(conn, name, table, columns):
+    conn.execute(text(f'CREATE INDEX IF NOT EXISTS {name} ON "{table}" ({", ".join(columns)})'))
+
+
+@migration(1, "Confirmation.due_at for snoozed reminders")
+def add_confirmation_due_at(conn):
+    _add_column(conn, "confirmation", "due_at", db.DateTime())
+    _create_index(conn, "ix_confirmation_status_due_at", "confirmation", ["status", "due_at"])
+
+    # Existing snoozes only have an "HH:MM" IST string for their day
+    rows = conn.execute(text(
+        "SELECT id, date_str, snooze_until FROM confirmation "
+        "WHERE status = 'snoozed' AND due_at IS NULL AND snooze_until IS NOT NULL"
+    )).fetchall()
+    for conf_id, date_str, snooze_until in rows:
+        try:
+            local = datetime.strptime(f"{date_str} {snooze_until}", "%Y-%m-%d %H:%M")
+        except ValueError:
+            continue
+        conn.execute(
+            text("UPDATE confirmation SET due_at = :due_at WHERE id = :id"),
+            {"due_at": local - IST_OFFSET, "id": conf_id},
+        )
+
+
+@migration(2, "Schedule weekday bitmask and composite indexes for the reminder queries")
+def add_schedule_days_mask(conn):
+    _add_column(conn, "schedule", "days_mask", db.Integer(), "NOT NULL DEFAULT 0")
+    _create_index(conn, "ix_schedule_time_active", "schedule", ["time", "is_active"])
+    _create_index(conn, "ix_schedule_user_active", "schedule", ["user_id", "is_active"])
+    _create_index(conn, "ix_confirmation_status_date", "confirmation", ["status", "date_str"])
+    _create_index(conn, "ix_confirmation_user_date", "confirmation", ["user_id", "date_str"])
+
+    updates = []
+    for sch_id, days in conn.execute(text("SELECT id, days FROM schedule")):
+        try:
+            mask = days_to_mask(json.loads(days) if days else [])
+        except ValueError:
+            mask = 0
+        updates.append({"id": sch_id, "mask": mask})
+    if updates:
+        conn.execute(text("UPDATE schedule SET days_mask = :mask WHERE id = :id"), updates)
+
+
+@migration(3, "Medicine catalog table, seeded from the bundled workbook")
+def seed_medicine_catalog(conn):
+    # create_all has built the tables; this adds the version row and the data
+    if conn.execute(select(CatalogVersion.id).where(CatalogVersion.id == 1)).first() is None:
+        conn.execute(insert(CatalogVersion).values(id=1, version=0, updated_at=datetime.utcnow()))
+    if conn.execute(select(Medicine.id).limit(1)).first() is None and os.path.exists(catalog.SEED_WORKBOOK):
+        with open(catalog.SEED_WORKBOOK, "rb") as f:
+            report = catalog.import_rows(conn, catalog.iter_rows(f, catalog.SEED_WORKBOOK))
+        print(f"Imported {report['inserted']} medicines from {os.path.basename(catalog.SEED_WORKBOOK)}")
+
+
+@migration(4, "Per-user schedule version counter for conditional GET /schedule")
+def add_user_schedule_version(conn):
+    _add_column(conn, "user", "schedule_version", db.Integer(), "NOT NULL DEFAULT 0")
+
+
+@migration(5, "Confirmation.taken_at and daily adherence rollups")
+def add_adherence_rollups(conn):
+    _add_column(conn, "confirmation", "taken_at", db.DateTime())
+    # Existing history is summed once; from here on the rollups are kept incrementally.
+    # Doses confirmed before taken_at existed cannot be judged on time.
+    if conn.execute(text("SELECT 1 FROM adherence_daily LIMIT 1")).first() is None:
+        conn.execute(text(
+            "INSERT INTO adherence_daily (user_id, medicine_name, date_str, scheduled, sent, taken, "
+            "snoozed, snoozed_ever, taken_on_time) "
+            "SELECT user_id, medicine_name, date_str, COUNT(*), "
+            "SUM(CASE WHEN status = 'sent' THEN 1 ELSE 0 END), "
+            "SUM(CASE WHEN status = 'taken' THEN 1 ELSE 0 END), "
+            "SUM(CASE WHEN status = 'snoozed' THEN 1 ELSE 0 END), "
+            "SUM(CASE WHEN snooze_until IS NOT NULL THEN 1 ELSE 0 END), 0 "
+            "FROM confirmation GROUP BY user_id, medicine_name, date_str"
+        ))
+
+
+@migration(6, "Schedule.updated_at so reminder workers see edits made by other processes")
+def add_schedule_updated_at(conn):
+    _add_column(conn, "schedule", "updated_at", db.DateTime())
+    _create_index(conn, "ix_schedule_updated_at", "schedule", ["updated_at"])
+    conn.execute(text("UPDATE schedule SET updated_at = created_at WHERE updated_at IS NULL"))
+
+
+@migration(7, "Unique (schedule_id, scheduled_time, date_str) on Confirmation for conflict-skipping inserts")
+def add_confirmation_unique(conn):
+    columns = ["schedule_id", "scheduled_time", "date_str"]
+    if _has_unique(conn, "confirmation", columns):
+        return
+    # Databases created before the constraint may hold duplicate doses; keep the first of each
+    duplicates = conn.execute(text(
+        "SELECT c.id, c.user_id, c.medicine_name, c.date_str, c.scheduled_time, c.status, "
+        "c.snooze_until, c.taken_at FROM confirmation c WHERE EXISTS ("
+        "SELECT 1 FROM confirmation d WHERE d.schedule_id = c.schedule_id "
+        "AND d.scheduled_time = c.scheduled_time AND d.date_str = c.date_str AND d.id < c.id)"
+    )).fetchall()
+
+    # Take them back out of the adherence rollups that counted them
+    deltas = {}
+    for _, user_id, medicine_name, date_str, scheduled_time, status, snooze_until, taken_at in duplicates:
+        delta = deltas.setdefault((user_id, medicine_name, date_str), dict.fromkeys(
+            ("scheduled", "sent", "taken", "snoozed", "snoozed_ever", "taken_on_time"), 0))
+        delta["scheduled"] += 1
+        if status in ("sent", "taken", "snoozed"):
+            delta[status] += 1
+        if snooze_until is not None:
+            delta["snoozed_ever"] += 1
+        if status == "taken" and taken_at is not None:
+            if isinstance(taken_at, str):
+                taken_at = datetime.fromisoformat(taken_at)
+            scheduled = datetime.strptime(f"{date_str} {scheduled_time}", "%Y-%m-%d %H:%M") - IST_OFFSET
+            if abs(taken_at - scheduled) <= ON_TIME_WINDOW:
+                delta["taken_on_time"] += 1
+    for (user_id, medicine_name, date_str), delta in deltas.items():
+        conn.execute(text(
+            "UPDATE adherence_daily SET " + ", ".join(f"{c} = {c} - :{c}" for c in delta) +
+            " WHERE user_id = :user_id AND medicine_name = :medicine_name AND date_str = :date_str"
+        ), dict(delta, user_id=user_id, medicine_name=medicine_name, date_str=date_str))
+
+    ids = [row[0] for row in duplicates]
+    delete = text("DELETE FROM confirmation WHERE id IN :ids").bindparams(bindparam("ids", expanding=True))
+    for start in range(0, len(ids), INSERT_CHUNK):
+        conn.execute(delete, {"ids": ids[start:start + INSERT_CHUNK]})
+    if ids:
+        print(f"Removed {len(ids)} duplicate confirmations")
+    conn.execute(text(
+        'CREATE UNIQUE INDEX IF NOT EXISTS _sch_time_date_uc ON "confirmation" (' + ", ".join(columns) + ")"
+    ))
+
+
+def run_migrations():
+    """Apply pending migrations in one transaction. Call inside an app context."""
+    with db.engine.begin() as conn:
+        if conn.dialect.name == "postgresql":
+            # Serialize gunicorn workers/replicas starting at the same time
+            conn.execute(text("SELECT pg_advisory_xact_lock(:id)"), {"id": ADVISORY_LOCK_ID})
+        applied = {row[0] for row in conn.execute(select(SchemaVersion.version))}
+        for version, description, fn in sorted(MIGRATIONS, key=lambda m: m[0]):
+            if version in applied:
+                continue
+            fn(conn)
+            conn.execute(insert(SchemaVersion).values(
+                version=version, description=description, applied_at=datetime.utcnow()
+            ))
+            print(f"Applied migration {version}: {description}")
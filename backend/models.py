@@ -4,6 +4,34 @@ import json
 
 db = SQLAlchemy()
 
+# Rows per multi-VALUES insert (and ids per IN list); keeps SQLite under its
+# bound-parameter limit
+INSERT_CHUNK = 150
+
+def chunked(items, size=INSERT_CHUNK):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+# Weekday -> bit in Schedule.days_mask
+DAY_BITS = {"Mon": 1, "Tue": 2, "Wed": 4, "Thu": 8, "Fri": 16, "Sat": 32, "Sun": 64}
+
+def days_to_mask(days):
+    mask = 0
+    for day in days or []:
+        mask |= DAY_BITS.get(day, 0)
+    return mask
+
+def dialect_insert():
+    # INSERT with ON CONFLICT support, or None on other databases
+    name = db.engine.dialect.name
+    if name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    elif name == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        return None
+    return insert
+
 class User(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     username = db.Column(db.String(80), unique=True, nullable=False)
@@ -13,17 +41,49 @@ class User(db.Model):
     # Push notification subscription info (stored as JSON string)
     push_subscription = db.Column(db.Text, nullable=True)
     
+    # Bumped by every change to the user's schedules; GET /schedule ETags derive from it
+    schedule_version = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+    
     schedules = db.relationship('Schedule', backref='user', lazy=True)
 
+    @classmethod
+    def bump_schedule_version(cls, *user_ids):
+        # Call inside the transaction that changes the schedules
+        cls.query.filter(cls.id.in_(user_ids)).update(
+            {cls.schedule_version: cls.schedule_version + 1}, synchronize_session=False
+        )
+
 class Schedule(db.Model):
+    __table_args__ = (
+        db.Index('ix_schedule_time_active', 'time', 'is_active'),
+        db.Index('ix_schedule_user_active', 'user_id', 'is_active'),
+        db.Index('ix_schedule_updated_at', 'updated_at'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     medicine_name = db.Column(db.String(100), nullable=False)
     time = db.Column(db.String(5), nullable=False) # HH:MM
     period = db.Column(db.String(20), nullable=True) # Morning, Afternoon, Night
     days = db.Column(db.String(200), nullable=False) # Store as JSON string: ["Mon", "Tue"]
+    days_mask = db.Column(db.Integer, nullable=False, default=0, server_default="0") # DAY_BITS of `days`
     is_active = db.Column(db.Boolean, default=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    # Set on every ORM write; reminder workers poll it for edits made by other processes
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def set_days(self, days):
+        # Keep the JSON list (API) and the bitmask (SQL filtering) in step
+        self.days = json.dumps(days)
+        self.days_mask = days_to_mask(days)
+
+    @classmethod
+    def due_filter(cls, time_str, day):
+        """SQL criteria for active schedules at HH:MM on weekday `day` ("Mon", ...)."""
+        return (
+            cls.time == time_str,
+            cls.is_active == True,
+            cls.days_mask.op('&')(DAY_BITS[day]) != 0,
+        )
 
     def to_dict(self):
         return {
@@ -35,7 +95,12 @@ class Schedule(db.Model):
         }
 
 class Confirmation(db.Model):
-    __table_args__ = (db.UniqueConstraint('schedule_id', 'scheduled_time', 'date_str', name='_sch_time_date_uc'),)
+    __table_args__ = (
+        db.UniqueConstraint('schedule_id', 'scheduled_time', 'date_str', name='_sch_time_date_uc'),
+        db.Index('ix_confirmation_status_due_at', 'status', 'due_at'),
+        db.Index('ix_confirmation_status_date', 'status', 'date_str'),
+        db.Index('ix_confirmation_user_date', 'user_id', 'date_str'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     schedule_id = db.Column(db.Integer, db.ForeignKey('schedule.id'), nullable=False)
@@ -44,4 +109,96 @@ class Confirmation(db.Model):
     date_str = db.Column(db.String(10), nullable=False) # YYYY-MM-DD
     status = db.Column(db.String(20), default="sent") # sent, taken, snoozed
     sent_at = db.Column(db.DateTime, default=datetime.utcnow)
-    snooze_until = db.Column(db.String(5), nullable=True)
+    snooze_until = db.Column(db.String(5), nullable=True) # HH:MM IST, for display
+    due_at = db.Column(db.DateTime, nullable=True) # UTC instant a snoozed reminder fires again
+    taken_at = db.Column(db.DateTime, nullable=True) # UTC
+
+class AdherenceDaily(db.Model):
+    # Dose counters per user, medicine and day, updated in the same transaction
+    # as the Confirmation changes they count (see adherence.py)
+    __table_args__ = (
+        db.Index('ix_adherence_medicine_date', 'medicine_name', 'date_str'),
+        db.Index('ix_adherence_date', 'date_str'),
+    )
+    COUNTERS = ("scheduled", "sent", "taken", "snoozed", "snoozed_ever", "taken_on_time")
+
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    medicine_name = db.Column(db.String(100), primary_key=True)
+    date_str = db.Column(db.String(10), primary_key=True) # YYYY-MM-DD
+    scheduled = db.Column(db.Integer, nullable=False, default=0) # confirmations created
+    sent = db.Column(db.Integer, nullable=False, default=0) # currently "sent", i.e. not acted on
+    taken = db.Column(db.Integer, nullable=False, default=0)
+    snoozed = db.Column(db.Integer, nullable=False, default=0) # currently snoozed
+    snoozed_ever = db.Column(db.Integer, nullable=False, default=0)
+    taken_on_time = db.Column(db.Integer, nullable=False, default=0)
+
+    @classmethod
+    def add(cls, deltas):
+        """Add {(user_id, medicine_name, date_str): {counter: delta}} to the rollups.
+
+        Runs in the caller's transaction; one upsert statement per INSERT_CHUNK
+        keys on Postgres/SQLite.
+        """
+        rows = [
+            dict({c: delta.get(c, 0) for c in cls.COUNTERS}, user_id=key[0], medicine_name=key[1], date_str=key[2])
+            for key, delta in deltas.items() if any(delta.values())
+        ]
+        if not rows:
+            return
+        insert = dialect_insert()
+        if insert is not None:
+            for chunk in chunked(rows):
+                stmt = insert(cls).values(chunk)
+                stmt = stmt.on_conflict_do_update(
+                    index_elements=["user_id", "medicine_name", "date_str"],
+                    set_={c: getattr(cls, c) + stmt.excluded[c] for c in cls.COUNTERS},
+                )
+                db.session.execute(stmt)
+            return
+        for row in rows:
+            key = {k: row[k] for k in ("user_id", "medicine_name", "date_str")}
+            updated = cls.query.filter_by(**key).update(
+                {getattr(cls, c): getattr(cls, c) + row[c] for c in cls.COUNTERS}, synchronize_session=False
+            )
+            if not updated:
+                db.session.add(cls(**row))
+
+class Medicine(db.Model):
+    # Drug catalog, see catalog.py; name_key is the normalized, unique lookup key
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(200), nullable=False)
+    name_key = db.Column(db.String(200), nullable=False, unique=True, index=True)
+    used_for = db.Column(db.Text, nullable=False, default="")
+    how_it_works = db.Column(db.Text, nullable=False, default="")
+    side_effects = db.Column(db.Text, nullable=False, default="")
+    notes = db.Column(db.Text, nullable=False, default="")
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def to_dict(self):
+        # Keyed by the workbook column names the admin dashboard uses
+        return {
+            "id": self.id,
+            "Name": self.name,
+            "Used for": self.used_for,
+            "How it works": self.how_it_works,
+            "Common side effects": self.side_effects,
+            "Notes": self.notes
+        }
+
+class CatalogVersion(db.Model):
+    # Single row (id=1) bumped by every catalog write; workers poll it to reload
+    id = db.Column(db.Integer, primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class SchemaVersion(db.Model):
+    # Applied migrations, see migrations.py
+    version = db.Column(db.Integer, primary_key=True)
+    description = db.Column(db.String(200), nullable=False)
+    applied_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class SchedulerLease(db.Model):
+    # One row per live reminder worker; schedules are sharded by user_id across them
+    instance_id = db.Column(db.String(100), primary_key=True)
+    heartbeat_at = db.Column(db.DateTime, nullable=False, index=True)
+    started_at = db.Column(db.DateTime, default=datetime.utcnow)
@@ -0,0 +1,103 @@
+"""Benchmark OCR latency and accuracy with and without preprocessing.
+
+    python -m ocr.bench_preprocess                       # ocr/data/input_image.jpg
+    python -m ocr.bench_preprocess uploads/*.jpg --runs 5 --json out.json
+    python -m ocr.bench_preprocess --reference ocr/data/output_text.txt
+
+Each image is OCR'd with every configuration in CONFIGS. Latency is the median
+over --runs, split per stage. Accuracy is the share of known medicines
+found in the text, matched against the knowledge base, plus the similarity to
+--reference text when one is given.
+"""
+import argparse
+import difflib
+import json
+import os
+import statistics
+import sys
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+from ocr.ocr_engine import extract_text_with_timings  # noqa: E402
+
+CONFIGS = {
+    "raw": None,
+    "downscale": {"grayscale": False, "binarize": False},
+    "grayscale": {"binarize": False},
+    "binarize": {},
+    "binarize+autocrop": {"autocrop": True},
+    "binarize@200dpi": {"target_dpi": 200},
+}
+
+
+def _medicines(text):
+    from rag.rag_engine import extract_medicines
+    return {m["name"].lower() for m in extract_medicines(text)}
+
+
+def bench_image(path, runs, reference=None, expected=None):
+    results = {}
+    for name, config in CONFIGS.items():
+        totals, stages, text = [], {}, ""
+        for _ in range(runs):
+            text, timings = extract_text_with_timings(path, preprocess_config=config)
+            totals.append(sum(timings.values()))
+            for stage, ms in timings.items():
+                stages.setdefault(stage, []).append(ms)
+        found = _medicines(text)
+        result = {
+            "median_ms": round(statistics.median(totals), 1),
+            "stages_ms": {stage: round(statistics.median(v), 1) for stage, v in stages.items()},
+            "medicines": sorted(found),
+        }
+        if expected:
+            result["medicine_recall"] = round(len(found & expected) / len(expected), 3)
+        if reference is not None:
+            result["text_similarity"] = round(
+                difflib.SequenceMatcher(None, reference.lower().split(), text.lower().split()).ratio(), 3
+            )
+        results[name] = result
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("images", nargs="*", default=[os.path.join(BACKEND_DIR, "ocr", "data", "input_image.jpg")])
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--reference", help="text file with the expected OCR output")
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args()
+
+    # Medicines are matched against the catalog in DATABASE_URL
+    from rag.rag_engine import bind_database
+    bind_database()
+
+    reference = expected = None
+    if args.reference:
+        with open(args.reference, "r", encoding="utf-8") as f:
+            reference = f.read()
+        expected = _medicines(reference)
+
+    report = {}
+    for path in args.images:
+        report[path] = results = bench_image(path, args.runs, reference, expected)
+        print(f"\n{path}")
+        baseline = results["raw"]["median_ms"]
+        for name, r in results.items():
+            accuracy = ""
+            if "medicine_recall" in r:
+                accuracy += f"  recall {r['medicine_recall']:.2f}"
+            if "text_similarity" in r:
+                accuracy += f"  similarity {r['text_similarity']:.2f}"
+            speedup = baseline / r["median_ms"] if r["median_ms"] else 0
+            print(f"  {name:<18} {r['median_ms']:>8.1f} ms  x{speedup:.2f}{accuracy}  {len(r['medicines'])} medicines")
+            print(f"  {'':<18} " + ", ".join(f"{k} {v}" for k, v in r["stages_ms"].items()))
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -11,38 +11,43 @@ INPUT_FILE = os.path.join(BASE_DIR, "data", "output_text.txt")
 OUTPUT_FILE = os.path.join(BASE_DIR, "data", "cleaned_text.txt")
 
 # -----------------------------
-# CHECK FILE EXISTS
+# TEXT CLEANING
 # -----------------------------
 
-if not os.path.exists(INPUT_FILE):
-    raise FileNotFoundError(f"❌ output_text.txt NOT FOUND at:\n{INPUT_FILE}")
+def clean_text(raw_text):
+    cleaned_text = raw_text.lower()
+    cleaned_text = re.sub(r"[^a-z0-9\s]", " ", cleaned_text)
+    cleaned_text = re.sub(r"\s+", " ", cleaned_text).strip()
+    return cleaned_text
 
-# -----------------------------
-# READ OCR TEXT
-# -----------------------------
+if __name__ == "__main__":
+    # -----------------------------
+    # CHECK FILE EXISTS
+    # -----------------------------
 
-with open(INPUT_FILE, "r", encoding="utf-8") as f:
-    raw_text = f.read()
+    if not os.path.exists(INPUT_FILE):
+        raise FileNotFoundError(f"❌ output_text.txt NOT FOUND at:\n{INPUT_FILE}")
 
-print("\n--- RAW OCR TEXT ---\n")
-print(raw_text)
+    # -----------------------------
+    # READ OCR TEXT
+    # -----------------------------
 
-# -----------------------------
-# TEXT CLEANING
-# -----------------------------
+    with open(INPUT_FILE, "r", encoding="utf-8") as f:
+        raw_text = f.read()
 
-cleaned_text = raw_text.lower()
-cleaned_text = re.sub(r"[^a-z0-9\s]", " ", cleaned_text)
-cleaned_text = re.sub(r"\s+", " ", cleaned_text).strip()
+    print("\n--- RAW OCR TEXT ---\n")
+    print(raw_text)
 
-print("\n--- CLEANED TEXT ---\n")
-print(cleaned_text)
+    cleaned_text = clean_text(raw_text)
 
-# -----------------------------
-# SAVE CLEANED TEXT
-# -----------------------------
+    print("\n--- CLEANED TEXT ---\n")
+    print(cleaned_text)
+
+    # -----------------------------
+    # SAVE CLEANED TEXT
+    # -----------------------------
 
-with open(OUTPUT_FILE, "w", encoding="utf-8") as f:
-    f.write(cleaned_text)
+    with open(OUTPUT_FILE, "w", encoding="utf-8") as f:
+        f.write(cleaned_text)
 
-print(f"\n✅ Cleaned text saved to:\n{OUTPUT_FILE}")
\ No newline at end of file
+    print(f"\n✅ Cleaned text saved to:\n{OUTPUT_FILE}")
\ No newline at end of file
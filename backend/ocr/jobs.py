@@ -0,0 +1,203 @@
+import json
+import multiprocessing
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import metrics
+from ocr.ocr_engine import timed_extract_text
+
+
+class QueueFull(Exception):
+    pass
+
+
+class OcrJobQueue:
+    """Runs OCR jobs on a bounded process pool.
+
+    Tesseract is CPU-bound, so it runs in separate processes and the web
+    worker only waits on a future. Job records are written to `jobs_dir` as
+    JSON (write-then-rename), so any gunicorn worker can answer a status
+    request for a job another worker accepted. Once `max_pending` jobs are
+    queued or running, `submit` raises QueueFull instead of queuing more.
+    """
+
+    def __init__(self, jobs_dir, max_workers=None, max_pending=None, job_timeout=120, on_done=None,
+                 record_ttl=24 * 3600):
+        self.jobs_dir = jobs_dir
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.max_pending = max_pending or self.max_workers * 4
+        self.job_timeout = job_timeout
+        # on_done(job) -> dict of extra result fields (e.g. matched medicines)
+        self.on_done = on_done
+        self.record_ttl = record_ttl
+        self._last_prune = 0.0
+        os.makedirs(jobs_dir, exist_ok=True)
+        self._executor = None
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._inflight = {}
+        self._counters = {"submitted": 0, "completed": 0, "failed": 0, "rejected": 0}
+        self._total_wait_ms = 0.0
+        self._total_ocr_ms = 0.0
+
+    def _pool(self):
+        if self._executor is None:
+            # spawn: forking a threaded web worker is not safe
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.max_workers, mp_context=multiprocessing.get_context("spawn")
+            )
+        return self._executor
+
+    def _replace_pool(self, broken):
+        """A broken pool refuses all work; swap in a fresh one (once, however many callers notice)."""
+        with self._lock:
+            if self._executor is broken:
+                self._executor = None
+            pool = self._pool()
+        broken.shutdown(wait=False, cancel_futures=True)
+        return pool
+
+    def _path(self, job_id):
+        return os.path.join(self.jobs_dir, f"{job_id}.json")
+
+    def _write(self, job):
+        tmp_path = f"{self._path(job['id'])}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(job, f)
+        os.replace(tmp_path, self._path(job["id"]))
+
+    def prune_records(self):
+        """Delete job records older than `record_ttl` seconds."""
+        cutoff = time.time() - self.record_ttl
+        for entry in os.scandir(self.jobs_dir):
+            try:
+                if entry.stat().st_mtime < cutoff:
+                    os.remove(entry.path)
+            except FileNotFoundError:
+                pass
+
+    def get(self, job_id):
+        try:
+            uuid.UUID(job_id)
+            with open(self._path(job_id), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (ValueError, OSError):
+            return None
+
+    def submit(self, image_path, dedup_key=None, page=None, **meta):
+        """Queue OCR for `image_path`; returns the job record. Raises QueueFull.
+
+        A job still in flight with the same `dedup_key` is returned instead of
+        queuing the same work twice (e.g. a client retrying an upload).
+        """
+        return self.submit_many([(image_path, page, dedup_key, meta)])[0]
+
+    def submit_many(self, items):
+        """Queue (image_path, page, dedup_key, meta) items; returns their job records.
+
+        All or nothing: raises QueueFull without queuing anything if the
+        queue cannot take every new item, so a batch is never half-accepted.
+        Pages run in parallel across the pool's processes.
+        """
+        jobs = [None] * len(items)
+        launch = []
+        with self._lock:
+            for i, (_, _, dedup_key, _) in enumerate(items):
+                if dedup_key is not None and dedup_key in self._inflight:
+                    jobs[i] = self._inflight[dedup_key]
+                else:
+                    launch.append(i)
+            if self._pending + len(launch) > self.max_pending:
+                self._counters["rejected"] += 1
+                raise QueueFull(f"OCR queue is full ({self._pending} jobs pending)")
+            self._pending += len(launch)
+            self._counters["submitted"] += len(launch)
+            pool = self._pool()
+
+        now = time.time()
+        if now - self._last_prune > 3600:
+            self._last_prune = now
+            self.prune_records()
+        for n, i in enumerate(launch):
+            image_path, page, dedup_key, meta = items[i]
+            job = dict(meta, id=str(uuid.uuid4()), status="queued", queued_at=time.time())
+            if page is not None:
+                job["page"] = page
+            try:
+                self._write(job)
+                try:
+                    future = pool.submit(timed_extract_text, image_path, self.job_timeout, page)
+                except BrokenProcessPool:
+                    # A worker died abruptly (e.g. OOM-killed) and took the pool with it
+                    pool = self._replace_pool(pool)
+                    future = pool.submit(timed_extract_text, image_path, self.job_timeout, page)
+            except Exception:
+                with self._lock:
+                    self._pending -= len(launch) - n
+                raise
+            if dedup_key is not None:
+                with self._lock:
+                    self._inflight[dedup_key] = job
+            future.add_done_callback(lambda f, job=job, key=dedup_key: self._finish(job, f, key))
+            jobs[i] = job
+        return jobs
+
+    def create_batch(self, pages, **meta):
+        """Record a batch of page jobs; stored next to the job records, read with `get`."""
+        batch = dict(meta, id=str(uuid.uuid4()), kind="batch", created_at=time.time(), pages=pages)
+        self._write(batch)
+        return batch
+
+    def _finish(self, job, future, dedup_key=None):
+        finished = time.time()
+        try:
+            text, started, ended, stages = future.result()
+            job.update(status="done", extracted_text=text)
+            if self.on_done:
+                job.update(self.on_done(job))
+            job["timings"] = {
+                "wait_ms": round((started - job["queued_at"]) * 1000, 1),
+                "ocr_ms": round((ended - started) * 1000, 1),
+                "total_ms": round((finished - job["queued_at"]) * 1000, 1),
+                "stages_ms": stages,
+            }
+            outcome = "completed"
+        except Exception as e:
+            job.update(status="failed", error=str(e) or e.__class__.__name__)
+            job["timings"] = {"total_ms": round((finished - job["queued_at"]) * 1000, 1)}
+            outcome = "failed"
+        job["finished_at"] = finished
+
+        with self._lock:
+            self._inflight.pop(dedup_key, None)
+            self._pending -= 1
+            self._counters[outcome] += 1
+            if outcome == "completed":
+                self._total_wait_ms += job["timings"]["wait_ms"]
+                self._total_ocr_ms += job["timings"]["ocr_ms"]
+        metrics.OCR_JOBS.inc(status=outcome)
+        for stage, ms in job["timings"].items():
+            if stage.endswith("_ms"):
+                metrics.OCR_SECONDS.observe(ms / 1000, stage=stage[:-3])
+        for stage, ms in job["timings"].get("stages_ms", {}).items():
+            metrics.OCR_SECONDS.observe(ms / 1000, stage=stage)
+        try:
+            self._write(job)
+        except OSError as e:
+            print(f"Could not record OCR job {job['id']}: {e}")
+
+    def stats(self):
+        with self._lock:
+            completed = self._counters["completed"]
+            return dict(
+                self._counters,
+                queue_depth=self._pending,
+                max_pending=self.max_pending,
+                workers=self.max_workers,
+                avg_wait_ms=round(self._total_wait_ms / completed, 1) if completed else None,
+                avg_ocr_ms=round(self._total_ocr_ms / completed, 1) if completed else None,
+            )
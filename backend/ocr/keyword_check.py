@@ -1,5 +1,7 @@
 # backend/ocr/keyword_check.py
 
+import os
+
 MEDICINE_KEYWORDS = [
     "paracetamol",
     "metformin",
@@ -11,32 +13,34 @@ MEDICINE_KEYWORDS = [
     "atorvastatin"
 ]
 
-INPUT_FILE = "backend/ocr/data/cleaned_text.txt"
-OUTPUT_FILE = "backend/ocr/data/detected_medicines.txt"
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+INPUT_FILE = os.path.join(BASE_DIR, "data", "cleaned_text.txt")
+OUTPUT_FILE = os.path.join(BASE_DIR, "data", "detected_medicines.txt")
 
-try:
-    with open(INPUT_FILE, "r", encoding="utf-8") as f:
-        text = f.read()
-except FileNotFoundError:
-    print("❌ cleaned_text.txt not found")
-    exit()
+def detect_medicines(text, keywords=MEDICINE_KEYWORDS):
+    return [med for med in keywords if med in text]
 
-found_medicines = []
+if __name__ == "__main__":
+    try:
+        with open(INPUT_FILE, "r", encoding="utf-8") as f:
+            text = f.read()
+    except FileNotFoundError:
+        print("❌ cleaned_text.txt not found")
+        exit()
 
-for med in MEDICINE_KEYWORDS:
-    if med in text:
-        found_medicines.append(med)
+    found_medicines = detect_medicines(text)
 
-with open(OUTPUT_FILE, "w", encoding="utf-8") as f:
-    for med in found_medicines:
-        f.write(med + "\n")
+    with open(OUTPUT_FILE, "w", encoding="utf-8") as f:
+        for med in found_medicines:
+            f.write(med + "\n")
 
-print("\n--- DETECTED MEDICINES ---\n")
+    print("\n--- DETECTED MEDICINES ---\n")
 
-if found_medicines:
-    for med in found_medicines:
-        print("✅", med)
-else:
-    print("❌ No medicine found")
+    if found_medicines:
+        for med in found_medicines:
+            print("✅", med)
+    else:
+        print("❌ No medicine found")
 
-print("\n✅ Saved to detected_medicines.txt")
\ No newline at end of file
+    print("\n✅ Saved to detected_medicines.txt")
\ No newline at end of file
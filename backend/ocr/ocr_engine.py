@@ -1,15 +1,71 @@
 import pytesseract
 from PIL import Image
 import os
+import time
+
+try:
+    from ocr.preprocess import config_from_env, preprocess
+except ImportError:  # run as a script (run_pipeline.py)
+    from preprocess import config_from_env, preprocess
 
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 DATA_DIR = os.path.join(BASE_DIR, "data")
 
-def extract_text(image_path):
-    img = Image.open(image_path)
-    text = pytesseract.image_to_string(img)
+# Resolution PDF pages are rasterized at before OCR
+PDF_DPI = 300
+
+def is_pdf(path):
+    with open(path, "rb") as f:
+        return f.read(5) == b"%PDF-"
+
+def page_count(path):
+    # Pages in a PDF or frames in a multi-page TIFF; 1 for ordinary images
+    if is_pdf(path):
+        from pdf2image import pdfinfo_from_path
+        return int(pdfinfo_from_path(path)["Pages"])
+    with Image.open(path) as img:
+        return getattr(img, "n_frames", 1)
+
+def load_page(path, page=None):
+    # page is 0-based; None means the first (or only) page
+    if is_pdf(path):
+        from pdf2image import convert_from_path
+        number = (page or 0) + 1
+        return convert_from_path(path, dpi=PDF_DPI, first_page=number, last_page=number)[0]
+    img = Image.open(path)
+    if page:
+        img.seek(page)
+    return img
+
+def extract_text_with_timings(image_path, timeout=0, preprocess_config=False, page=None):
+    # preprocess_config: dict of ocr.preprocess options, None to skip
+    # preprocessing, or False (default) to read them from OCR_* env vars
+    if preprocess_config is False:
+        preprocess_config = config_from_env()
+    timings = {}
+    started = time.perf_counter()
+    img = load_page(image_path, page)
+    timings["load"] = round((time.perf_counter() - started) * 1000, 2)
+    if preprocess_config is not None:
+        img, stage_timings = preprocess(img, preprocess_config)
+        timings.update(stage_timings)
+    started = time.perf_counter()
+    # timeout (seconds, 0 = none) makes tesseract give up with a RuntimeError
+    text = pytesseract.image_to_string(img, timeout=timeout)
+    timings["tesseract"] = round((time.perf_counter() - started) * 1000, 2)
+    return text, timings
+
+def extract_text(image_path, timeout=0, preprocess_config=False):
+    text, _ = extract_text_with_timings(image_path, timeout, preprocess_config)
     return text
 
+def timed_extract_text(image_path, timeout=0, page=None):
+    # Process-pool entry point: returns the text, wall-clock start/end and
+    # the per-stage timings in ms
+    started = time.time()
+    text, stages = extract_text_with_timings(image_path, timeout=timeout, page=page)
+    return text, started, time.time(), stages
+
 if __name__ == "__main__":
     IMAGE_PATH = os.path.join(DATA_DIR, "input_image.jpg")
     OUTPUT_TEXT = os.path.join(DATA_DIR, "output_text.txt")
@@ -0,0 +1,85 @@
+import os
+import time
+
+from PIL import Image, ImageChops, ImageFilter, ImageOps
+
+# Long edge of an A4 page in inches; used to turn a target DPI into pixels
+PAGE_LONG_EDGE_IN = 11.69
+
+DEFAULTS = {
+    "orient": True,        # apply the EXIF orientation tag (phone photos are often rotated)
+    "target_dpi": 300,     # downscale so the long edge is at most this DPI on an A4 page; 0 = off
+    "grayscale": True,
+    "binarize": True,      # adaptive (local mean) threshold
+    "block_radius": 15,    # radius of the local-mean window, in pixels
+    "threshold_offset": 10,  # a pixel is ink if it is this much darker than its neighbourhood
+    "autocrop": False,     # crop to the bounding box of the ink, plus `crop_margin`
+    "crop_margin": 20,
+}
+
+
+def config_from_env():
+    """Preprocessing options from OCR_* environment variables."""
+    config = dict(DEFAULTS)
+    if os.getenv("OCR_PREPROCESS", "1") == "0":
+        return None
+    config["target_dpi"] = int(os.getenv("OCR_TARGET_DPI", config["target_dpi"]))
+    config["binarize"] = os.getenv("OCR_BINARIZE", "1") != "0"
+    config["autocrop"] = os.getenv("OCR_AUTOCROP", "0") == "1"
+    return config
+
+
+def adaptive_threshold(gray, block_radius, offset):
+    # Local mean via box blur; ink = noticeably darker than its surroundings.
+    # Handles uneven lighting across a photo, unlike one global threshold.
+    mean = gray.filter(ImageFilter.BoxBlur(block_radius))
+    darker_by = ImageChops.subtract(mean, gray)
+    return darker_by.point(lambda v: 0 if v > offset else 255)
+
+
+def preprocess(img, config=None):
+    """Run the enabled stages on `img`; returns (image, {stage: ms})."""
+    config = dict(DEFAULTS, **(config or {}))
+    timings = {}
+
+    def stage(name, fn, image):
+        started = time.perf_counter()
+        result = fn(image)
+        timings[name] = round((time.perf_counter() - started) * 1000, 2)
+        return result
+
+    if config["orient"]:
+        img = stage("orient", ImageOps.exif_transpose, img)
+
+    if config["target_dpi"]:
+        max_edge = int(config["target_dpi"] * PAGE_LONG_EDGE_IN)
+
+        def downscale(image):
+            scale = max_edge / max(image.size)
+            if scale >= 1:
+                return image
+            size = (max(1, round(image.width * scale)), max(1, round(image.height * scale)))
+            return image.resize(size, Image.LANCZOS)
+        img = stage("downscale", downscale, img)
+
+    if config["grayscale"] or config["binarize"]:
+        img = stage("grayscale", lambda image: image.convert("L"), img)
+
+    if config["binarize"]:
+        img = stage("binarize", lambda image: adaptive_threshold(
+            image, config["block_radius"], config["threshold_offset"]), img)
+
+    if config["autocrop"]:
+        def autocrop(image):
+            ink = ImageOps.invert(image if image.mode == "L" else image.convert("L"))
+            if not config["binarize"]:
+                ink = ink.point(lambda v: 255 if v > 128 else 0)
+            box = ink.getbbox()
+            if not box:
+                return image
+            m = config["crop_margin"]
+            return image.crop((max(0, box[0] - m), max(0, box[1] - m),
+                               min(image.width, box[2] + m), min(image.height, box[3] + m)))
+        img = stage("autocrop", autocrop, img)
+
+    return img, timings
@@ -0,0 +1,118 @@
+import hashlib
+import json
+import os
+import threading
+import time
+import uuid
+
+CHUNK_SIZE = 1 << 16
+
+
+class UploadStore:
+    """Content-addressed storage for uploaded images and their OCR results.
+
+    Images are streamed to disk while their SHA-256 is computed and kept as
+    `blobs/<sha256><ext>`; the OCR result for an image lives next to it in
+    `results/<sha256>.json` (`results/<sha256>.p<n>.json` for page n of a
+    multi-page TIFF or PDF). Both files are touched on every hit, so their
+    mtime is the last-access time, and `collect_garbage` evicts the least
+    recently used entries (image and result together) once the store grows
+    past `max_bytes`. Entries used in the last `min_age` seconds are kept so
+    images with OCR still queued are not pulled out from under the job.
+    """
+
+    def __init__(self, root, max_bytes=500 * 1024 * 1024, gc_interval=60, min_age=600):
+        self.root = root
+        self.blobs_dir = os.path.join(root, "blobs")
+        self.results_dir = os.path.join(root, "results")
+        self.max_bytes = max_bytes
+        self.gc_interval = gc_interval
+        self.min_age = min_age
+        self._last_gc = 0.0
+        self._gc_lock = threading.Lock()
+        os.makedirs(self.blobs_dir, exist_ok=True)
+        os.makedirs(self.results_dir, exist_ok=True)
+
+    def save(self, stream, ext=""):
+        """Stream `stream` to disk; returns (sha256, path). Re-uploads reuse the stored file."""
+        ext = ext.lower() if ext.replace(".", "").isalnum() else ""
+        digest = hashlib.sha256()
+        tmp_path = os.path.join(self.blobs_dir, f".{uuid.uuid4().hex}.tmp")
+        try:
+            with open(tmp_path, "wb") as f:
+                for chunk in iter(lambda: stream.read(CHUNK_SIZE), b""):
+                    digest.update(chunk)
+                    f.write(chunk)
+            sha = digest.hexdigest()
+            path = os.path.join(self.blobs_dir, sha + ext)
+            if os.path.exists(path):
+                os.remove(tmp_path)
+                os.utime(path)
+            else:
+                os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        self.maybe_collect_garbage()
+        return sha, path
+
+    def _result_path(self, sha, page=None):
+        # Page results share the sha prefix, so GC evicts them with the blob
+        suffix = f".p{page}" if page is not None else ""
+        return os.path.join(self.results_dir, f"{sha}{suffix}.json")
+
+    def get_result(self, sha, page=None):
+        path = self._result_path(sha, page)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                result = json.load(f)
+            os.utime(path)
+            return result
+        except (OSError, ValueError):
+            return None
+
+    def put_result(self, sha, result, page=None):
+        path = self._result_path(sha, page)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(result, f)
+        os.replace(tmp_path, path)
+
+    def maybe_collect_garbage(self):
+        if time.monotonic() - self._last_gc >= self.gc_interval:
+            self.collect_garbage()
+
+    def collect_garbage(self):
+        """Evict least-recently-used images and results until under `max_bytes`."""
+        if not self._gc_lock.acquire(blocking=False):
+            return 0
+        try:
+            self._last_gc = time.monotonic()
+            entries = {}
+            total = 0
+            for directory in (self.blobs_dir, self.results_dir):
+                for entry in os.scandir(directory):
+                    if entry.name.startswith(".") or not entry.is_file():
+                        continue
+                    st = entry.stat()
+                    sha = entry.name.split(".", 1)[0]
+                    files, size, atime = entries.get(sha, ([], 0, 0.0))
+                    entries[sha] = (files + [entry.path], size + st.st_size, max(atime, st.st_mtime))
+                    total += st.st_size
+
+            evicted = 0
+            cutoff = time.time() - self.min_age
+            for sha, (files, size, last_used) in sorted(entries.items(), key=lambda item: item[1][2]):
+                if total <= self.max_bytes or last_used > cutoff:
+                    break
+                for path in files:
+                    try:
+                        os.remove(path)
+                    except FileNotFoundError:
+                        pass
+                total -= size
+                evicted += 1
+            return evicted
+        finally:
+            self._gc_lock.release()
@@ -0,0 +1,298 @@
+"""Bulk onboarding of patients and their regimens from CSV or JSONL.
+
+CSV has one row per medicine, with columns username, password, medicine,
+time, period and days. A patient's later rows may leave the password
+empty, and a row without a medicine only creates the account. A JSONL line
+is either such a flat row or one whole patient:
+
+    {"username": "p001", "password": "...", "schedules": [{"name": "Metformin", "time": "08:00", "days": ["Mon", "Thu"]}]}
+
+`days` is a list or a string like "Mon;Wed;Fri"; empty means every day.
+A werkzeug `password_hash` may be given instead of `password`.
+
+The input is parsed as a stream and applied in chunks. The passwords of a
+chunk are hashed in a process pool, then users and schedules are inserted
+in bulk. The caller owns the transaction, so an import is applied whole or
+not at all. Rows that fail validation are skipped and listed in the
+report. Running reminder workers pick imported schedules up on their next
+tick, including any dose that fell due in between.
+
+    python onboarding.py patients.csv --report errors.json
+    python onboarding.py patients.jsonl --append-existing --dry-run
+"""
+import argparse
+import csv
+import io
+import json
+import multiprocessing
+import os
+import re
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from sqlalchemy import insert, select
+from werkzeug.security import generate_password_hash
+
+from models import DAY_BITS, Schedule, User
+
+IMPORT_CHUNK = 500
+# Processes hashing passwords; 0 = one per CPU
+HASH_WORKERS = int(os.getenv("ONBOARD_HASH_WORKERS", 0)) or None
+# Below this many passwords the pool is not worth a round trip
+HASH_INLINE_BELOW = 4
+
+HASH_PREFIXES = ("scrypt:", "pbkdf2:")
+# "mon", "monday" -> "Mon"
+DAY_ALIASES = {alias: day for day in DAY_BITS for alias in (day.lower(), {
+    "Mon": "monday", "Tue": "tuesday", "Wed": "wednesday", "Thu": "thursday",
+    "Fri": "friday", "Sat": "saturday", "Sun": "sunday"}[day])}
+TIME_RE = re.compile(r"^([01]?\d|2[0-3]):([0-5]\d)$")
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _hash_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # spawn: forking a threaded web worker is not safe
+            _pool = ProcessPoolExecutor(max_workers=HASH_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+        return _pool
+
+
+def hash_passwords(passwords):
+    if len(passwords) < HASH_INLINE_BELOW:
+        return [generate_password_hash(p) for p in passwords]
+    chunksize = max(1, len(passwords) // (4 * (HASH_WORKERS or os.cpu_count() or 1)))
+    return list(_hash_pool().map(generate_password_hash, passwords, chunksize=chunksize))
+
+
+def parse_days(value):
+    """Weekday list from a list or a "Mon;Wed" / "Mon, Wed" string; empty or "daily" is every day."""
+    if isinstance(value, str):
+        value = [day for day in re.split(r"[\s,;|]+", value) if day]
+    elif value is not None and not isinstance(value, list):
+        raise ValueError('days must be a list or a string like "Mon;Wed"')
+    if not value or [str(day).lower() for day in value] == ["daily"]:
+        return list(DAY_BITS)
+    unknown = [str(day) for day in value if str(day).strip().lower() not in DAY_ALIASES]
+    if unknown:
+        raise ValueError(f"Unknown day: {', '.join(unknown)}")
+    days = {DAY_ALIASES[str(day).strip().lower()] for day in value}
+    return [day for day in DAY_BITS if day in days]
+
+
+def _text(value):
+    return "" if value is None else str(value).strip()
+
+
+def _flat_schedule(row):
+    medicine = _text(row.get("medicine") or row.get("name"))
+    if not medicine:
+        return []
+    return [{"name": medicine, "time": row.get("time"), "period": row.get("period"), "days": row.get("days")}]
+
+
+def iter_records(stream, filename):
+    """Yield (row_number, record) from a .csv or .jsonl upload without loading it whole.
+
+    Raises ValueError for unsupported files or a CSV without a username column.
+    """
+    ext = os.path.splitext(filename)[1].lower()
+    text = io.TextIOWrapper(stream, encoding="utf-8-sig", newline="" if ext == ".csv" else None)
+    if ext == ".csv":
+        reader = csv.reader(text)
+        header = [_text(cell).lower() for cell in next(reader, None) or []]
+        if "username" not in header:
+            raise ValueError("The first row must have a 'username' column")
+        for number, row in enumerate(reader, start=2):
+            if not any(cell.strip() for cell in row):
+                continue
+            values = dict(zip(header, row))
+            yield number, dict(values, schedules=_flat_schedule(values))
+    elif ext in (".jsonl", ".ndjson"):
+        for number, line in enumerate(text, start=1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError as e:
+                yield number, {"_error": f"Invalid JSON: {e}"}
+                continue
+            if not isinstance(record, dict):
+                yield number, {"_error": "Each line must be a JSON object"}
+            elif "schedules" in record:
+                yield number, record
+            else:
+                yield number, dict(record, schedules=_flat_schedule(record))
+    else:
+        raise ValueError("Upload a .csv or .jsonl file")
+
+
+def _validate(record):
+    """Normalized copy of `record`; raises ValueError naming the first problem."""
+    if "_error" in record:
+        raise ValueError(record["_error"])
+    username = _text(record.get("username"))
+    if not username:
+        raise ValueError("Missing username")
+    if len(username) > User.username.type.length:
+        raise ValueError("username is too long")
+    password_hash = _text(record.get("password_hash"))
+    if password_hash and not password_hash.startswith(HASH_PREFIXES):
+        raise ValueError("password_hash is not a werkzeug password hash")
+
+    schedules = record.get("schedules") or []
+    if not isinstance(schedules, list):
+        raise ValueError("schedules must be a list")
+    normalized = []
+    for sch in schedules:
+        if not isinstance(sch, dict):
+            raise ValueError("Each schedule must be an object with name, time and days")
+        name = _text(sch.get("name") or sch.get("medicine"))
+        if not name:
+            raise ValueError("Schedule without a medicine name")
+        if len(name) > Schedule.medicine_name.type.length:
+            raise ValueError(f"Medicine name is too long: {name[:20]}...")
+        match = TIME_RE.match(_text(sch.get("time")))
+        if not match:
+            raise ValueError(f"time must be HH:MM for {name}")
+        normalized.append({
+            "name": name,
+            "time": f"{int(match.group(1)):02d}:{match.group(2)}",
+            "period": _text(sch.get("period")) or None,
+            "days": parse_days(sch.get("days")),
+        })
+    return {
+        "username": username,
+        "password": _text(record.get("password")),
+        "password_hash": password_hash,
+        "schedules": normalized,
+    }
+
+
+def import_patients(session, records, append_existing=False, chunk_size=IMPORT_CHUNK):
+    """Create users and schedules from (row_number, record) pairs; returns a report.
+
+    Usernames that already exist are errors unless `append_existing`, in
+    which case their schedules are added and the password is left alone.
+    """
+    report = {"rows": 0, "users_created": 0, "users_appended": 0, "schedules_created": 0, "errors": []}
+    # username -> id for every user this import created or appends to
+    known = {}
+
+    chunk = []
+    for number, record in records:
+        report["rows"] += 1
+        chunk.append((number, record))
+        if len(chunk) >= chunk_size:
+            _flush(session, chunk, known, append_existing, report)
+            chunk = []
+    if chunk:
+        _flush(session, chunk, known, append_existing, report)
+    report["errors"].sort(key=lambda e: e["row"])
+    return report
+
+
+def _flush(session, chunk, known, append_existing, report):
+    def error(number, username, message):
+        report["errors"].append({"row": number, "username": username, "error": message})
+
+    valid = []
+    for number, record in chunk:
+        try:
+            valid.append((number, _validate(record)))
+        except ValueError as e:
+            error(number, _text(record.get("username")) or None, str(e))
+
+    names = {r["username"] for _, r in valid} - known.keys()
+    existing = dict(session.execute(
+        select(User.username, User.id).where(User.username.in_(names))
+    ).all()) if names else {}
+
+    new_users = {}
+    accepted = []
+    for number, r in valid:
+        name = r["username"]
+        if name in known or name in new_users:
+            accepted.append(r)
+        elif name in existing:
+            if not append_existing:
+                error(number, name, "User already exists")
+                continue
+            known[name] = existing[name]
+            report["users_appended"] += 1
+            accepted.append(r)
+        elif not (r["password"] or r["password_hash"]):
+            error(number, name, "Password is required for a new user")
+        else:
+            new_users[name] = r
+            accepted.append(r)
+
+    if new_users:
+        plain = [r for r in new_users.values() if not r["password_hash"]]
+        for r, hashed in zip(plain, hash_passwords([r["password"] for r in plain])):
+            r["password_hash"] = hashed
+        session.execute(insert(User), [
+            {"username": name, "password_hash": r["password_hash"]} for name, r in new_users.items()
+        ])
+        known.update(session.execute(
+            select(User.username, User.id).where(User.username.in_(list(new_users)))
+        ).all())
+        report["users_created"] += len(new_users)
+
+    schedules = []
+    for r in accepted:
+        for sch in r["schedules"]:
+            row = Schedule(user_id=known[r["username"]], medicine_name=sch["name"],
+                           time=sch["time"], period=sch["period"], is_active=True)
+            row.set_days(sch["days"])
+            schedules.append(row)
+    if schedules:
+        session.add_all(schedules)
+        User.bump_schedule_version(*{row.user_id for row in schedules})
+        session.flush()
+        # Nothing reads them back; keep the session small on large imports
+        for row in schedules:
+            session.expunge(row)
+        report["schedules_created"] += len(schedules)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("file", help=".csv or .jsonl")
+    parser.add_argument("--append-existing", action="store_true",
+                        help="add schedules to existing usernames instead of rejecting them")
+    parser.add_argument("--dry-run", action="store_true", help="validate and roll back")
+    parser.add_argument("--report", help="write the full report, with every row error, to this JSON file")
+    args = parser.parse_args()
+
+    # Only the database is needed; no reminder thread in this process
+    os.environ.setdefault("REMINDER_WORKER", "0")
+    from main import app
+    from models import db
+
+    with app.app_context(), open(args.file, "rb") as f:
+        try:
+            report = import_patients(db.session, iter_records(f, args.file), args.append_existing)
+        except Exception:
+            db.session.rollback()
+            raise
+        if args.dry_run:
+            db.session.rollback()
+        else:
+            db.session.commit()
+
+    print(f"{report['rows']} rows: {report['users_created']} users created, "
+          f"{report['users_appended']} appended to, {report['schedules_created']} schedules, "
+          f"{len(report['errors'])} errors" + (" (dry run, nothing saved)" if args.dry_run else ""))
+    for e in report["errors"][:20]:
+        print(f"  row {e['row']} ({e['username']}): {e['error']}")
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
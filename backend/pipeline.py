@@ -0,0 +1,181 @@
+"""The prescription pipeline as chained generator stages in one process.
+
+Each stage takes an iterable of records (dicts) and yields them with its
+own fields added, so records stream through OCR -> clean -> detect ->
+lookup without intermediate files. Every stage also adds its wall time to
+record["timings_ms"].
+
+    python pipeline.py uploads/ --out results.jsonl --workers 4
+    python pipeline.py ocr/data/input_image.jpg --question "side effects"
+
+Directories are processed image by image in parallel across processes.
+Results are written one JSON object per line in completion order,
+followed by a throughput and per-stage latency summary on stderr.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import statistics
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from drug_lookup import lookup_drug
+from ocr.cleaner import clean_text
+from ocr.keyword_check import detect_medicines
+from ocr.ocr_engine import extract_text_with_timings
+from rag_answer import find_answer_context
+
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".tif", ".tiff", ".bmp", ".webp", ".pdf"}
+
+
+def _timed(record, stage, started):
+    record.setdefault("timings_ms", {})[stage] = round((time.perf_counter() - started) * 1000, 2)
+    return record
+
+
+def ocr_stage(paths, timeout=0):
+    for path in paths:
+        started = time.perf_counter()
+        record = {"image": path}
+        try:
+            record["text"], record["ocr_stages_ms"] = extract_text_with_timings(path, timeout=timeout)
+        except Exception as e:
+            record["error"] = str(e) or e.__class__.__name__
+            record["text"] = ""
+        yield _timed(record, "ocr", started)
+
+
+def clean_stage(records):
+    for record in records:
+        started = time.perf_counter()
+        record["cleaned_text"] = clean_text(record["text"])
+        yield _timed(record, "clean", started)
+
+
+def detect_stage(records, use_kb=False):
+    if use_kb:
+        from rag.rag_engine import bind_database, extract_medicines
+        bind_database()
+
+        def detect(record):
+            # The catalog matcher handles OCR misspellings; it reads the raw text
+            return [m["name"] for m in extract_medicines(record["text"])]
+    else:
+        def detect(record):
+            return detect_medicines(record["cleaned_text"])
+
+    for record in records:
+        started = time.perf_counter()
+        record["medicines"] = detect(record)
+        yield _timed(record, "detect", started)
+
+
+def lookup_stage(records):
+    for record in records:
+        started = time.perf_counter()
+        record["drug_info"] = {med: lookup_drug(med.lower()) for med in record["medicines"]}
+        yield _timed(record, "lookup", started)
+
+
+def answer_stage(records, question):
+    for record in records:
+        started = time.perf_counter()
+        record["answer_context"] = find_answer_context(question)
+        yield _timed(record, "answer", started)
+
+
+def run(paths, question=None, use_kb=False, timeout=0):
+    """Chain the stages over `paths`; yields one finished record per image."""
+    records = lookup_stage(detect_stage(clean_stage(ocr_stage(paths, timeout)), use_kb))
+    if question:
+        records = answer_stage(records, question)
+    return records
+
+
+def process_image(path, question=None, use_kb=False, timeout=0):
+    # Process-pool entry point: the whole chain for a single image
+    return next(run([path], question, use_kb, timeout))
+
+
+def find_images(inputs):
+    for item in inputs:
+        if os.path.isdir(item):
+            for root, _, files in os.walk(item):
+                for name in sorted(files):
+                    if os.path.splitext(name)[1].lower() in IMAGE_EXTENSIONS:
+                        yield os.path.join(root, name)
+        else:
+            yield item
+
+
+def run_parallel(paths, workers, question=None, use_kb=False, timeout=0):
+    """Like `run`, spread over `workers` processes; yields records as they finish."""
+    if workers <= 1:
+        yield from run(paths, question, use_kb, timeout)
+        return
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+        # Bounded window of in-flight images, so huge archives are not all queued up front
+        paths = iter(paths)
+        pending = set()
+        for path in paths:
+            pending.add(pool.submit(process_image, path, question, use_kb, timeout))
+            if len(pending) >= workers * 4:
+                break
+        while pending:
+            finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in finished:
+                yield future.result()
+                path = next(paths, None)
+                if path is not None:
+                    pending.add(pool.submit(process_image, path, question, use_kb, timeout))
+
+
+def summarize(records, elapsed):
+    stages = {}
+    for record in records:
+        for stage, ms in record["timings_ms"].items():
+            stages.setdefault(stage, []).append(ms)
+    count = len(records)
+    return {
+        "images": count,
+        "failed": sum(1 for r in records if "error" in r),
+        "elapsed_s": round(elapsed, 2),
+        "images_per_s": round(count / elapsed, 2) if elapsed else None,
+        "stages_ms": {
+            stage: {
+                "mean": round(statistics.fmean(values), 1),
+                "p50": round(statistics.median(values), 1),
+                "p95": round(sorted(values)[int(0.95 * (len(values) - 1))], 1),
+            }
+            for stage, values in stages.items()
+        },
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("inputs", nargs="+", help="images or directories of images")
+    parser.add_argument("--out", help="JSONL output file (default: stdout)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--question", help="also collect drug notes relevant to this question")
+    parser.add_argument("--kb", action="store_true", help="match medicines against the catalog (DATABASE_URL) instead of the keyword list")
+    parser.add_argument("--timeout", type=int, default=0, help="tesseract timeout per image, in seconds")
+    args = parser.parse_args()
+
+    out = open(args.out, "w", encoding="utf-8") if args.out else sys.stdout
+    timings = []
+    started = time.perf_counter()
+    try:
+        for record in run_parallel(find_images(args.inputs), args.workers, args.question, args.kb, args.timeout):
+            out.write(json.dumps(record) + "\n")
+            timings.append({"timings_ms": record["timings_ms"], **({"error": 1} if "error" in record else {})})
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    print(json.dumps(summarize(timings, time.perf_counter() - started), indent=2), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,193 @@
+import random
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+from py_vapid import Vapid
+from pywebpush import webpush, WebPushException
+
+import metrics
+
+# Push services ask us to back off with these
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+# The subscription no longer exists and should be forgotten
+GONE_STATUSES = {404, 410}
+# The push service did not accept our VAPID token
+AUTH_STATUSES = {401, 403}
+
+MAX_RETRY_AFTER = 30.0
+
+# Lifetime of a signed VAPID token (push services accept at most 24 h)
+VAPID_TOKEN_TTL = 12 * 3600
+# Re-sign this long before a cached token expires
+VAPID_REFRESH_MARGIN = 600
+
+
+def push_origin(endpoint):
+    url = urlparse(endpoint)
+    return f"{url.scheme}://{url.netloc}"
+
+
+class VapidHeaderCache:
+    """Signed VAPID Authorization headers, one per push-service audience.
+
+    The private key is parsed once. A token is signed the first time an
+    audience is seen and reused until `margin` seconds before its `exp`, so
+    a send only pays for encrypting the payload.
+    """
+
+    def __init__(self, private_key, claims, ttl=VAPID_TOKEN_TTL, margin=VAPID_REFRESH_MARGIN):
+        self.claims = dict(claims)
+        self.ttl = ttl
+        self.margin = margin
+        self._vapid = None
+        if private_key:
+            try:
+                self._vapid = Vapid.from_string(private_key=private_key)
+            except Exception as e:
+                print(f"Invalid VAPID private key, web push disabled: {e}")
+        self._headers = {}
+        self._lock = threading.Lock()
+        self._counters = Counter()
+
+    def headers(self, audience):
+        """Authorization headers for `audience` (a push-service origin)."""
+        now = time.time()
+        with self._lock:
+            cached = self._headers.get(audience)
+            if cached and cached[0] - self.margin > now:
+                self._counters["hits"] += 1
+                metrics.VAPID_HEADERS.inc(result="hit")
+                return cached[1]
+            if self._vapid is None:
+                raise WebPushException("VAPID private key is not configured")
+            exp = int(now) + self.ttl
+            headers = self._vapid.sign(dict(self.claims, aud=audience, exp=exp))
+            self._headers[audience] = (exp, headers)
+            self._counters["misses"] += 1
+            metrics.VAPID_HEADERS.inc(result="miss")
+            return headers
+
+    def invalidate(self, audience):
+        # The push service rejected our token; sign a fresh one next time
+        with self._lock:
+            self._headers.pop(audience, None)
+
+    def stats(self):
+        with self._lock:
+            return dict(self._counters, audiences=len(self._headers))
+
+
+class PushDispatcher:
+    """Delivers web-push messages from a bounded thread pool.
+
+    Each push-service origin (FCM, Mozilla autopush, ...) gets its own pooled
+    `requests.Session` so connections are reused across notifications. Sends
+    that hit 429/5xx or a network error are retried with jittered exponential
+    backoff (honouring Retry-After); 404/410 responses report the
+    subscription as gone through `on_gone(user_id, endpoint)`. VAPID headers
+    come from a VapidHeaderCache rather than being signed per message.
+    """
+
+    def __init__(self, vapid_private_key, vapid_claims, max_workers=8, max_retries=3,
+                 backoff=0.5, timeout=10, on_gone=None):
+        self.vapid = VapidHeaderCache(vapid_private_key, vapid_claims)
+        self.max_workers = max_workers
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.on_gone = on_gone
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="push")
+        self._sessions = {}
+        self._lock = threading.Lock()
+        self._counters = Counter()
+
+    def _session(self, origin):
+        with self._lock:
+            session = self._sessions.get(origin)
+            if session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.max_workers)
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                self._sessions[origin] = session
+            return session
+
+    def _count(self, outcome, n=1):
+        with self._lock:
+            self._counters[outcome] += n
+
+    def stats(self):
+        with self._lock:
+            counters = dict(self._counters)
+        return dict(counters, vapid=self.vapid.stats())
+
+    def submit(self, subscription_info, message_body, user_id=None):
+        """Queue one notification; returns a Future resolving to the outcome string."""
+        self._count("queued")
+        return self._executor.submit(self._deliver, subscription_info, message_body, user_id)
+
+    def _deliver(self, subscription_info, message_body, user_id):
+        started = time.perf_counter()
+        outcome = self._attempt(subscription_info, message_body, user_id)
+        metrics.PUSH_DELIVERIES.inc(outcome=outcome)
+        metrics.PUSH_SECONDS.observe(time.perf_counter() - started, outcome=outcome)
+        return outcome
+
+    def _attempt(self, subscription_info, message_body, user_id):
+        endpoint = subscription_info.get("endpoint", "")
+        origin = push_origin(endpoint)
+        session = self._session(origin)
+
+        for attempt in range(self.max_retries + 1):
+            delay = self.backoff * (2 ** attempt) * (0.5 + random.random())
+            try:
+                webpush(
+                    subscription_info=subscription_info,
+                    data=message_body,
+                    # `aud` must match the push service of *this* subscription
+                    headers=self.vapid.headers(origin),
+                    requests_session=session,
+                    timeout=self.timeout,
+                )
+                self._count("sent")
+                return "sent"
+            except WebPushException as ex:
+                status = ex.response.status_code if ex.response is not None else None
+                if status in GONE_STATUSES:
+                    self._count("gone")
+                    if self.on_gone:
+                        try:
+                            self.on_gone(user_id, endpoint)
+                        except Exception as e:
+                            print(f"Web Push prune error: {e}")
+                    return "gone"
+                if status in AUTH_STATUSES:
+                    self.vapid.invalidate(origin)
+                if status not in RETRY_STATUSES:
+                    self._count("failed")
+                    print(f"Web Push Error: {ex}")
+                    return "failed"
+                retry_after = ex.response.headers.get("Retry-After", "")
+                if retry_after.isdigit():
+                    delay = min(float(retry_after), MAX_RETRY_AFTER)
+            except requests.RequestException as ex:
+                print(f"Web Push network error ({origin}): {ex}")
+
+            if attempt < self.max_retries:
+                self._count("retried")
+                time.sleep(delay)
+
+        self._count("failed")
+        return "failed"
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait)
+        with self._lock:
+            for session in self._sessions.values():
+                session.close()
+            self._sessions.clear()
@@ -0,0 +1,98 @@
+"""Local stand-in for a web-push service, for exercising push.PushDispatcher.
+
+Run it, then point a subscription's endpoint at it:
+
+    python push_standin.py --port 8099
+
+    http://127.0.0.1:8099/ok/<id>        -> 201 Created
+    http://127.0.0.1:8099/status/410/<id> -> that status code
+    http://127.0.0.1:8099/flaky/<id>      -> 503 on the first request, then 201
+    http://127.0.0.1:8099/slow/<id>       -> 201 after --delay seconds
+
+On startup it prints a ready-to-use subscription (with valid encryption keys)
+for each route. GET /stats returns the request counts per path.
+"""
+import argparse
+import base64
+import json
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import ec
+
+hits = Counter()
+hits_lock = threading.Lock()
+
+
+def _b64(data):
+    return base64.urlsafe_b64encode(data).decode("utf-8").strip("=")
+
+
+def make_subscription(endpoint):
+    key = ec.generate_private_key(ec.SECP256R1())
+    public = key.public_key().public_bytes(
+        encoding=serialization.Encoding.X962,
+        format=serialization.PublicFormat.UncompressedPoint,
+    )
+    return {"endpoint": endpoint, "keys": {"p256dh": _b64(public), "auth": _b64(b"0123456789abcdef")}}
+
+
+class StandinHandler(BaseHTTPRequestHandler):
+    delay = 2.0
+
+    def _reply(self, status, body=b""):
+        self.send_response(status)
+        if status == 429:
+            self.send_header("Retry-After", "1")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path == "/stats":
+            with hits_lock:
+                body = json.dumps(dict(hits)).encode("utf-8")
+            return self._reply(200, body)
+        self._reply(404)
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        with hits_lock:
+            hits[self.path] += 1
+            count = hits[self.path]
+
+        parts = self.path.strip("/").split("/")
+        if parts[0] == "status" and len(parts) > 1 and parts[1].isdigit():
+            return self._reply(int(parts[1]))
+        if parts[0] == "flaky":
+            return self._reply(503 if count == 1 else 201)
+        if parts[0] == "slow":
+            time.sleep(self.delay)
+        self._reply(201)
+
+    def log_message(self, fmt, *args):
+        print(f"[standin] {self.address_string()} {fmt % args}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8099)
+    parser.add_argument("--delay", type=float, default=2.0)
+    args = parser.parse_args()
+
+    StandinHandler.delay = args.delay
+    base = f"http://{args.host}:{args.port}"
+    for route in ["ok/1", "status/410/1", "status/429/1", "flaky/1", "slow/1"]:
+        print(json.dumps(make_subscription(f"{base}/{route}")))
+
+    server = ThreadingHTTPServer((args.host, args.port), StandinHandler)
+    print(f"Push stand-in listening on {base}")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
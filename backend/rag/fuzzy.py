@@ -0,0 +1,142 @@
+import re
+
+from rag.matcher import normalize_name
+
+# Characters tesseract commonly substitutes for letters
+OCR_CONFUSIONS = str.maketrans({
+    "0": "o",
+    "1": "l",
+    "|": "l",
+    "!": "l",
+    "5": "s",
+    "$": "s",
+    "8": "b",
+    "@": "a",
+})
+
+_TOKEN = re.compile(r"[A-Za-z0-9$@|!]+")
+
+
+def _trigrams(word):
+    padded = f"^{word}$"
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def edit_distance(a, b, limit):
+    """Optimal string alignment distance, or `limit + 1` once it exceeds `limit`."""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    prev2 = None
+    prev = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        cur = [i] + [0] * len(b)
+        row_min = i
+        for j in range(1, len(b) + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            cur[j] = min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + cost)
+            if (prev2 is not None and i > 1 and j > 1
+                    and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]):
+                cur[j] = min(cur[j], prev2[j - 2] + 1)
+            row_min = min(row_min, cur[j])
+        if row_min > limit:
+            return limit + 1
+        prev2, prev = prev, cur
+    return prev[-1]
+
+
+class FuzzyIndex:
+    """Approximate drug-name lookup for OCR output.
+
+    Names are indexed by character trigrams. A query only scores the names
+    that share trigrams with it (and have a compatible length), then verifies
+    the best few with a bounded edit distance, so the work per token depends
+    on how many names look alike rather than on the size of the catalog.
+    """
+
+    def __init__(self, names, max_distance=2, min_confidence=0.75, min_length=4):
+        self.max_distance = max_distance
+        self.min_confidence = min_confidence
+        self.min_length = min_length
+        self._names = []
+        self._postings = {}
+        for name in dict.fromkeys(names):
+            self.add(name)
+
+    def add(self, name):
+        """Index one more name in place, touching only its own trigram postings.
+
+        Safe while other threads run `lookup`: the name is stored before any
+        posting refers to it, and postings only ever grow.
+        """
+        key = normalize_name(name)
+        if len(key) < self.min_length or " " in key:
+            return
+        name_id = len(self._names)
+        self._names.append((key, name))
+        for gram in _trigrams(key):
+            self._postings.setdefault(gram, []).append(name_id)
+
+    def __len__(self):
+        return len(self._names)
+
+    def lookup(self, token, max_candidates=8):
+        """Return (canonical_name, confidence) for the closest name, or None."""
+        word = token.lower().translate(OCR_CONFUSIONS)
+        if len(word) < self.min_length or not word.isalpha():
+            return None
+
+        grams = _trigrams(word)
+        counts = {}
+        for gram in grams:
+            for name_id in self._postings.get(gram, ()):
+                counts[name_id] = counts.get(name_id, 0) + 1
+        if not counts:
+            return None
+
+        # q-gram lemma: one edit (or transposition) destroys at most four trigrams
+        min_shared = len(grams) - 4 * self.max_distance
+        candidates = [
+            name_id for name_id, shared in counts.items()
+            if shared >= min_shared
+            and abs(len(self._names[name_id][0]) - len(word)) <= self.max_distance
+        ]
+        candidates.sort(key=lambda name_id: -counts[name_id])
+
+        best = None
+        limit = self.max_distance
+        for name_id in candidates[:max_candidates]:
+            key, name = self._names[name_id]
+            distance = edit_distance(word, key, limit)
+            if distance > limit:
+                continue
+            confidence = 1.0 - distance / max(len(word), len(key))
+            if best is None or confidence > best[1]:
+                best = (name, confidence)
+                limit = distance
+        if best is None or best[1] < self.min_confidence:
+            return None
+        return best[0], round(best[1], 3)
+
+    def find_all(self, text, skip=()):
+        """Best match per distinct name found in `text`, as (name, confidence), in order.
+
+        Tokens inside one of the sorted (start, end) `skip` spans, e.g. the
+        exact matches already found, are not looked up.
+        """
+        found = {}
+        seen = set()
+        spans = iter(skip)
+        span = next(spans, None)
+        for m in _TOKEN.finditer(text):
+            while span is not None and span[1] <= m.start():
+                span = next(spans, None)
+            if span is not None and span[0] <= m.start() and m.end() <= span[1]:
+                continue
+            token = m.group(0)
+            if token in seen:
+                continue
+            seen.add(token)
+            match = self.lookup(token)
+            if match and match[1] > found.get(match[0], 0.0):
+                found[match[0]] = match[1]
+        return list(found.items())
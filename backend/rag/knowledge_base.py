@@ -0,0 +1,254 @@
+import hashlib
+import os
+import pickle
+import threading
+import time
+
+from sqlalchemy import select
+from sqlalchemy.exc import SQLAlchemyError
+
+import metrics
+from models import CatalogVersion, Medicine, db
+from rag.fuzzy import FuzzyIndex
+from rag.matcher import DrugMatcher
+from rag.rag_indexer import SIDE_EFFECT_WEIGHTS, SearchIndex
+
+FIELDS = ["Name", "Used for", "How it works", "Common side effects", "Notes"]
+
+# Bump when the compiled layout changes so stale cache files are ignored
+CACHE_FORMAT = 5
+
+
+class Snapshot:
+    """Immutable, fully built view of the drug catalog.
+
+    A snapshot is built completely before it is published, so readers that
+    grabbed one keep a consistent view even while a reload is in progress.
+    The one exception is the fuzzy index, which `extended` snapshots share
+    and grow in place: an older snapshot may also find a newer name.
+    """
+
+    __slots__ = ("version", "records", "docs", "matcher", "fuzzy", "index", "side_effects")
+
+    def __init__(self, version, records):
+        self.version = version
+        # Tuple of (name, used_for, how_it_works, side_effects, notes)
+        self.records = tuple(records)
+        self.docs = {}
+        for record in self.records:
+            self.docs[record[0].lower().strip()] = _document(record)
+        # Built once per catalog version and shared by /ask and /upload
+        self.matcher = DrugMatcher(self.docs.keys())
+        self.fuzzy = FuzzyIndex(self.docs.keys())
+        self.index = SearchIndex.build(FIELDS, self.records)
+        # Only for questions about what a drug causes, never for what it treats
+        self.side_effects = SearchIndex.build(FIELDS, self.records, SIDE_EFFECT_WEIGHTS)
+
+    def extended(self, version, record):
+        """Return a new snapshot with `record` appended, reusing this one's indexes.
+
+        Only the new name is compiled into the matcher (as a second pattern)
+        and added to the fuzzy index; `compacted` rebuilds both in one piece.
+        """
+        name = record[0].lower().strip()
+        new = Snapshot.__new__(Snapshot)
+        new.version = version
+        new.records = self.records + (record,)
+        new.docs = dict(self.docs)
+        new.docs[name] = _document(record)
+        new.matcher = self.matcher.extended([name])
+        self.fuzzy.add(name)
+        new.fuzzy = self.fuzzy
+        new.index = self.index.with_document(record)
+        new.side_effects = self.side_effects.with_document(record)
+        return new
+
+    def compacted(self):
+        """The same catalog with its matcher and fuzzy index rebuilt from scratch.
+
+        The result shares nothing that later `extended` calls mutate, so it
+        can be pickled while adds continue.
+        """
+        new = Snapshot.__new__(Snapshot)
+        new.version = self.version
+        new.records = self.records
+        new.docs = self.docs
+        new.matcher = DrugMatcher(self.docs.keys())
+        new.fuzzy = FuzzyIndex(self.docs.keys())
+        new.index = self.index
+        new.side_effects = self.side_effects
+        return new
+
+
+def _document(record):
+    return "".join(f"{field}: {value}\n" for field, value in zip(FIELDS, record))
+
+
+EMPTY_SNAPSHOT = Snapshot("empty", [])
+
+
+def _clean(value):
+    if value is None or (isinstance(value, float) and value != value):
+        return ""
+    return str(value).strip()
+
+
+class KnowledgeBase:
+    """Process-wide cache of the compiled drug catalog.
+
+    The catalog lives in the `medicine` table. Every write bumps the single
+    `catalog_version` row, so a worker only polls that row and re-reads the
+    table when it changes. Compiled snapshots are also pickled to
+    `cache_path`, keyed by the version, so other gunicorn workers load the
+    compiled form instead of rebuilding the indexes.
+
+    `add_record` only indexes the new medicine. Once adds have paused for
+    `compact_delay` seconds a background thread rebuilds the name matcher
+    and writes the cache, so neither cost lands on the admin request.
+    """
+
+    def __init__(self, cache_path, check_interval=2.0, compact_delay=1.0):
+        self.cache_path = cache_path
+        self.check_interval = check_interval
+        self.compact_delay = compact_delay
+        self._engine = None
+        self._source = None
+        self._snapshot = EMPTY_SNAPSHOT
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+        # monotonic() deadline of the pending compaction, and the thread that runs it
+        self._compact_due = None
+        self._compactor = None
+
+    def init_app(self, app):
+        with app.app_context():
+            self.bind(db.engine)
+
+    def bind(self, engine):
+        """Read the catalog through `engine` (a Flask app's, or one made by a script)."""
+        self._engine = engine
+        # Versions are only comparable within one database
+        self._source = hashlib.sha256(str(engine.url).encode("utf-8")).hexdigest()[:12]
+        self._checked_at = 0.0
+
+    def _version_key(self, version):
+        return f"{self._source}:{version or 0}"
+
+    def snapshot(self):
+        # One single-row query at most every `check_interval` seconds; the
+        # published snapshot is swapped by a single attribute assignment.
+        if time.monotonic() - self._checked_at >= self.check_interval:
+            self.refresh()
+        return self._snapshot
+
+    def reload(self):
+        """Re-check the catalog version right now (e.g. after an admin write)."""
+        return self.refresh()
+
+    def refresh(self):
+        with self._lock:
+            self._checked_at = time.monotonic()
+            if self._engine is None:
+                return self._snapshot
+            try:
+                with self._engine.connect() as conn:
+                    version = self._version_key(conn.execute(
+                        select(CatalogVersion.version).where(CatalogVersion.id == 1)
+                    ).scalar())
+                    if version != self._snapshot.version:
+                        started = time.perf_counter()
+                        snapshot = self._load_cached(version) or self._compile(conn, version)
+                        self._snapshot = snapshot
+                        elapsed = time.perf_counter() - started
+                        metrics.KB_RELOAD_SECONDS.observe(elapsed)
+                        print(f"Knowledge base loaded {len(snapshot.records)} drugs "
+                              f"in {elapsed * 1000:.1f} ms")
+            except SQLAlchemyError as e:
+                print(f"Error loading medicine catalog: {e}")
+            return self._snapshot
+
+    def _load_cached(self, version):
+        try:
+            with open(self.cache_path, "rb") as f:
+                fmt, cached_version, snapshot = pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError, ValueError, TypeError):
+            return None
+        if fmt != CACHE_FORMAT or cached_version != version:
+            return None
+        return snapshot
+
+    def _compile(self, conn, version):
+        rows = conn.execute(
+            select(Medicine.name, Medicine.used_for, Medicine.how_it_works,
+                   Medicine.side_effects, Medicine.notes).order_by(Medicine.id)
+        )
+        records = [tuple(_clean(value) for value in row) for row in rows if _clean(row[0])]
+        snapshot = Snapshot(version, records)
+        self._write_cache(version, snapshot)
+        return snapshot
+
+    def _write_cache(self, version, snapshot):
+        # Write-then-rename so concurrent workers never read a partial cache
+        tmp_path = f"{self.cache_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, "wb") as f:
+                pickle.dump((CACHE_FORMAT, version, snapshot), f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, self.cache_path)
+        except OSError as e:
+            print(f"Could not write knowledge base cache: {e}")
+
+    def add_record(self, record, version):
+        """Publish a snapshot that includes a medicine just inserted as catalog `version`.
+
+        Only the new row is tokenized and indexed; the rest of the catalog is
+        shared with the current snapshot. If the current snapshot is not at
+        the version right before it (another write got in between) we fall
+        back to a full reload.
+        """
+        record = tuple(_clean(value) for value in record)
+        with self._lock:
+            if record[0] and self._engine is not None \
+                    and self._snapshot.version == self._version_key(version - 1):
+                snapshot = self._snapshot.extended(self._version_key(version), record)
+                self._snapshot = snapshot
+                self._checked_at = time.monotonic()
+                self._schedule_compaction()
+                return snapshot
+        return self.reload()
+
+    def _schedule_compaction(self):
+        # Called with self._lock held; each add pushes the deadline back
+        self._compact_due = time.monotonic() + self.compact_delay
+        if self._compactor is None:
+            self._compactor = threading.Thread(target=self._compact_loop, name="kb-compactor", daemon=True)
+            self._compactor.start()
+
+    def _compact_loop(self):
+        while True:
+            with self._lock:
+                due = self._compact_due
+                if due is None:
+                    self._compactor = None
+                    return
+                wait = due - time.monotonic()
+                if wait <= 0:
+                    self._compact_due = None
+                    snapshot = self._snapshot
+            if wait > 0:
+                time.sleep(wait)
+                continue
+            try:
+                self.compact(snapshot)
+            except Exception as e:
+                print(f"Could not compact knowledge base: {e}")
+
+    def compact(self, snapshot=None):
+        """Rebuild `snapshot` (default: the current one) in one piece, cache it and publish it."""
+        snapshot = snapshot or self._snapshot
+        compacted = snapshot.compacted()
+        self._write_cache(compacted.version, compacted)
+        with self._lock:
+            # Unless an add or reload has replaced it meanwhile (that one gets its own turn)
+            if self._snapshot is snapshot:
+                self._snapshot = compacted
+        return compacted
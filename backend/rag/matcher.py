@@ -0,0 +1,102 @@
+import re
+from itertools import chain
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_name(name):
+    return _WHITESPACE.sub(" ", str(name).lower()).strip()
+
+
+def _trie_pattern(node):
+    # `None` marks the end of a name; remaining keys are single characters.
+    branches = []
+    for ch in sorted(k for k in node if k is not None):
+        piece = r"\s+" if ch == " " else re.escape(ch)
+        branches.append(piece + _trie_pattern(node[ch]))
+
+    if not branches:
+        return ""
+    body = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+    if None in node:
+        # Greedy optional: try the longer name first, fall back to the shorter one
+        return ("(?:" + body + ")?") if len(branches) == 1 else body + "?"
+    return body
+
+
+class DrugMatcher:
+    """Finds whole-word drug mentions in one left-to-right scan.
+
+    All names are folded into a character trie and compiled into a single
+    regular expression, so each position of the text is tried once against
+    the whole catalog instead of once per drug name. At each position the
+    longest name that ends on a word boundary wins.
+    """
+
+    def __init__(self, names):
+        self._canonical = {}
+        trie = {}
+        for name in names:
+            key = normalize_name(name)
+            if not key or key in self._canonical:
+                continue
+            self._canonical[key] = name
+            node = trie
+            for ch in key:
+                node = node.setdefault(ch, {})
+            node[None] = True
+
+        self._pattern = None
+        if self._canonical:
+            self._pattern = re.compile(r"(?<!\w)" + _trie_pattern(trie) + r"(?!\w)")
+
+    def __len__(self):
+        return len(self._canonical)
+
+    def extended(self, names):
+        """Matcher that also finds `names`; only the new names are compiled."""
+        return LayeredMatcher(self, names)
+
+    def finditer(self, text):
+        """Yield (start, end, canonical_name) for every non-overlapping mention."""
+        if self._pattern is None or not text:
+            return
+        for m in self._pattern.finditer(text.lower()):
+            yield m.start(), m.end(), self._canonical[normalize_name(m.group(0))]
+
+    def find_all(self, text):
+        """Distinct canonical names in order of first appearance."""
+        seen = {}
+        for _, _, name in self.finditer(text):
+            seen.setdefault(name, None)
+        return list(seen)
+
+
+class LayeredMatcher(DrugMatcher):
+    """A compiled DrugMatcher plus names added since, in a second small pattern.
+
+    Adding a name to a large catalog would otherwise recompile the whole
+    trie. The two patterns are scanned separately and their matches merged
+    left to right, the longest at each position winning as before. Build a
+    new DrugMatcher from all the names to fold the additions back in.
+    """
+
+    def __init__(self, base, names):
+        self.base = base
+        self.added = [name for name in names if normalize_name(name) not in base._canonical]
+        self.extra = DrugMatcher(self.added)
+
+    def __len__(self):
+        return len(self.base) + len(self.extra)
+
+    def extended(self, names):
+        return LayeredMatcher(self.base, self.added + list(names))
+
+    def finditer(self, text):
+        matches = sorted(chain(self.base.finditer(text), self.extra.finditer(text)),
+                         key=lambda m: (m[0], m[0] - m[1]))
+        end = 0
+        for start, stop, name in matches:
+            if start >= end:
+                yield start, stop, name
+                end = stop
@@ -1,60 +1,82 @@
 import os
 import re
 
-import pandas as pd
+from rag.knowledge_base import KnowledgeBase
 
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-EXCEL_PATH = os.path.join(BASE_DIR, "drug_database", "medicine_database.xlsx")
+CACHE_PATH = os.path.join(BASE_DIR, "drug_database", ".medicine_catalog.compiled")
+
+# "What causes dizziness?", "side effects like nausea": answered from the
+# side-effects index, and said so, rather than as medicines for the symptom
+SIDE_EFFECT_QUESTION = re.compile(r"\bside[\s-]*effects?\b|\bcaus(?:e|es|ed|ing)\b")
+
+# Loaded once per process and recompiled only when the catalog changes;
+# main.py binds it to the app's database
+knowledge_base = KnowledgeBase(CACHE_PATH)
+
+_bound_url = None
+
+def bind_database(url=None):
+    # For scripts running outside the Flask app (pipeline.py --kb, benchmarks);
+    # binding the same URL again is a no-op
+    global _bound_url
+    from sqlalchemy import create_engine
+    default = "sqlite:///" + os.path.join(BASE_DIR, "instance", "med_assistant.db")
+    url = url or os.getenv("DATABASE_URL", default)
+    if url != _bound_url:
+        knowledge_base.bind(create_engine(url))
+        _bound_url = url
 
 def load_drug_documents():
-    docs = {}
-    if not os.path.exists(EXCEL_PATH):
-        print(f"Warning: {EXCEL_PATH} does not exist.")
-        return {}
-        
-    try:
-        df = pd.read_excel(EXCEL_PATH)
-        for _, row in df.iterrows():
-            drug_name = str(row['Name']).lower().strip()
-            # Construct a text representation similar to the old text files
-            content = f"Name: {row['Name']}\n"
-            content += f"Used for: {row['Used for']}\n"
-            content += f"How it works: {row['How it works']}\n"
-            content += f"Common side effects: {row['Common side effects']}\n"
-            content += f"Notes: {row['Notes']}\n"
-            docs[drug_name] = content
-    except Exception as e:
-        print(f"Error loading Excel: {e}")
-
-    return docs
+    return knowledge_base.snapshot().docs
+
+
+def extract_medicines(text):
+    """Find catalog drugs in OCR text.
+
+    Exact whole-word names come first (confidence 1.0), followed by
+    OCR-tolerant fuzzy matches for names tesseract misread. Words inside
+    an exact match are not fuzzy-matched again ("Vitamin C" is not also
+    "Vitamin").
+    """
+    snapshot = knowledge_base.snapshot()
+    matches = {}
+    spans = []
+    for start, end, name in snapshot.matcher.finditer(text):
+        matches.setdefault(name.capitalize(), 1.0)
+        spans.append((start, end))
+    for name, confidence in snapshot.fuzzy.find_all(text, skip=spans):
+        matches.setdefault(name.capitalize(), confidence)
+    return [{"name": name, "confidence": confidence} for name, confidence in matches.items()]
+
+
+def format_drug_info(drug_name, content):
+    lines = content.strip().split('\n')
+    formatted_response = f"💊 **{drug_name.capitalize()} Information**\n"
+
+    for line in lines:
+        if ":" in line:
+            key, value = line.split(":", 1)
+            formatted_response += f"🔹 **{key.strip()}**: {value.strip()}\n"
+        else:
+            formatted_response += f"• {line.strip()}\n"
+
+    return formatted_response
 
 
 def answer_question(question: str):
     question_lower = question.lower().strip()
     
     # 1. Load drug documents
-    docs = load_drug_documents()
+    snapshot = knowledge_base.snapshot()
+    docs = snapshot.docs
 
-    # 2. Check for medicines FIRST (with word boundaries)
-    # Sort by length descending to match "Vitamin C" before "C"
-    sorted_drugs = sorted(docs.keys(), key=len, reverse=True)
-    
-    for drug_name in sorted_drugs:
-        pattern = rf"\b{re.escape(drug_name)}\b"
-        if re.search(pattern, question_lower):
-            content = docs[drug_name]
-            # Format the content neatly
-            lines = content.strip().split('\n')
-            formatted_response = f"💊 **{drug_name.capitalize()} Information**\n"
-            
-            for line in lines:
-                if ":" in line:
-                    key, value = line.split(":", 1)
-                    formatted_response += f"🔹 **{key.strip()}**: {value.strip()}\n"
-                else:
-                    formatted_response += f"• {line.strip()}\n"
-            
-            return formatted_response
+    # 2. Check for medicines FIRST (single whole-word scan over all names)
+    # Prefer the longest mention so "Vitamin C" wins over "C"
+    mentions = snapshot.matcher.find_all(question_lower)
+    if mentions:
+        drug_name = max(mentions, key=len)
+        return format_drug_info(drug_name, docs[drug_name])
 
     # 3. Check for greetings only if no medicine found
     greetings = {
@@ -76,4 +98,26 @@ def answer_question(question: str):
         if re.search(pattern, question_lower):
              return response
 
+    # 4. Side-effect questions only match the side-effects field
+    if SIDE_EFFECT_QUESTION.search(question_lower):
+        results = snapshot.side_effects.search(question_lower, k=3)
+        if results:
+            formatted_response = "⚠️ **Medicines that list this as a side effect**\n"
+            for doc_id, _ in results:
+                name, side_effects = snapshot.records[doc_id][0], snapshot.records[doc_id][3]
+                formatted_response += f"💊 **{name.capitalize()}**: {side_effects}\n"
+            formatted_response += "\nTalk to your doctor before stopping or changing any medicine."
+            return formatted_response
+
+    # 5. Fall back to ranked full-text search over indications and notes
+    # (never side effects, so a symptom doesn't suggest the drugs that cause it)
+    results = snapshot.index.search(question_lower, k=3)
+    if results:
+        formatted_response = "🔎 **Medicines that may be relevant**\n"
+        for doc_id, _ in results:
+            name, used_for = snapshot.records[doc_id][:2]
+            formatted_response += f"💊 **{name.capitalize()}**: {used_for}\n"
+        formatted_response += "\nAsk me about any of these by name for more details."
+        return formatted_response
+
     return "🤔 I couldn't find information on that medicine in my database. \n\nCould you double-check the spelling or try asking about another drug?"
\ No newline at end of file
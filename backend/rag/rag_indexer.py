@@ -0,0 +1,143 @@
+import re
+
+import numpy as np
+
+# Per-field term weights; a hit in the name or indication counts for more.
+# Side effects are left out: a symptom query must not rank the drugs that
+# cause the symptom as ones that treat it.
+FIELD_WEIGHTS = {
+    "Name": 3.0,
+    "Used for": 2.0,
+    "How it works": 1.0,
+    "Common side effects": 0.0,
+    "Notes": 1.0,
+}
+
+# Weights for the separate index that answers "what causes X" questions
+SIDE_EFFECT_WEIGHTS = dict(dict.fromkeys(FIELD_WEIGHTS, 0.0), **{"Common side effects": 1.0})
+
+STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "can", "could", "do", "does",
+    "for", "from", "give", "good", "have", "how", "i", "in", "is", "it", "me", "medicine",
+    "medicines", "my", "of", "on", "or", "should", "something", "take", "that", "the",
+    "to", "use", "what", "when", "which", "with", "you",
+}
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+
+# Upper bound on postings touched per query so latency stays flat as the catalog grows
+MAX_POSTINGS_PER_QUERY = 200_000
+
+
+def _stem(token):
+    if len(token) > 4 and token.endswith("ies"):
+        return token[:-3] + "y"
+    if len(token) > 3 and token.endswith("s") and not token.endswith("ss"):
+        return token[:-1]
+    return token
+
+
+def tokenize(text):
+    return [_stem(t) for t in _TOKEN.findall(str(text).lower()) if t not in STOPWORDS]
+
+
+class SearchIndex:
+    """BM25 inverted index over the drug documents.
+
+    Postings are kept per term as parallel NumPy arrays (doc ids, weighted
+    term frequencies). Adding a document copies only the postings of the
+    terms it contains, so an index can be extended without re-tokenizing the
+    catalog and without mutating arrays that concurrent readers hold.
+    """
+
+    def __init__(self, fields, k1=1.2, b=0.75, weights=None):
+        self.fields = list(fields)
+        self.k1 = k1
+        self.b = b
+        # Fields weighted 0 are not indexed
+        self.weights = FIELD_WEIGHTS if weights is None else weights
+        self.doc_len = np.zeros(0, dtype=np.float32)
+        self.postings = {}
+
+    @classmethod
+    def build(cls, fields, records, weights=None):
+        index = cls(fields, weights=weights)
+        term_ids = {}
+        term_tfs = {}
+        doc_len = []
+        for doc_id, record in enumerate(records):
+            tf, length = index._term_frequencies(record)
+            for term, weight in tf.items():
+                term_ids.setdefault(term, []).append(doc_id)
+                term_tfs.setdefault(term, []).append(weight)
+            doc_len.append(length)
+        index.doc_len = np.asarray(doc_len, dtype=np.float32)
+        index.postings = {
+            term: (np.asarray(ids, dtype=np.int32), np.asarray(term_tfs[term], dtype=np.float32))
+            for term, ids in term_ids.items()
+        }
+        return index
+
+    def _term_frequencies(self, record):
+        tf = {}
+        length = 0.0
+        for field, value in zip(self.fields, record):
+            weight = self.weights.get(field, 1.0)
+            if not weight:
+                continue
+            for term in tokenize(value):
+                tf[term] = tf.get(term, 0.0) + weight
+                length += weight
+        return tf, length
+
+    def __len__(self):
+        return len(self.doc_len)
+
+    def with_document(self, record):
+        """Return a new index that also contains `record`; `self` is left untouched."""
+        new = SearchIndex(self.fields, self.k1, self.b, self.weights)
+        doc_id = len(self.doc_len)
+        tf, length = self._term_frequencies(record)
+        new.doc_len = np.append(self.doc_len, np.float32(length))
+        new.postings = dict(self.postings)
+        for term, weight in tf.items():
+            ids, tfs = self.postings.get(term, (np.zeros(0, np.int32), np.zeros(0, np.float32)))
+            new.postings[term] = (np.append(ids, np.int32(doc_id)), np.append(tfs, np.float32(weight)))
+        return new
+
+    def search(self, query, k=3):
+        """Return up to `k` (doc_id, score) pairs, best first.
+
+        Doc ids are positions in the records the index was built from.
+        """
+        n_docs = len(self.doc_len)
+        if not n_docs:
+            return []
+
+        terms = []
+        for term in dict.fromkeys(tokenize(query)):
+            posting = self.postings.get(term)
+            if posting is not None:
+                df = len(posting[0])
+                idf = np.log1p((n_docs - df + 0.5) / (df + 0.5))
+                terms.append((idf, posting))
+        if not terms:
+            return []
+
+        # Rarest (most informative) terms first, within the postings budget
+        terms.sort(key=lambda t: -t[0])
+        avgdl = float(self.doc_len.mean()) or 1.0
+        scores = np.zeros(n_docs, dtype=np.float32)
+        budget = MAX_POSTINGS_PER_QUERY
+        for idf, (ids, tfs) in terms:
+            if budget <= 0:
+                break
+            ids, tfs = ids[:budget], tfs[:budget]
+            budget -= len(ids)
+            norm = self.k1 * (1.0 - self.b + self.b * self.doc_len[ids] / avgdl)
+            scores[ids] += idf * tfs * (self.k1 + 1.0) / (tfs + norm)
+
+        k = min(k, n_docs)
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(int(i), float(scores[i])) for i in top if scores[i] > 0]
@@ -2,20 +2,27 @@
 
 from pathlib import Path
 
-DRUG_FOLDER = Path("backend/drug_database/drugs")
-QUESTION = input("Ask your question: ").lower()
+DRUG_FOLDER = Path(__file__).resolve().parent / "drug_database" / "drugs"
 
-answer_context = []
+def find_answer_context(question, drug_folder=DRUG_FOLDER):
+    # Drug files mentioning any word of the question
+    words = question.lower().split()
+    answer_context = []
+    for drug_file in sorted(Path(drug_folder).glob("*.txt")):
+        text = drug_file.read_text(encoding="utf-8")
+        if any(word in text.lower() for word in words):
+            answer_context.append(text)
+    return answer_context
 
-for drug_file in DRUG_FOLDER.glob("*.txt"):
-    text = drug_file.read_text(encoding="utf-8")
-    if any(word in text.lower() for word in QUESTION.split()):
-        answer_context.append(text)
+if __name__ == "__main__":
+    QUESTION = input("Ask your question: ").lower()
 
-print("\n--- ANSWER ---\n")
+    answer_context = find_answer_context(QUESTION)
 
-if answer_context:
-    for ans in answer_context:
-        print(ans)
-else:
-    print("❌ No relevant drug information found")
\ No newline at end of file
+    print("\n--- ANSWER ---\n")
+
+    if answer_context:
+        for ans in answer_context:
+            print(ans)
+    else:
+        print("❌ No relevant drug information found")
\ No newline at end of file
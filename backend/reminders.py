@@ -0,0 +1,353 @@
+import heapq
+import json
+import os
+import socket
+import threading
+import uuid
+from datetime import datetime, timedelta
+
+from sqlalchemy import false, func, select, update
+from sqlalchemy.exc import IntegrityError
+
+from models import (
+    db, dialect_insert, AdherenceDaily, DAY_BITS, Confirmation, INSERT_CHUNK, Schedule, SchedulerLease, User, chunked
+)
+
+# Schedules are entered in IST; servers (Render) run on UTC
+IST_OFFSET = timedelta(hours=5, minutes=30)
+DAY_NAMES = ["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"]
+
+# A reminder whose instant passed longer ago than this (e.g. the process was
+# paused) is skipped rather than delivered late
+MISSED_GRACE = timedelta(minutes=5)
+
+# Schedule changes are re-read this far behind the newest `updated_at` seen, so
+# a write that committed late (or a writer whose clock lags) is not missed
+CHANGE_OVERLAP = timedelta(seconds=30)
+
+
+def to_local(utc_dt):
+    return utc_dt + IST_OFFSET
+
+
+def parse_days(days):
+    """Weekday names from a JSON string, a list, or a DAY_BITS mask."""
+    if isinstance(days, int):
+        return frozenset(day for day, bit in DAY_BITS.items() if days & bit)
+    if isinstance(days, str):
+        days = json.loads(days) if days else []
+    return frozenset(days or [])
+
+
+def next_fire_utc(time_str, days, after_utc):
+    """First UTC instant strictly after `after_utc` when HH:MM IST falls on one of `days`."""
+    days = parse_days(days)
+    if not days:
+        return None
+    try:
+        hour, minute = (int(part) for part in time_str.split(":"))
+    except (AttributeError, ValueError):
+        return None
+
+    local = to_local(after_utc)
+    base = local.replace(hour=hour, minute=minute, second=0, microsecond=0)
+    for offset in range(8):
+        candidate = base + timedelta(days=offset)
+        if candidate > local and DAY_NAMES[candidate.weekday()] in days:
+            return candidate - IST_OFFSET
+    return None
+
+
+def create_confirmations(rows):
+    """Insert Confirmation rows for a due batch, skipping ones that already exist.
+
+    Returns the newly created rows as (id, user_id, medicine_name,
+    scheduled_time) tuples. Duplicates (another worker got there first) are
+    dropped by the database via ON CONFLICT DO NOTHING on the
+    (schedule_id, scheduled_time, date_str) unique constraint, so the cost is
+    one statement per chunk instead of a lookup, an insert and a commit per dose.
+    """
+    if not rows:
+        return []
+    now = datetime.utcnow()
+    rows = [dict(row, status="sent", sent_at=now) for row in rows]
+    insert = dialect_insert()
+    created = []
+
+    if insert is None:
+        # Generic fallback: savepoint per row
+        for row in rows:
+            try:
+                with db.session.begin_nested():
+                    conf = Confirmation(**row)
+                    db.session.add(conf)
+                created.append((conf.id, conf.user_id, conf.medicine_name, conf.scheduled_time, conf.date_str))
+            except IntegrityError:
+                pass
+    else:
+        for start in range(0, len(rows), INSERT_CHUNK):
+            stmt = (
+                insert(Confirmation)
+                .values(rows[start:start + INSERT_CHUNK])
+                .on_conflict_do_nothing(index_elements=["schedule_id", "scheduled_time", "date_str"])
+                .returning(Confirmation.id, Confirmation.user_id, Confirmation.medicine_name,
+                           Confirmation.scheduled_time, Confirmation.date_str)
+            )
+            created.extend(tuple(r) for r in db.session.execute(stmt))
+
+    # Same transaction as the inserts, so the rollups never drift
+    deltas = {}
+    for _, user_id, medicine_name, _, date_str in created:
+        delta = deltas.setdefault((user_id, medicine_name, date_str), {"scheduled": 0, "sent": 0})
+        delta["scheduled"] += 1
+        delta["sent"] += 1
+    AdherenceDaily.add(deltas)
+    db.session.commit()
+    return [row[:4] for row in created]
+
+
+def claim_due_snoozes(now, shard_criterion):
+    """Flip snoozed confirmations whose `due_at` has passed back to "sent".
+
+    The status change is the claim: a row is returned only to the worker whose
+    UPDATE moved it out of "snoozed", so concurrent workers never both send
+    it. The (status, due_at) index keeps the cost proportional to the number
+    of due rows. Returns (id, user_id, medicine_name, scheduled_time) tuples.
+    """
+    criteria = (
+        Confirmation.status == "snoozed",
+        Confirmation.due_at <= now,
+        shard_criterion,
+    )
+    columns = (Confirmation.id, Confirmation.user_id, Confirmation.medicine_name,
+               Confirmation.scheduled_time, Confirmation.date_str)
+
+    if dialect_insert() is not None:
+        stmt = (
+            update(Confirmation)
+            .where(*criteria)
+            .values(status="sent", due_at=None)
+            .returning(*columns)
+            .execution_options(synchronize_session=False)
+        )
+        claimed = [tuple(r) for r in db.session.execute(stmt)]
+    else:
+        claimed = []
+        for row in db.session.execute(select(*columns).where(*criteria)).all():
+            result = db.session.execute(
+                update(Confirmation)
+                .where(Confirmation.id == row[0], Confirmation.status == "snoozed")
+                .values(status="sent", due_at=None)
+                .execution_options(synchronize_session=False)
+            )
+            if result.rowcount == 1:
+                claimed.append(tuple(row))
+
+    deltas = {}
+    for _, user_id, medicine_name, _, date_str in claimed:
+        delta = deltas.setdefault((user_id, medicine_name, date_str), {"snoozed": 0, "sent": 0})
+        delta["snoozed"] -= 1
+        delta["sent"] += 1
+    AdherenceDaily.add(deltas)
+    db.session.commit()
+    return [row[:4] for row in claimed]
+
+
+def next_snooze_due(shard_criterion):
+    """Earliest pending snooze instant (an index lookup on (status, due_at))."""
+    return db.session.execute(
+        select(db.func.min(Confirmation.due_at))
+        .where(Confirmation.status == "snoozed", shard_criterion)
+    ).scalar()
+
+
+def load_subscribed_users(user_ids):
+    """One query for every user in a batch that has a push subscription."""
+    users = {}
+    for chunk in chunked(list(set(user_ids))):
+        for user in User.query.filter(User.id.in_(chunk), User.push_subscription.isnot(None)):
+            users[user.id] = user
+    return users
+
+
+class ScheduleChanges:
+    """Finds schedules written since the last poll, by any process.
+
+    A schedule created or edited through a process that does not own the
+    user's shard never reaches the owner's queue directly. The owner polls
+    here every tick: one range scan on the `updated_at` index from the
+    newest change it has seen (less CHANGE_OVERLAP), so the cost follows the
+    write rate, not the number of schedules. Rows seen again inside the
+    overlap are harmless to re-queue.
+    """
+
+    def __init__(self, overlap=CHANGE_OVERLAP):
+        self.overlap = overlap
+        self.watermark = None
+
+    def reset(self):
+        """Start from the newest change; call before a full reload."""
+        self.watermark = db.session.execute(select(func.max(Schedule.updated_at))).scalar()
+
+    def poll(self, shard_criterion):
+        """Schedule rows of our shard written since the previous poll (active or not)."""
+        query = Schedule.query.filter(shard_criterion)
+        if self.watermark is not None:
+            query = query.filter(Schedule.updated_at > self.watermark - self.overlap)
+        rows = query.all()
+        newest = max((sch.updated_at for sch in rows if sch.updated_at is not None), default=None)
+        if newest is not None and (self.watermark is None or newest > self.watermark):
+            self.watermark = newest
+        return rows
+
+
+class ShardLease:
+    """Database lease that splits reminder work across live worker instances.
+
+    Every instance upserts its own SchedulerLease row on each heartbeat and
+    deletes rows whose heartbeat is older than `ttl`. The live instances,
+    ordered by id, define the shard layout: instance `index` of `count` owns
+    the users with `user_id % count == index`. When an instance stops
+    heartbeating its row expires and the survivors take over its users.
+    """
+
+    def __init__(self, instance_id=None, ttl=30):
+        self.instance_id = instance_id or f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+        self.ttl = timedelta(seconds=ttl)
+        self.heartbeat_interval = ttl / 3
+        self.index = 0
+        self.count = 0
+
+    def heartbeat(self, now=None):
+        """Renew our lease and return True if the shard layout changed."""
+        now = now or datetime.utcnow()
+        lease = db.session.get(SchedulerLease, self.instance_id)
+        if lease is None:
+            lease = SchedulerLease(instance_id=self.instance_id, heartbeat_at=now)
+            db.session.add(lease)
+        lease.heartbeat_at = now
+        SchedulerLease.query.filter(SchedulerLease.heartbeat_at < now - self.ttl).delete()
+        db.session.commit()
+
+        live = [row.instance_id for row in
+                SchedulerLease.query.order_by(SchedulerLease.instance_id).all()]
+        layout = (live.index(self.instance_id), len(live))
+        changed = layout != (self.index, self.count)
+        self.index, self.count = layout
+        return changed
+
+    def release(self):
+        SchedulerLease.query.filter_by(instance_id=self.instance_id).delete()
+        db.session.commit()
+        self.count = 0
+
+    def owns(self, user_id):
+        return self.count > 0 and user_id % self.count == self.index
+
+    def shard_filter(self, column):
+        """SQL criterion selecting the rows of `column` (a user_id) that we own."""
+        if self.count == 0:
+            return false()
+        return column % self.count == self.index
+
+
+class ReminderScheduler:
+    """In-memory priority queue of each active schedule's next fire instant.
+
+    Entries are (fire_at_utc, schedule_id). Updating or removing a schedule
+    just replaces its record in `_entries`; stale heap entries are discarded
+    when they reach the top. The worker sleeps on a condition variable until
+    the earliest fire instant, and is woken early whenever an edit moves a
+    schedule ahead of it.
+    """
+
+    def __init__(self, owns=None):
+        # Predicate on user_id; schedules of users we don't own are never queued
+        self.owns = owns or (lambda user_id: True)
+        self._heap = []
+        self._entries = {}
+        self._cond = threading.Condition()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def load(self, schedules, now=None):
+        """Replace the queue with the given Schedule rows."""
+        now = now or datetime.utcnow()
+        heap = []
+        entries = {}
+        for sch in schedules:
+            fire_at = None
+            if sch.is_active and self.owns(sch.user_id):
+                fire_at = next_fire_utc(sch.time, sch.days_mask, now)
+            if fire_at is not None:
+                entries[sch.id] = fire_at
+                heap.append((fire_at, sch.id))
+        heapq.heapify(heap)
+        with self._cond:
+            self._heap = heap
+            self._entries = entries
+            self._cond.notify_all()
+
+    def upsert(self, sch, now=None):
+        """Add, move or (if inactive) drop a schedule after it was written."""
+        fire_at = None
+        if sch.is_active is not False and self.owns(sch.user_id):
+            fire_at = next_fire_utc(sch.time, sch.days_mask, now or datetime.utcnow())
+        with self._cond:
+            if fire_at is None:
+                self._entries.pop(sch.id, None)
+                return
+            self._entries[sch.id] = fire_at
+            heapq.heappush(self._heap, (fire_at, sch.id))
+            if self._heap[0] == (fire_at, sch.id):
+                self._cond.notify_all()
+
+    def remove(self, schedule_id):
+        with self._cond:
+            self._entries.pop(schedule_id, None)
+
+    def next_fire(self):
+        with self._cond:
+            self._discard_stale()
+            return self._heap[0][0] if self._heap else None
+
+    def _discard_stale(self):
+        while self._heap and self._entries.get(self._heap[0][1]) != self._heap[0][0]:
+            heapq.heappop(self._heap)
+
+    def notify(self):
+        """Wake the worker early, e.g. after a snooze was recorded."""
+        with self._cond:
+            self._cond.notify_all()
+
+    def wait(self, max_wait, wake_at=None):
+        """Sleep until the next entry (or `wake_at`) is due, the queue changes, or `max_wait` seconds pass."""
+        with self._cond:
+            self._discard_stale()
+            now = datetime.utcnow()
+            timeout = max_wait
+            for instant in (self._heap[0][0] if self._heap else None, wake_at):
+                if instant is not None:
+                    timeout = min(timeout, (instant - now).total_seconds())
+            if timeout > 0:
+                self._cond.wait(timeout)
+
+    def pop_due(self, now=None):
+        """Remove and return [(schedule_id, fire_at_utc)] for entries due at or before `now`.
+
+        Popped schedules leave the queue; the caller re-queues each one with
+        `upsert` once it has re-read the row, so edits made by other processes
+        are honoured. Entries that are late by more than MISSED_GRACE are
+        returned with `fire_at` set to None so they are re-queued but not sent.
+        """
+        now = now or datetime.utcnow()
+        due = []
+        with self._cond:
+            while self._heap and self._heap[0][0] <= now:
+                fire_at, schedule_id = heapq.heappop(self._heap)
+                if self._entries.get(schedule_id) != fire_at:
+                    continue
+                del self._entries[schedule_id]
+                due.append((schedule_id, fire_at if now - fire_at <= MISSED_GRACE else None))
+        return due
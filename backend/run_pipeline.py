@@ -1,12 +1,40 @@
 import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from drug_lookup import OUTPUT_DIR, OUTPUT_FILE, format_result
+from ocr.ocr_engine import DATA_DIR
+from pipeline import run
 
 print("🚀 Starting Medical Assistant Pipeline...\n")
 
-os.system("python backend/ocr/ocr_engine.py")
-os.system("python backend/ocr/cleaner.py")
-os.system("python backend/ocr/keyword_check.py")
-os.system("python backend/drug_lookup.py")
-os.system("python backend/rag_answer.py")
+# Optional question for the drug notes, e.g. python backend/run_pipeline.py "side effects"
+question = " ".join(sys.argv[1:]) or None
+record = next(run([os.path.join(DATA_DIR, "input_image.jpg")], question=question))
+
+if "error" in record:
+    print(f"❌ OCR failed: {record['error']}")
+    sys.exit(1)
+
+print("\n--- CLEANED TEXT ---\n")
+print(record["cleaned_text"])
+
+print("\n--- DETECTED MEDICINES ---\n")
+if record["medicines"]:
+    for med in record["medicines"]:
+        print("✅", med)
+else:
+    print("❌ No medicine found")
+
+os.makedirs(OUTPUT_DIR, exist_ok=True)
+with open(OUTPUT_FILE, "w", encoding="utf-8") as out:
+    out.write("\n".join(format_result(med, info) for med, info in record["drug_info"].items()))
+
+if question:
+    print("\n--- ANSWER ---\n")
+    print("\n".join(record["answer_context"]) or "❌ No relevant drug information found")
 
+print("\n⏱  " + ", ".join(f"{stage} {ms:.0f} ms" for stage, ms in record["timings_ms"].items()))
 print("\n✅ Pipeline completed successfully")
 print("📄 Check backend/output/final_result.txt")
\ No newline at end of file
@@ -1,8 +1,11 @@
+import atexit
 import uuid
 import json
 import os
+import threading
 
 DB_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "schedule_db.json")
+ALL_DAYS = ["Sun", "Mon", "Tue", "Wed", "Thu", "Fri", "Sat"]
 
 def load_data():
     if os.path.exists(DB_FILE):
@@ -13,40 +16,120 @@ def load_data():
             return []
     return []
 
-def save_data(data):
-    with open(DB_FILE, "w") as f:
+def save_data(data, path=DB_FILE):
+    # Write-then-rename: a crash mid-write leaves the previous file intact
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as f:
         json.dump(data, f, indent=4)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
 
-medicine_schedule = load_data()
+class ScheduleStore:
+    """Schedule items indexed by id and by "HH:MM" time.
 
-def add_schedule(name, time, days=None):
-    global medicine_schedule
-    item = {
-        "id": str(uuid.uuid4()),
-        "name": name,
-        "time": time,
-        "days": days if days else ["Sun", "Mon", "Tue", "Wed", "Thu", "Fri", "Sat"]
-    }
-    medicine_schedule.append(item)
-    save_data(medicine_schedule)
-    return item
+    With flush_delay=0 every change is written straight away. Otherwise the
+    first change starts a timer and everything changed within `flush_delay`
+    seconds goes out in one write; `flush()` forces it (also run at exit).
+    """
 
-def get_schedules():
-    return medicine_schedule
+    def __init__(self, path, items=(), flush_delay=0):
+        self.path = path
+        self.flush_delay = flush_delay
+        self._items = {}
+        self._by_time = {}
+        self._lock = threading.RLock()
+        self._write_lock = threading.Lock()
+        self._timer = None
+        self._dirty = False
+        for item in items:
+            self._index(item)
 
-def update_schedule(item_id, name, time, days=None):
-    global medicine_schedule
-    for item in medicine_schedule:
-        if item["id"] == str(item_id):
+    def _index(self, item):
+        self._items[item["id"]] = item
+        self._by_time.setdefault(item["time"], {})[item["id"]] = item
+
+    def _unindex(self, item):
+        at_time = self._by_time.get(item["time"], {})
+        at_time.pop(item["id"], None)
+        if not at_time:
+            self._by_time.pop(item["time"], None)
+
+    def all(self):
+        with self._lock:
+            return list(self._items.values())
+
+    def get(self, item_id):
+        return self._items.get(str(item_id))
+
+    def due_at(self, time, day=None):
+        # Items scheduled at "HH:MM", optionally only those on weekday `day`
+        with self._lock:
+            items = list(self._by_time.get(time, {}).values())
+        return [item for item in items if day is None or day in item["days"]]
+
+    def add(self, name, time, days=None):
+        item = {"id": str(uuid.uuid4()), "name": name, "time": time, "days": days if days else list(ALL_DAYS)}
+        with self._lock:
+            self._index(item)
+            self._changed()
+        return item
+
+    def update(self, item_id, name, time, days=None):
+        with self._lock:
+            item = self._items.get(str(item_id))
+            if item is None:
+                return None
+            self._unindex(item)
             item["name"] = name
             item["time"] = time
             if days:
                 item["days"] = days
-            save_data(medicine_schedule)
+            self._index(item)
+            self._changed()
             return item
-    return None
+
+    def delete(self, item_id):
+        with self._lock:
+            item = self._items.pop(str(item_id), None)
+            if item is None:
+                return False
+            self._unindex(item)
+            self._changed()
+            return True
+
+    def _changed(self):
+        self._dirty = True
+        if not self.flush_delay:
+            self.flush()
+        elif self._timer is None:
+            self._timer = threading.Timer(self.flush_delay, self.flush)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def flush(self):
+        with self._write_lock:
+            with self._lock:
+                if self._timer is not None:
+                    self._timer.cancel()
+                    self._timer = None
+                if not self._dirty:
+                    return
+                data = json.loads(json.dumps(list(self._items.values())))
+                self._dirty = False
+            save_data(data, self.path)
+
+store = ScheduleStore(DB_FILE, load_data(), flush_delay=float(os.getenv("SCHEDULE_FLUSH_DELAY", 0)))
+atexit.register(store.flush)
+
+def add_schedule(name, time, days=None):
+    return store.add(name, time, days)
+
+def get_schedules():
+    return store.all()
+
+def update_schedule(item_id, name, time, days=None):
+    return store.update(item_id, name, time, days)
 
 def delete_schedule(item_id):
-    global medicine_schedule
-    medicine_schedule = [item for item in medicine_schedule if item["id"] != str(item_id)]
-    save_data(medicine_schedule)
+    store.delete(item_id)
\ No newline at end of file
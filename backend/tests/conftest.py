@@ -0,0 +1,68 @@
+"""Shared fixtures: the Flask app on a throwaway SQLite database.
+
+`main` reads its configuration at import, so the environment is pointed at
+a temporary directory before it is imported, once per test session.
+"""
+import os
+import sys
+import tempfile
+
+import pytest
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+WORKDIR = tempfile.mkdtemp(prefix="medassist-tests-")
+os.environ.update(
+    DATABASE_URL=f"sqlite:///{os.path.join(WORKDIR, 'test.db')}",
+    UPLOAD_DIR=os.path.join(WORKDIR, "uploads"),
+    REMINDER_WORKER="0",
+    JWT_SECRET_KEY="test-secret-key-of-at-least-32-bytes",
+)
+
+
+@pytest.fixture(scope="session")
+def main_module():
+    # Keep the compiled catalog away from the real cache file
+    from rag.rag_engine import knowledge_base
+    knowledge_base.cache_path = os.path.join(WORKDIR, "catalog.compiled")
+    import main
+    return main
+
+
+@pytest.fixture(scope="session")
+def app(main_module):
+    return main_module.app
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def app_context(app):
+    with app.app_context():
+        yield
+        from models import db
+        db.session.remove()
+
+
+@pytest.fixture
+def make_patient(client):
+    """Register a patient; returns (user_id, Authorization headers)."""
+    def make(username, password="secret"):
+        client.post("/register", json={"username": username, "password": password})
+        token = client.post("/login", json={"username": username, "password": password}).get_json()["access_token"]
+        with client.application.app_context():
+            from models import User
+            user_id = User.query.filter_by(username=username).one().id
+        return user_id, {"Authorization": f"Bearer {token}"}
+    return make
+
+
+@pytest.fixture
+def admin_headers(app):
+    from flask_jwt_extended import create_access_token
+    with app.app_context():
+        return {"Authorization": f"Bearer {create_access_token(identity='admin')}"}
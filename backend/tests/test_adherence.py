@@ -0,0 +1,27 @@
+from sqlalchemy import event
+
+from models import INSERT_CHUNK, AdherenceDaily, db
+
+
+def test_rollup_upsert_is_chunked(app_context):
+    statements = []
+
+    def count(conn, cursor, statement, *args):
+        if statement.startswith("INSERT INTO adherence_daily"):
+            statements.append(statement)
+
+    # A reminder batch can carry more keys than SQLite takes bound parameters in one statement
+    deltas = {(user_id, "Metformin", "2026-01-01"): {"scheduled": 1, "sent": 1}
+              for user_id in range(2 * INSERT_CHUNK + 1)}
+    event.listen(db.engine, "before_cursor_execute", count)
+    try:
+        AdherenceDaily.add(deltas)
+        AdherenceDaily.add({(7, "Metformin", "2026-01-01"): {"sent": -1, "taken": 1}})
+        assert len(statements) == 4
+        assert db.session.query(db.func.sum(AdherenceDaily.scheduled)).filter_by(
+            date_str="2026-01-01").scalar() == len(deltas)
+        row = db.session.get(AdherenceDaily, (7, "Metformin", "2026-01-01"))
+        assert (row.scheduled, row.sent, row.taken) == (1, 0, 1)
+    finally:
+        event.remove(db.engine, "before_cursor_execute", count)
+        db.session.rollback()
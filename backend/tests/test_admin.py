@@ -0,0 +1,19 @@
+import io
+
+
+def test_adherence_requires_admin(client, make_patient, admin_headers):
+    _, headers = make_patient("adherence-patient")
+    assert client.get("/admin/adherence", headers=headers).status_code == 403
+    assert client.get("/admin/adherence").status_code == 401
+    assert client.get("/admin/adherence", headers=admin_headers).status_code == 200
+
+
+def test_catalog_routes_require_admin(client, make_patient, admin_headers):
+    _, headers = make_patient("catalog-patient")
+    assert client.get("/admin/medicines", headers=headers).status_code == 403
+    assert client.get("/admin/medicines/export?format=csv", headers=headers).status_code == 403
+    assert client.post("/admin/add-medicine", headers=headers, json={"name": "Patientol"}).status_code == 403
+    response = client.post("/admin/medicines/import", headers=headers,
+                           data={"file": (io.BytesIO(b"Name\nPatientol\n"), "medicines.csv")})
+    assert response.status_code == 403
+    assert client.get("/admin/medicines", headers=admin_headers).status_code == 200
@@ -0,0 +1,41 @@
+from datetime import datetime
+
+import pytest
+
+from models import Confirmation, Schedule, db
+
+
+@pytest.fixture
+def dose(app, client, make_patient):
+    user_id, headers = make_patient("confirm-patient")
+    with app.app_context():
+        sch_id = client.post("/schedule", headers=headers, json={
+            "name": "Metformin", "time": "08:00", "days": ["Mon"]}).get_json()["id"]
+        conf = Confirmation(user_id=user_id, schedule_id=sch_id, medicine_name="Metformin",
+                            scheduled_time="08:00", date_str=datetime.utcnow().strftime("%Y-%m-%d"))
+        db.session.add(conf)
+        db.session.commit()
+        conf_id = conf.id
+        db.session.remove()
+    return conf_id, headers
+
+
+@pytest.mark.parametrize("minutes", ["x", "15", -5, 0, 24 * 60 + 1, 10 ** 9, 2.5, True, None])
+def test_snooze_minutes_are_validated(client, dose, minutes):
+    conf_id, headers = dose
+    response = client.post("/confirm", headers=headers, json={
+        "confirmation_ids": [conf_id], "status": "snoozed", "minutes": minutes})
+    assert response.status_code == 400
+    with client.application.app_context():
+        assert db.session.get(Confirmation, conf_id).status == "sent"
+
+
+def test_snooze_and_take(client, dose):
+    conf_id, headers = dose
+    response = client.post("/confirm", headers=headers, json={
+        "confirmation_ids": [conf_id], "status": "snoozed", "minutes": 15})
+    assert response.status_code == 200
+    # "taken" ignores minutes, as the service worker sends 0
+    response = client.post("/confirm", headers=headers, json={
+        "confirmation_id": conf_id, "status": "taken", "minutes": 0})
+    assert response.status_code == 200
@@ -0,0 +1,57 @@
+import os
+
+from rag.fuzzy import FuzzyIndex
+from rag.knowledge_base import Snapshot
+from rag.matcher import DrugMatcher, LayeredMatcher
+
+
+def record(name):
+    return (name, f"Treats {name} things", "", "", "")
+
+
+def test_layered_matcher_matches_like_a_full_one():
+    text = "take aspirin plus with ibuprofen, not aspirin alone"
+    layered = DrugMatcher(["aspirin", "paracetamol"]).extended(["aspirin plus"]).extended(["ibuprofen"])
+    full = DrugMatcher(["aspirin", "paracetamol", "aspirin plus", "ibuprofen"])
+    assert isinstance(layered, LayeredMatcher) and len(layered) == 4
+    assert list(layered.finditer(text)) == list(full.finditer(text))
+    assert layered.find_all(text) == ["aspirin plus", "ibuprofen", "aspirin"]
+
+
+def test_fuzzy_add_in_place():
+    index = FuzzyIndex(["metformin"])
+    index.add("atorvastatin")
+    assert len(index) == 2
+    assert index.lookup("at0rvastatin")[0] == "atorvastatin"
+
+
+def test_extended_snapshot_then_compacted():
+    base = Snapshot("v1", [record("Metformin")])
+    extended = base.extended("v2", record("Atorvastatin"))
+    assert extended.matcher.find_all("metformin and atorvastatin") == ["metformin", "atorvastatin"]
+    assert extended.fuzzy.lookup("atorvastatln")[0] == "atorvastatin"
+    assert base.docs.keys() == {"metformin"}
+
+    compacted = extended.compacted()
+    assert type(compacted.matcher) is DrugMatcher and compacted.fuzzy is not extended.fuzzy
+    assert compacted.matcher.find_all("metformin and atorvastatin") == ["metformin", "atorvastatin"]
+
+
+def test_add_medicine_defers_cache_write(client, admin_headers, monkeypatch):
+    from rag.rag_engine import knowledge_base
+    monkeypatch.setattr(knowledge_base, "compact_delay", 3600)
+    knowledge_base.reload()
+    before = os.path.getmtime(knowledge_base.cache_path) if os.path.exists(knowledge_base.cache_path) else None
+
+    response = client.post("/admin/add-medicine", headers=admin_headers, json={"name": "Zolmitriptan"})
+    assert response.status_code == 201
+    snapshot = knowledge_base.snapshot()
+    assert isinstance(snapshot.matcher, LayeredMatcher)
+    assert snapshot.matcher.find_all("zolmitriptan 5mg") == ["zolmitriptan"]
+    after = os.path.getmtime(knowledge_base.cache_path) if os.path.exists(knowledge_base.cache_path) else None
+    assert after == before
+
+    compacted = knowledge_base.compact()
+    assert knowledge_base.snapshot() is compacted
+    assert type(compacted.matcher) is DrugMatcher
+    assert knowledge_base._load_cached(compacted.version).matcher.find_all("zolmitriptan") == ["zolmitriptan"]
@@ -0,0 +1,53 @@
+import os
+import shutil
+import sqlite3
+from datetime import datetime
+
+from flask import Flask
+from sqlalchemy import inspect
+
+from models import DAY_BITS, AdherenceDaily, Confirmation, Schedule, db
+from migrations import run_migrations
+from reminders import to_local
+
+BASELINE_DB = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                           "ocr", "instance", "med_assistant.db")
+
+
+def test_upgrade_baseline_db_and_run_a_tick(tmp_path, main_module):
+    path = tmp_path / "baseline.db"
+    shutil.copy(BASELINE_DB, path)
+    # Without the unique constraint, the old code could record a dose twice
+    with sqlite3.connect(path) as conn:
+        conn.execute(
+            "INSERT INTO confirmation (user_id, schedule_id, medicine_name, scheduled_time, date_str, status) "
+            "SELECT user_id, schedule_id, medicine_name, scheduled_time, date_str, status "
+            "FROM confirmation ORDER BY id LIMIT 1")
+
+    app = Flask(__name__)
+    app.config["SQLALCHEMY_DATABASE_URI"] = f"sqlite:///{path}"
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+        run_migrations()
+        uniques = [i["column_names"] for i in inspect(db.engine).get_indexes("confirmation") if i["unique"]]
+        assert ["schedule_id", "scheduled_time", "date_str"] in uniques
+        rows = db.session.query(Confirmation.schedule_id, Confirmation.scheduled_time, Confirmation.date_str).all()
+        assert len(rows) == len(set(rows))
+        scheduled = db.session.query(db.func.sum(AdherenceDaily.scheduled)).scalar()
+        assert scheduled == len(rows)
+
+        sch = Schedule.query.first()
+        fire_at = datetime.utcnow().replace(second=0, microsecond=0)
+        sch.time = to_local(fire_at).strftime("%H:%M")
+        sch.is_active = True
+        sch.set_days(list(DAY_BITS))
+        db.session.commit()
+
+        # One reminder tick for the dose, then a second worker racing on the same one
+        for _ in range(2):
+            main_module.send_due_reminders([(sch.id, fire_at)], datetime.utcnow())
+        assert Confirmation.query.filter_by(
+            schedule_id=sch.id, date_str=to_local(fire_at).strftime("%Y-%m-%d"),
+            scheduled_time=sch.time).count() == 1
+        db.session.remove()
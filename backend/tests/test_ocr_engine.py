@@ -0,0 +1,18 @@
+from PIL import Image
+
+from ocr import ocr_engine
+from ocr.preprocess import DEFAULTS
+
+
+def test_timings_keep_load_with_preprocessing(tmp_path, monkeypatch):
+    path = tmp_path / "label.png"
+    Image.new("RGB", (400, 200), "white").save(path)
+    # Tesseract itself is not under test (and may not be installed)
+    monkeypatch.setattr(ocr_engine.pytesseract, "image_to_string", lambda img, timeout=0: "Metformin 500mg")
+
+    text, timings = ocr_engine.extract_text_with_timings(str(path), preprocess_config=dict(DEFAULTS))
+    assert text == "Metformin 500mg"
+    assert {"load", "tesseract", "grayscale"} <= timings.keys()
+
+    _, timings = ocr_engine.extract_text_with_timings(str(path), preprocess_config=None)
+    assert timings.keys() == {"load", "tesseract"}
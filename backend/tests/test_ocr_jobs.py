@@ -0,0 +1,51 @@
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures.process import BrokenProcessPool
+
+import pytest
+
+from ocr.jobs import OcrJobQueue
+
+
+def wait_for(queue, job_id, timeout=60):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        job = queue.get(job_id)
+        if job and job["status"] in ("done", "failed"):
+            return job
+        time.sleep(0.05)
+    raise AssertionError(f"job {job_id} did not finish")
+
+
+def test_broken_pool_is_replaced(tmp_path):
+    queue = OcrJobQueue(str(tmp_path / "jobs"), max_workers=1)
+    broken = queue._pool()
+    # A worker that dies abruptly takes the whole pool down
+    with pytest.raises(BrokenProcessPool):
+        broken.submit(os._exit, 1).result(timeout=60)
+
+    job = wait_for(queue, queue.submit(str(tmp_path / "missing.png"))["id"])
+    assert queue._executor is not broken
+    # The job ran on the new pool; it fails only because the image does not exist
+    assert job["status"] == "failed"
+    assert "process pool" not in job["error"].lower()
+    assert queue.stats()["queue_depth"] == 0
+
+
+def _import_main(results):
+    os.environ["REMINDER_WORKER"] = "1"
+    import main
+    results.put((main.POOL_WORKER, [t.name for t in threading.enumerate()]))
+
+
+def test_pool_worker_does_not_start_reminders():
+    ctx = multiprocessing.get_context("spawn")
+    results = ctx.Queue()
+    child = ctx.Process(target=_import_main, args=(results,))
+    child.start()
+    pool_worker, threads = results.get(timeout=120)
+    child.join(timeout=60)
+    assert pool_worker
+    assert "reminder-worker" not in threads
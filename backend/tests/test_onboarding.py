@@ -0,0 +1,57 @@
+import io
+import json
+
+import pytest
+
+import onboarding
+
+
+def jsonl(*records):
+    return io.BytesIO("\n".join(json.dumps(r) for r in records).encode())
+
+
+EVERY_DAY = ["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"]
+
+
+@pytest.mark.parametrize("days, expected", [
+    (None, EVERY_DAY), ("", EVERY_DAY), ("daily", EVERY_DAY),
+    ("wed, Mon", ["Mon", "Wed"]), (["Sunday", "fri"], ["Fri", "Sun"]),
+])
+def test_parse_days(days, expected):
+    assert onboarding.parse_days(days) == expected
+
+
+@pytest.mark.parametrize("days", [5, {"Mon": True}, ["Mon", "Someday"]])
+def test_parse_days_rejects(days):
+    with pytest.raises(ValueError):
+        onboarding.parse_days(days)
+
+
+def test_malformed_rows_become_errors(app_context):
+    from models import db
+    records = onboarding.iter_records(jsonl(
+        {"username": "ob-strings", "password": "pw", "schedules": ["Metformin"]},
+        {"username": "ob-int-days", "password": "pw",
+         "schedules": [{"name": "Metformin", "time": "08:00", "days": 5}]},
+        {"username": "ob-good", "password": "pw",
+         "schedules": [{"name": "Metformin", "time": "8:00", "days": "Mon;Thu"}]},
+    ), "patients.jsonl")
+    try:
+        report = onboarding.import_patients(db.session, records)
+    finally:
+        db.session.rollback()
+    assert report["users_created"] == 1 and report["schedules_created"] == 1
+    assert [(e["row"], e["username"]) for e in report["errors"]] == [(1, "ob-strings"), (2, "ob-int-days")]
+
+
+def test_import_requires_admin(client, make_patient, admin_headers):
+    _, headers = make_patient("import-patient")
+
+    def upload(headers):
+        data = {"file": (jsonl({"username": "ob-api", "password": "pw"}), "patients.jsonl")}
+        return client.post("/admin/patients/import", headers=headers, data=data)
+
+    assert upload(headers).status_code == 403
+    response = upload(admin_headers)
+    assert response.status_code == 200
+    assert response.get_json()["users_created"] == 1
@@ -0,0 +1,34 @@
+from rag.rag_engine import answer_question, knowledge_base
+
+# Seed catalog: Omeprazole, Pantoprazole and Montelukast list headache as a side effect
+CAUSE_HEADACHE = ("Omeprazole", "Pantoprazole", "Montelukast")
+
+
+def test_symptom_query_does_not_suggest_drugs_that_cause_it(app_context):
+    knowledge_base.reload()
+    answer = answer_question("what helps with headache and pain")
+    assert "Medicines that may be relevant" in answer
+    assert not any(name in answer for name in CAUSE_HEADACHE)
+    assert "Ibuprofen" in answer and "Paracetamol" in answer
+
+
+def test_side_effect_question_is_labelled_as_such(app_context):
+    knowledge_base.reload()
+    answer = answer_question("which medicines cause headache as a side effect?")
+    assert "side effect" in answer.splitlines()[0]
+    assert all(name in answer for name in CAUSE_HEADACHE)
+
+
+def test_exact_multi_word_match_is_not_fuzzy_matched_again(monkeypatch):
+    from rag.knowledge_base import Snapshot
+    from rag.rag_engine import extract_medicines
+    snapshot = Snapshot("test", [(name, "", "", "", "") for name in ("Vitamin", "Vitamin C", "Metformin")])
+    monkeypatch.setattr(knowledge_base, "snapshot", lambda: snapshot)
+
+    assert extract_medicines("Vitamin C 500mg daily") == [{"name": "Vitamin c", "confidence": 1.0}]
+    # Outside the exact span the word is still matched, misread or not (0 reads as o)
+    assert extract_medicines("Vitamin C, then vitamln and metf0rmin") == [
+        {"name": "Vitamin c", "confidence": 1.0},
+        {"name": "Vitamin", "confidence": 0.857},
+        {"name": "Metformin", "confidence": 1.0},
+    ]
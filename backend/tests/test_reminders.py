@@ -0,0 +1,76 @@
+from datetime import datetime, timedelta
+from itertools import count
+
+from models import DAY_BITS, Schedule, SchedulerLease, db
+from reminders import ReminderScheduler, ScheduleChanges, ShardLease, to_local
+
+_names = count()
+
+
+def two_leases():
+    a, b = ShardLease("test-a", ttl=600), ShardLease("test-b", ttl=600)
+    a.heartbeat()
+    b.heartbeat()
+    a.heartbeat()
+    assert (a.index, a.count, b.index, b.count) == (0, 2, 1, 2)
+    return a, b
+
+
+def patient_of(lease, make_patient):
+    while True:
+        user_id, headers = make_patient(f"shard-patient-{next(_names)}")
+        if lease.owns(user_id):
+            return user_id, headers
+
+
+def test_schedule_written_on_non_owner_fires_on_owner(app, client, make_patient):
+    with app.app_context():
+        lease_a, lease_b = two_leases()
+        try:
+            queue_a, queue_b = ReminderScheduler(lease_a.owns), ReminderScheduler(lease_b.owns)
+            changes_b = ScheduleChanges()
+            # The owner's last full resync, before the write
+            changes_b.reset()
+            queue_b.load(Schedule.query.filter(lease_b.shard_filter(Schedule.user_id)).all())
+            user_id, headers = patient_of(lease_b, make_patient)
+            # Other tests' schedules may be queued already
+            queued = len(queue_a), len(queue_b)
+
+            # Due this minute, i.e. after the owner's previous tick but before it sees the write
+            fire_at = datetime.utcnow().replace(second=0, microsecond=0)
+            last_tick = fire_at - timedelta(seconds=30)
+            response = client.post("/schedule", headers=headers, json={
+                "name": "Metformin", "time": to_local(fire_at).strftime("%H:%M"), "days": list(DAY_BITS),
+            })
+            sch = db.session.get(Schedule, response.get_json()["id"])
+            # Written through process A, which does not own the user
+            queue_a.upsert(sch)
+            assert (len(queue_a), len(queue_b)) == queued
+
+            # Process B's next tick
+            for row in changes_b.poll(lease_b.shard_filter(Schedule.user_id)):
+                queue_b.upsert(row, now=last_tick)
+            assert (sch.id, fire_at) in queue_b.pop_due(datetime.utcnow())
+        finally:
+            lease_a.release()
+            lease_b.release()
+            assert SchedulerLease.query.count() == 0
+
+
+def test_schedule_changes_read_only_new_rows(app, client, make_patient):
+    with app.app_context():
+        user_id, headers = make_patient(f"changes-patient-{next(_names)}")
+        changes = ScheduleChanges(overlap=timedelta(0))
+        changes.reset()
+        mine = Schedule.user_id == user_id
+        assert changes.poll(mine) == []
+
+        sch_id = client.post("/schedule", headers=headers, json={
+            "name": "Aspirin", "time": "09:00", "days": ["Mon"],
+        }).get_json()["id"]
+        assert [row.id for row in changes.poll(mine)] == [sch_id]
+        assert changes.poll(mine) == []
+
+        # An edit is a change too, so the owner re-queues the new time
+        client.put(f"/schedule/{sch_id}", headers=headers, json={"time": "10:00"})
+        assert [(row.id, row.time) for row in changes.poll(mine)] == [(sch_id, "10:00")]
@@ -89,6 +89,8 @@ self.addEventListener('push', function (event) {
                 requireInteraction: true,
                 data: {
                     id: data.id,
+                    // Every dose of a coalesced reminder
+                    ids: data.ids || [data.id],
                     name: data.name
                 },
                 actions: [
@@ -125,7 +127,7 @@ self.addEventListener('notificationclick', function (event) {
 
     if (action === 'confirm' || action === 'snooze') {
         const body = {
-            confirmation_id: notificationData.id,
+            confirmation_ids: notificationData.ids,
             status: action === 'confirm' ? 'taken' : 'snoozed',
             minutes: action === 'snooze' ? 5 : 0
         };
@@ -312,15 +312,24 @@ function MainApp({ deferredPrompt, onInstall }) {
   };
 
   const handleFileUpload = async (e) => {
-    const file = e.target.files[0];
-    if (!file) return;
+    const files = Array.from(e.target.files);
+    if (!files.length) return;
     setUploading(true);
+    // Several pages, or a PDF/TIFF that may have several, go through the batch endpoint
+    const batch = files.length > 1 || files.some(f => /\.(pdf|tiff?)$/i.test(f.name));
     const fd = new FormData();
-    fd.append('file', file);
+    files.forEach(f => fd.append(batch ? 'files' : 'file', f));
     try {
-      const resp = await api.post('/upload', fd);
-      setExtractedText(resp.data.extracted_text);
-      setExtractedMedicines(resp.data.medicines || []);
+      // The backend queues OCR and hands back a job to poll
+      const resp = await api.post(batch ? '/upload/batch' : '/upload', fd);
+      let job = resp.data;
+      while (job.status === 'queued') {
+        await new Promise(resolve => setTimeout(resolve, 1000));
+        job = (await api.get(job.status_url || `/upload/jobs/${job.job_id || job.id}`)).data;
+      }
+      if (job.status !== 'done') throw new Error(job.error || 'OCR failed');
+      setExtractedText(job.extracted_text);
+      setExtractedMedicines(job.medicines || []);
     } catch (e) { alert("Upload failed"); }
     setUploading(false);
   };
@@ -355,7 +364,15 @@ function MainApp({ deferredPrompt, onInstall }) {
     } catch (e) { alert("Error deleting"); }
   };
 
-  const handleConfirmAction = () => {
+  const handleConfirmAction = async () => {
+    try {
+      // A push can cover several doses; mark them all taken at once
+      if (popupData.id) {
+        await api.post('/confirm', { confirmation_ids: popupData.ids || [popupData.id], status: 'taken' });
+      }
+    } catch (e) {
+      console.error("Confirm error:", e);
+    }
     setMessages(prev => [...prev, { sender: 'bot', text: `✅ Recorded: You took **${popupData.name}**.` }]);
     setPopupData(null);
   };
@@ -364,7 +381,8 @@ function MainApp({ deferredPrompt, onInstall }) {
     try {
       // If we have a confirmation_id (from backend push), notify backend
       if (popupData.id) {
-        await api.post('/confirm', { confirmation_id: popupData.id, status: 'snoozed', minutes: min });
+        const ids = popupData.ids || [popupData.id];
+        await api.post('/confirm', { confirmation_ids: ids, status: 'snoozed', minutes: min });
       }
       setMessages(prev => [...prev, { sender: 'bot', text: `⏳ OK, I'll remind you about **${popupData.name}** in ${min} mins.` }]);
       setPopupData(null);
@@ -523,7 +541,7 @@ function MainApp({ deferredPrompt, onInstall }) {
                   <div style={{ fontSize: '3.5rem', filter: 'drop-shadow(0 0 10px var(--primary-glow))' }}>📷</div>
                   <h3 style={{ margin: 0, fontSize: '1.4rem' }}>Smart Scanner</h3>
                   <p style={{ color: 'var(--text-muted)', margin: '-10px 0 10px 0' }}>Upload a photo and our AI will extract medications instantly.</p>
-                  <input type="file" id="file-upload" onChange={handleFileUpload} style={{ display: 'none' }} />
+                  <input type="file" id="file-upload" multiple accept="image/*,.pdf,.tif,.tiff" onChange={handleFileUpload} style={{ display: 'none' }} />
                   <label htmlFor="file-upload" className="btn-primary" style={{ cursor: 'pointer', padding: '16px 32px', display: 'inline-block' }}>
                     {uploading ? "⌛ Processing..." : "📁 Choose Image"}
                   </label>
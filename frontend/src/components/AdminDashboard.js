@@ -7,6 +7,7 @@ const API_BASE_URL = `https://medication-assistant.onrender.com`;
 const AdminDashboard = () => {
     const [medicines, setMedicines] = useState([]);
     const [loading, setLoading] = useState(true);
+    const [adherence, setAdherence] = useState(null);
     const [newMedicine, setNewMedicine] = useState({
         name: '',
         used_for: '',
@@ -23,8 +24,24 @@ const AdminDashboard = () => {
             return;
         }
         fetchMedicines();
+        fetchAdherence();
     }, []);
 
+    const fetchAdherence = async () => {
+        try {
+            const token = localStorage.getItem('adminToken');
+            // Last 30 days, one row per medicine
+            const resp = await axios.get(`${API_BASE_URL}/admin/adherence?group=medicine`, {
+                headers: { Authorization: `Bearer ${token}` }
+            });
+            setAdherence(resp.data);
+        } catch (err) {
+            console.error(err);
+        }
+    };
+
+    const percent = (rate) => rate === null || rate === undefined ? '–' : `${Math.round(rate * 100)}%`;
+
     const fetchMedicines = async () => {
         setLoading(true);
         try {
@@ -35,7 +52,8 @@ const AdminDashboard = () => {
             setMedicines(resp.data);
         } catch (err) {
             console.error(err);
-            if (err.response && err.response.status === 401) {
+            // 403: a valid token, but not the admin's
+            if (err.response && [401, 403].includes(err.response.status)) {
                 navigate('/admin/login');
             }
         } finally {
@@ -158,6 +176,44 @@ const AdminDashboard = () => {
                             </div>
                         )}
                     </div>
+
+                    {adherence && (
+                        <div style={{ marginTop: '40px' }}>
+                            <h3 style={{ marginBottom: '20px', color: 'var(--text-main)', fontSize: '1.2rem' }}>
+                                Adherence ({adherence.from} – {adherence.to}): {percent(adherence.total.taken_rate)} taken
+                            </h3>
+                            <div className="glass-card" style={{ padding: 0, overflow: 'hidden' }}>
+                                <div style={{ overflowX: 'auto' }}>
+                                    <table style={{ width: '100%', borderCollapse: 'collapse', color: 'var(--text-main)' }}>
+                                        <thead style={{ background: 'rgba(37, 99, 235, 0.05)', borderBottom: '1px solid var(--glass-border)' }}>
+                                            <tr>
+                                                {['Medicine', 'Doses', 'Taken', 'On Time', 'Snoozed', 'Ignored'].map(h => (
+                                                    <th key={h} style={{ padding: '15px', textAlign: 'left', fontSize: '0.85rem', color: 'var(--primary)' }}>{h}</th>
+                                                ))}
+                                            </tr>
+                                        </thead>
+                                        <tbody>
+                                            {adherence.groups.map((row, i) => (
+                                                <tr key={i} style={{ borderBottom: '1px solid var(--glass-border)' }}>
+                                                    <td style={{ padding: '15px', fontWeight: 'bold' }}>{row.medicine_name}</td>
+                                                    <td style={{ padding: '15px', fontSize: '0.9rem' }}>{row.scheduled}</td>
+                                                    <td style={{ padding: '15px', fontSize: '0.9rem' }}>{percent(row.taken_rate)}</td>
+                                                    <td style={{ padding: '15px', fontSize: '0.9rem' }}>{percent(row.on_time_rate)}</td>
+                                                    <td style={{ padding: '15px', fontSize: '0.9rem' }}>{percent(row.snoozed_rate)}</td>
+                                                    <td style={{ padding: '15px', fontSize: '0.9rem' }}>{percent(row.ignored_rate)}</td>
+                                                </tr>
+                                            ))}
+                                            {adherence.groups.length === 0 && (
+                                                <tr>
+                                                    <td colSpan="6" style={{ padding: '40px', textAlign: 'center', color: 'var(--text-muted)' }}>No doses in this period.</td>
+                                                </tr>
+                                            )}
+                                        </tbody>
+                                    </table>
+                                </div>
+                            </div>
+                        </div>
+                    )}
                 </div>
             </div>
         </div>